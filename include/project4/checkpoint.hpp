@@ -0,0 +1,46 @@
+#pragma once
+
+#include "project4/ising_model.hpp"
+#include "project4/stat_utils.hpp"
+
+#include <string>
+
+namespace checkpoint{
+    /**
+     * @brief Everything needed to continue a run, besides the IsingModel itself
+     * 
+     */
+    struct State{
+        stat_utils::Moments moments;
+        int burn_in_time = 0;
+        int clusters_per_iteration = 1;
+        // The runner and the number of samples the run was started with, a checkpoint of another
+        // build or sample size is not resumed
+        std::string engine;
+        int sample_size = 0;
+    };
+    /**
+     * @brief Get a hash of the runner executable, such that checkpoints of another build are recognized
+     * 
+     * @return std::string The FNV-1a hash of /proc/self/exe in hexadecimal, or "unknown" if it cannot be read
+     */
+    std::string engine_hash();
+    /**
+     * @brief Write a checkpoint. The checkpoint is written to a temporary file, which then replaces the old checkpoint,
+     * so a run killed while writing leaves the old checkpoint intact
+     * 
+     * @param filename File to write to
+     * @param model The IsingModel
+     * @param state The moments and the settings of the run
+     */
+    void save(const std::string &filename, IsingModel &model, const State &state);
+    /**
+     * @brief Read a checkpoint written by save
+     * 
+     * @param filename File to read from
+     * @param model Destination of the IsingModel, which must have the same size as the saved one
+     * @param state Destination of the moments and the settings of the run
+     * @return bool True if the checkpoint exists and was read
+     */
+    bool load(const std::string &filename, IsingModel &model, State &state);
+}
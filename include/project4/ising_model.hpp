@@ -4,11 +4,23 @@
 #include <vector>
 #include <random>
 #include <iostream>
+#include <cstdint>
+
+#include "project4/philox.hpp"
 
 using namespace std;
 class IsingModel{
     public:
-        IsingModel(int L, double T, bool random_spins, int seed);
+        /**
+         * @brief Construct a new IsingModel
+         * 
+         * @param L Size of the lattice
+         * @param T Temperature
+         * @param random_spins If True, starting spin state is chosen randomly. Else all spins are pointing up
+         * @param seed Seed for RNG
+         * @param stream Id of the RNG stream for the same seed, see stream_id
+         */
+        IsingModel(int L, double T, bool random_spins, int seed, uint64_t stream = 0);
         /**
          * @brief Get the matrix of spins
          * 
@@ -20,6 +32,24 @@ class IsingModel{
          * 
          */
         void metropolis();
+        /**
+         * @brief Performs one Wolff cluster update
+         * 
+         * @return int The number of spins in the flipped cluster
+         */
+        int wolff();
+        /**
+         * @brief Set the temperature of the IsingModel, keeping the spin state. Used to swap temperatures in parallel tempering
+         * 
+         * @param T The new temperature
+         */
+        void set_temperature(double T);
+        /**
+         * @brief Get the temperature of the IsingModel
+         * 
+         * @return double 
+         */
+        double get_temperature();
         /**
          * @brief Get the energy of the IsingModel
          * 
@@ -38,6 +68,12 @@ class IsingModel{
          * @return double 
          */
         double get_m();
+        /**
+         * @brief Get the number of spin flips accepted by the Metropolis algorithm since the IsingModel was constructed
+         * 
+         * @return long long 
+         */
+        long long get_accepted_flips();
         /**
          * @brief Get w from the precomputed set of exponential values
          * 
@@ -56,6 +92,19 @@ class IsingModel{
          * 
          */
         void print();
+        /**
+         * @brief Write the state of the IsingModel (spins, E, M and the state of the RNG) to a stream, used for checkpoints
+         * 
+         * @param out Stream to write to
+         */
+        void save_state(ostream &out);
+        /**
+         * @brief Read a state written by save_state, continuing exactly where the saved IsingModel stopped
+         * 
+         * @param in Stream to read from
+         * @return bool True if the state was read, and the size of the lattice matches
+         */
+        bool load_state(istream &in);
     private:
         
         /**
@@ -75,7 +124,7 @@ class IsingModel{
          * 
          */
         void set_energy();
-        mt19937 rng;
+        Philox rng;
         uniform_int_distribution<int> rand_index;
         uniform_int_distribution<int> rand_1_or_0;
         uniform_real_distribution<double> uniform;
@@ -84,6 +133,10 @@ class IsingModel{
         int E;
         int M;
         double beta;
+        double p_add;
+        vector<vector<int>> in_cluster;
+        int cluster_id;
+        long long accepted_flips = 0;
         bool rand_spins;
         /**
          * @brief Precomputes exponential values that are needed every MC-cycle, but are limited to five possible values
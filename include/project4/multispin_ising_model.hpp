@@ -0,0 +1,124 @@
+#pragma once
+
+#include <cstdint>
+#include <vector>
+
+#include "project4/philox.hpp"
+
+using namespace std;
+/**
+ * @brief Multispin coded IsingModel for large lattices, with 64 spins packed in every uint64_t.
+ * The lattice is split in the two colours of a checkerboard, and the spins of one colour in a row are packed together,
+ * such that the four neighbours of 64 spins are found with a few shifts, and all 64 spins are updated at once with bitwise logic.
+ * A set bit is a spin pointing down. One call to metropolis() updates the red and then the black spins, which is one MC-cycle
+ * of L * L attempted spin flips, like IsingModel::metropolis. L must be a multiple of 128
+ * 
+ */
+class MultispinIsingModel{
+    public:
+        /**
+         * @brief Construct a new MultispinIsingModel
+         * 
+         * @param L Size of the lattice, a multiple of 128, otherwise invalid_argument is thrown
+         * @param T Temperature
+         * @param random_spins If True, starting spin state is chosen randomly. Else all spins are pointing up
+         * @param seed Seed for RNG
+         * @param stream Id of the RNG stream for the same seed, see stream_id
+         */
+        MultispinIsingModel(int L, double T, bool random_spins, int seed, uint64_t stream = 0);
+        /**
+         * @brief Performs one MC-cycle of the Metropolis algorithm, updating the red and then the black spins
+         * 
+         */
+        void metropolis();
+        /**
+         * @brief Set the temperature of the IsingModel, keeping the spin state
+         * 
+         * @param T The new temperature
+         */
+        void set_temperature(double T);
+        /**
+         * @brief Get the temperature of the IsingModel
+         * 
+         * @return double 
+         */
+        double get_temperature();
+        /**
+         * @brief Get the energy of the IsingModel
+         * 
+         * @return int 
+         */
+        int get_energy();
+        /**
+         * @brief Get the magnetization of the IsingModel
+         * 
+         * @return int 
+         */
+        int get_magnetization();
+        /**
+         * @brief Get the epsilon of the IsingModel
+         * 
+         * @return double 
+         */
+        double get_epsilon();
+        /**
+         * @brief Get m of the IsingModel
+         * 
+         * @return double 
+         */
+        double get_m();
+        /**
+         * @brief Get the number of spin flips accepted by the Metropolis algorithm since the IsingModel was constructed
+         * 
+         * @return long long 
+         */
+        long long get_accepted_flips();
+        /**
+         * @brief Get a single spin
+         * 
+         * @param i Row of the spin
+         * @param j Column of the spin
+         * @return int 1 or -1
+         */
+        int get_spin(int i, int j);
+        /**
+         * @brief Calculate the energy from the spins, instead of the tracked energy. Used for testing, see test_multispin
+         * 
+         * @return int 
+         */
+        int count_energy();
+    private:
+        /**
+         * @brief Update all the spins of one colour
+         * 
+         * @param colour 0 for red, 1 for black
+         */
+        void half_sweep(int colour);
+        /**
+         * @brief Draw 64 independent bits, each set with probability exp(-4 beta), by comparing 64 uniform numbers
+         * with the binary expansion of the probability one binary digit at the time
+         * 
+         * @return uint64_t 
+         */
+        uint64_t bernoulli_mask();
+        /**
+         * @brief Find the word and the bit of a spin
+         * 
+         * @param i Row of the spin
+         * @param j Column of the spin
+         * @param colour Destination of the colour
+         * @param word Destination of the index of the word
+         * @param bit Destination of the bit within the word
+         */
+        void locate(int i, int j, int &colour, int &word, int &bit);
+        Philox rng;
+        int L;
+        int words;
+        int E;
+        int M;
+        double beta;
+        double p;
+        long long accepted_flips = 0;
+        // sublattice[colour][i * words + w] packs the spins of the colour in row i
+        vector<uint64_t> sublattice[2];
+};
@@ -0,0 +1,109 @@
+#pragma once
+
+#include <cstdint>
+#include <iostream>
+
+/**
+ * @brief Counter-based random number generator Philox4x32-10 (Salmon et al., "Parallel random numbers: as easy as 1, 2, 3").
+ * The n-th output is a keyed bijection of n, so a stream is fully determined by its key and stream id, and can be made
+ * on any thread or process. The key is the seed, and the 128 bit counter holds the stream id and the index of the block.
+ * Every block gives two 64 bit outputs. Satisfies UniformRandomBitGenerator, so it can be used with the distributions of <random>
+ * 
+ */
+class Philox{
+    public:
+        typedef uint64_t result_type;
+        /**
+         * @brief Construct a new Philox stream
+         * 
+         * @param seed The key of the generator
+         * @param stream Id of the stream, see stream_id
+         */
+        Philox(uint64_t seed = 0, uint64_t stream = 0);
+        static constexpr result_type min(){return 0;}
+        static constexpr result_type max(){return UINT64_MAX;}
+        /**
+         * @brief Get the next output of the stream
+         * 
+         * @return result_type 
+         */
+        result_type operator()();
+        /**
+         * @brief Skip outputs, in constant time
+         * 
+         * @param z Number of outputs to skip
+         */
+        void discard(unsigned long long z);
+        /**
+         * @brief Calculate one block of Philox4x32-10
+         * 
+         * @param counter The counter, modified to the output
+         * @param key The key
+         */
+        static void block(uint32_t counter[4], const uint32_t key[2]);
+        /**
+         * @brief Write the state of the stream, used for checkpoints
+         * 
+         */
+        friend std::ostream &operator<<(std::ostream &out, const Philox &rng);
+        /**
+         * @brief Read a state written by operator<<
+         * 
+         */
+        friend std::istream &operator>>(std::istream &in, Philox &rng);
+    private:
+        /**
+         * @brief Fill the buffer with the outputs of the block with index position / 2
+         * 
+         */
+        void generate();
+        uint64_t seed;
+        uint64_t stream;
+        // Index of the next output
+        uint64_t position;
+        uint64_t buffer[2];
+};
+
+/**
+ * @brief Id of the stream of one task, such that every (L, temperature, chain) has its own stream for the same seed
+ * 
+ * @param L Size of the lattice, below 2^24
+ * @param T_index Index of the temperature, below 2^24
+ * @param chain Index of the chain at this temperature, below 2^16
+ * @return uint64_t 
+ */
+uint64_t stream_id(int L, int T_index, int chain = 0);
+
+// The generator is called for every random number, so the functions making the numbers are inlined
+
+inline void Philox::block(uint32_t counter[4], const uint32_t key[2]){
+    const uint32_t M0 = 0xD2511F53, M1 = 0xCD9E8D57, W0 = 0x9E3779B9, W1 = 0xBB67AE85;
+    uint32_t k0 = key[0], k1 = key[1];
+    for (int round = 0; round < 10; round++){
+        uint64_t product0 = (uint64_t) M0 * counter[0];
+        uint64_t product1 = (uint64_t) M1 * counter[2];
+        uint32_t hi0 = product0 >> 32, lo0 = (uint32_t) product0;
+        uint32_t hi1 = product1 >> 32, lo1 = (uint32_t) product1;
+        uint32_t c1 = counter[1], c3 = counter[3];
+        counter[0] = hi1 ^ c1 ^ k0;
+        counter[1] = lo1;
+        counter[2] = hi0 ^ c3 ^ k1;
+        counter[3] = lo0;
+        k0 += W0;
+        k1 += W1;
+    }
+}
+
+inline void Philox::generate(){
+    uint64_t index = position / 2;
+    uint32_t counter[4] = {(uint32_t) index, (uint32_t) (index >> 32), (uint32_t) stream, (uint32_t) (stream >> 32)};
+    uint32_t key[2] = {(uint32_t) seed, (uint32_t) (seed >> 32)};
+    block(counter, key);
+    buffer[0] = ((uint64_t) counter[1] << 32) | counter[0];
+    buffer[1] = ((uint64_t) counter[3] << 32) | counter[2];
+}
+
+inline Philox::result_type Philox::operator()(){
+    if (position % 2 == 0) generate();
+    return buffer[position++ % 2];
+}
@@ -0,0 +1,36 @@
+#pragma once
+
+#include <string>
+#include <vector>
+#include <cstdint>
+
+namespace sample_io{
+    /**
+     * @brief Header of a binary sample file. The header is followed by the sampled energies
+     * and then the sampled absolute magnetizations, each stored as cycles little-endian int32.
+     * The layout is fixed (48 bytes), such that python can read it with numpy.memmap
+     * 
+     */
+    struct Header{
+        char magic[8];
+        uint32_t version;
+        int32_t L;
+        double T;
+        int64_t seed;
+        int64_t burn_in_time;
+        int64_t cycles;
+    };
+    /**
+     * @brief Write samples of E and |M| to a binary sample file
+     * 
+     * @param filename File to write to
+     * @param sampled_energy Energy sampled from IsingModel
+     * @param sampled_magnetization_abs Absolute magnetization sampled from IsingModel
+     * @param L Size of the IsingModel
+     * @param T Temperature of the IsingModel
+     * @param seed Seed used for RNG
+     * @param burn_in_time Number of iterations discarded before sampling
+     */
+    void write_samples(const std::string &filename, const std::vector<int> &sampled_energy,
+                       const std::vector<int> &sampled_magnetization_abs, int L, double T, int seed, int burn_in_time);
+}
@@ -4,6 +4,7 @@
 #include <functional>
 #include <vector>
 #include <fstream>
+#include <iostream>
 
 namespace stat_utils{
     /**
@@ -35,7 +36,7 @@ namespace stat_utils{
      * @param N Samples to consider (N < size of samples)
      * @return double 
      */
-    double expected_value(std::vector<int> samples, int N);
+    double expected_value(const std::vector<int> &samples, int N);
     /**
      * @brief Calculate expected value from N samples, under some transform
      * 
@@ -44,7 +45,7 @@ namespace stat_utils{
      * @param f Transform
      * @return double 
      */
-    double expected_value(std::vector<int> samples, int N, std::function<double(int)> f);
+    double expected_value(const std::vector<int> &samples, int N, std::function<double(int)> f);
     /**
      * @brief Find the distribution from N samples
      * 
@@ -52,7 +53,7 @@ namespace stat_utils{
      * @param N Samples to consider (N < size of samples)
      * @return std::map<double, double> 
      */
-    std::map<double, double> distribution(std::vector<int> samples, int N);
+    std::map<double, double> distribution(const std::vector<int> &samples, int N);
         /**
      * @brief Find the distribution from N samples, under some transform
      * 
@@ -61,6 +62,149 @@ namespace stat_utils{
      * @param f Transform
      * @return std::map<double, double> 
      */
-    std::map<double, double> distribution(std::vector<int> samples, int N, std::function<double(int)> f);
+    std::map<double, double> distribution(const std::vector<int> &samples, int N, std::function<double(int)> f);
+    /**
+     * @brief Find the truncation point of a time series with MSER (marginal standard error rule).
+     * The series is split into batches, and the number of batches d to discard minimizes the variance of
+     * the remaining batch means divided by the squared number of remaining batches. All d are tried
+     * in a single pass using suffix sums
+     * 
+     * @param samples Samples, in the order they were made
+     * @param batch_size Number of samples per batch
+     * @param max_fraction Largest fraction of the batches which may be discarded
+     * @return int Number of samples to discard
+     */
+    int mser(const std::vector<int> &samples, int batch_size = 5, double max_fraction = 0.75);
+    /**
+     * @brief Running mean and variance of a series with Welford's algorithm, using constant memory
+     * 
+     */
+    class Welford{
+        public:
+            /**
+             * @brief Add a sample
+             * 
+             * @param x Sample
+             */
+            void add(double x);
+            /**
+             * @brief Get the number of samples
+             * 
+             * @return long long 
+             */
+            long long count() const;
+            /**
+             * @brief Get the mean of the samples
+             * 
+             * @return double 
+             */
+            double mean() const;
+            /**
+             * @brief Get the variance of the samples, normalized by the number of samples
+             * 
+             * @return double 
+             */
+            double variance() const;
+            /**
+             * @brief Write the state to a stream, without loss of precision
+             * 
+             * @param out Stream to write to
+             */
+            void save(std::ostream &out) const;
+            /**
+             * @brief Read a state written by save
+             * 
+             * @param in Stream to read from
+             */
+            void load(std::istream &in);
+        private:
+            long long n = 0;
+            double mu = 0;
+            double m2 = 0;
+    };
+    /**
+     * @brief Sum with Kahan compensation, such that adding many small terms to a large sum loses no precision
+     * 
+     */
+    class KahanSum{
+        public:
+            /**
+             * @brief Add a term
+             * 
+             * @param x Term
+             */
+            void add(double x);
+            /**
+             * @brief Get the sum
+             * 
+             * @return double 
+             */
+            double sum() const;
+            /**
+             * @brief Write the state to a stream, without loss of precision
+             * 
+             * @param out Stream to write to
+             */
+            void save(std::ostream &out) const;
+            /**
+             * @brief Read a state written by save
+             * 
+             * @param in Stream to read from
+             */
+            void load(std::istream &in);
+        private:
+            double total = 0;
+            double compensation = 0;
+    };
+    /**
+     * @brief Running moments of the sampled E and |M|: <E>, <E^2>, <|M|>, <M^2> and <M^4>, using constant memory
+     * 
+     */
+    struct Moments{
+        Welford energy;
+        Welford magnetization_abs;
+        KahanSum magnetization_4;
+        /**
+         * @brief Add a sample
+         * 
+         * @param E Sampled energy
+         * @param M_abs Sampled absolute magnetization
+         */
+        void add(int E, int M_abs);
+        /**
+         * @brief Get the number of samples
+         * 
+         * @return long long 
+         */
+        long long count() const;
+        /**
+         * @brief Estimates <&epsilon;>, <|m|>, C_v and &chi; from the moments
+         * 
+         * @param L Size of the IsingModel
+         * @param T Temperature of the IsingModel
+         * @param expected_epsilon Destination of <&epsilon;>
+         * @param expected_m_abs Destination of <|m|>
+         * @param c_v Destination of C_v
+         * @param chi Destination of &chi;
+         */
+        void values(int L, double T, double &expected_epsilon, double &expected_m_abs, double &c_v, double &chi) const;
+        /**
+         * @brief Calculate the Binder cumulant 1 - <M^4> / (3 <M^2>^2)
+         * 
+         * @return double 
+         */
+        double binder_cumulant() const;
+        /**
+         * @brief Write the moments to a stream, without loss of precision
+         * 
+         * @param out Stream to write to
+         */
+        void save(std::ostream &out) const;
+        /**
+         * @brief Read moments written by save
+         * 
+         * @param in Stream to read from
+         */
+        void load(std::istream &in);
+    };
 }
-
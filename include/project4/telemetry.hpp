@@ -0,0 +1,87 @@
+#pragma once
+
+#include <chrono>
+#include <cstdint>
+#include <string>
+
+namespace telemetry{
+    /**
+     * @brief The file the runs are appended to, as one json object per line. Empty to turn telemetry off
+     * 
+     */
+    extern std::string filename;
+    /**
+     * @brief Measurements of a single (L, T) run, split into the burn-in and the measurement phase
+     * 
+     */
+    struct Run{
+        int L;
+        double T;
+        int seed;
+        uint64_t stream;
+        std::string engine;
+        int burn_in_time = 0;
+        long long samples = 0;
+        double burn_in_seconds = 0;
+        double measure_seconds = 0;
+        long long burn_in_sweeps = 0;
+        long long measure_sweeps = 0;
+        long long accepted_flips = 0;
+        long long attempted_flips = 0;
+        double mean_cluster_size = 0;
+        bool resumed = false;
+        double start_time = 0;
+    };
+    /**
+     * @brief Times the phases of a run
+     * 
+     */
+    class Stopwatch{
+        public:
+            Stopwatch();
+            /**
+             * @brief Get the seconds since the Stopwatch was constructed or last lapped, and restart it
+             * 
+             * @return double 
+             */
+            double lap();
+            /**
+             * @brief Get the time the Stopwatch was constructed, in seconds since the epoch
+             * 
+             * @return double 
+             */
+            double start_time();
+        private:
+            std::chrono::steady_clock::time_point last;
+            double started;
+    };
+    /**
+     * @brief Get the id of the sweep the runs of this process belong to. A driver running many runner processes
+     * groups them by setting the environment variable TELEMETRY_SWEEP, otherwise the id is the process id and
+     * the time the process started. Characters other than [A-Za-z0-9._-] are replaced by _
+     * 
+     * @return std::string The id of the sweep
+     */
+    std::string sweep();
+    /**
+     * @brief Get the largest resident set size of the process so far
+     * 
+     * @return long The memory high-water mark in kB
+     */
+    long max_rss_kb();
+    /**
+     * @brief Describe a run as a single line of json, together with the sweep, the OpenMP thread, the process id
+     * and the memory high-water mark of the process
+     * 
+     * @param run The run
+     * @return std::string The json object, without a newline
+     */
+    std::string to_json(const Run &run);
+    /**
+     * @brief Append a run to the telemetry file. Every run is written with a single write to a file opened
+     * for appending, such that runs of concurrent threads and processes do not interleave
+     * 
+     * @param run The run
+     */
+    void write(const Run &run);
+}
@@ -0,0 +1,76 @@
+#pragma once
+
+#include <random>
+#include <string>
+#include <vector>
+
+using namespace std;
+/**
+ * @brief Wang-Landau sampling of the density of states g(E) of the IsingModel.
+ * A random walk of single spin flips in energy space, accepting a move from E to E' with probability
+ * min(1, g(E) / g(E')), while ln g(E) of the current energy is increased by ln f after every attempted flip.
+ * Following Belardinelli and Pereyra, ln f is halved whenever every known energy has been visited since the last halving,
+ * until ln f < 1/t, after which ln f = 1/t, where t is the number of attempted flips per energy.
+ * Once ln f is below the square root of its final value, the microcanonical averages of |M| and M^2 are accumulated for every energy
+ * 
+ */
+class WangLandau{
+    public:
+        /**
+         * @brief Construct a new WangLandau random walk, starting with all spins pointing up
+         * 
+         * @param L Size of the lattice
+         * @param seed Seed for RNG
+         */
+        WangLandau(int L, int seed);
+        /**
+         * @brief Run the random walk until ln f is below log_f_final
+         * 
+         * @param log_f_final The final modification factor, the error of ln g(E) is of order sqrt(log_f_final)
+         */
+        void run(double log_f_final = 1e-6);
+        /**
+         * @brief Write ln g(E), normalized such that the sum of g(E) is 2^(L * L), together with the microcanonical averages
+         * <|M|> and <M^2> to a csv-file with the columns E(s),ln g(E),<|M(s)|>,<M(s)^2>. Only the visited energies are written
+         * 
+         * @param filename File to write to
+         */
+        void write(string filename);
+    private:
+        /**
+         * @brief Attempt one spin flip, and update ln g(E) and the histogram of the energy after the attempt
+         * 
+         * @param accumulate If True, |M| and M^2 are added to the microcanonical averages
+         */
+        void step(bool accumulate);
+        /**
+         * @brief Check if every known energy has been visited since the histogram was reset
+         * 
+         * @return bool
+         */
+        bool all_visited();
+        /**
+         * @brief Index of the energy E, the energy changes in steps of 4
+         * 
+         * @param E Energy
+         * @return int 
+         */
+        int level(int E);
+        mt19937 rng;
+        uniform_int_distribution<int> rand_site;
+        uniform_real_distribution<double> uniform;
+        vector<int> spins;
+        int L;
+        int N;
+        int E;
+        int M;
+        double log_f;
+        long long steps;
+        int visited_levels;
+        vector<double> log_g;
+        vector<long long> histogram;
+        vector<bool> visited;
+        vector<long long> samples;
+        vector<double> sum_M_abs;
+        vector<double> sum_M_squared;
+};
@@ -4,36 +4,93 @@ Analytical solution of the IsingModel for the 2x2 case
 Use to test against the nummerical implementation
 """
 
-import pandas as pd
+from functools import cached_property
+
 import numpy as np
 
 
 class NumericalIsingModel:
-    def __init__(self, filename: str, temperature: float, L=2):
+    def __init__(self, filename: str, temperature, L=2):
         """Initialize the numerical ising model
 
+        The temperature may be an array, in which case every property is an
+        array with one value per temperature. The partition function is
+        found once per temperature and cached, together with the expected
+        values.
+
+        The data is either a state summary (see run.get_all_states), with
+        the degeneracy of every (E, M), or a density of states written by the
+        Wang-Landau runner (./runner -d), with ln g(E) and the microcanonical
+        averages <|M|> and <M^2> of every E. The density of states is kept in
+        log space, so it can describe lattices where g(E) overflows.
+
         Parameters
         ----------
             filename : str
                 The filename of the data
-            temperature : float
-                The temperature of the system
+            temperature : float or array_like
+                The temperature(s) of the system
             L : int
                 The size of the lattice
         """
         self._L = L
         self._N = L ** 2
-        self._T = temperature
+        self._T = np.asarray(temperature, dtype=float)
         self._beta = 1 / self._T  # Boltzman-constant?
-        self._states = pd.read_csv(filename)
 
-        np_state = self._states.to_numpy()
+        with open(filename) as infile:
+            columns = infile.readline().strip().split(",")
+        np_state = np.loadtxt(filename, delimiter=",", skiprows=1, ndmin=2)
         np_state = np_state.transpose()
 
-        self.positive_spins = np_state[0]
-        self.E_s = np_state[1]
-        self.M_s = np_state[2]
-        self.degeneracy = np_state[3]
+        if "ln g(E)" in columns:
+            self.E_s = np_state[0]
+            self.log_degeneracy = np_state[1]
+            self.abs_M_s = np_state[2]
+            self.M_squared_s = np_state[3]
+        else:
+            self.positive_spins = np_state[0]
+            self.E_s = np_state[1]
+            self.M_s = np_state[2]
+            self.degeneracy = np_state[3]
+            self.log_degeneracy = np.log(self.degeneracy)
+            self.abs_M_s = abs(self.M_s)
+            self.M_squared_s = self.M_s ** 2
+
+    @cached_property
+    def _log_weights(self):
+        """Calculate the logarithm of the (unnormalized) probability of every grouped state
+
+        Returns
+        -------
+            log_weights : np.ndarray
+                ln(g(s)) - beta E(s), with one row per temperature
+        """
+        return self.log_degeneracy - self._beta[..., None] * self.E_s
+
+    @cached_property
+    def log_Z(self):
+        """Calculate the logarithm of the partition function, using log-sum-exp
+
+        Returns
+        -------
+            log_Z : float or np.ndarray
+                The logarithm of the partition function
+        """
+        log_weights = self._log_weights
+        shift = np.max(log_weights, axis=-1)
+        return shift + np.log(np.sum(np.exp(log_weights - shift[..., None]), axis=-1))
+
+    @cached_property
+    def _probabilities(self):
+        """Calculate the probability of every grouped state, degeneracy included
+
+        Returns
+        -------
+            probabilities : np.ndarray
+                g(s) p(E(s)), with one row per temperature
+        """
+        return np.exp(self._log_weights - self.log_Z[..., None])
 
     def p(self, E_s):
         """Calculate the probability of the energy E(s)
@@ -48,9 +105,9 @@ class NumericalIsingModel:
             p : float
                 The probability of the energy E(s)
         """
-        return 1 / self.Z * np.exp(-self._beta * E_s)
+        return np.exp(-self._beta[..., None] * E_s - self.log_Z[..., None])
 
-    @property
+    @cached_property
     def Z(self):
         """Calculate the partition function
 
@@ -59,9 +116,31 @@ class NumericalIsingModel:
             Z : float
                 The partition function
         """
-        return np.sum(np.exp(-self._beta * self.E_s) * self.degeneracy)
+        return np.exp(self.log_Z)
+
+    @property
+    def free_energy(self):
+        """Calculate the Helmholtz free energy, F = -T ln(Z)
+
+        Returns
+        -------
+            F : float
+                The free energy
+        """
+        return -self._T * self.log_Z
 
     @property
+    def free_energy_per_spin(self):
+        """Calculate the Helmholtz free energy per spin
+
+        Returns
+        -------
+            f : float
+                The free energy per spin
+        """
+        return self.free_energy / self._N
+
+    @cached_property
     def expected_E(self):
         """Calculate the expected energy
 
@@ -70,7 +149,7 @@ class NumericalIsingModel:
             E : float
                 The expected energy
         """
-        return np.sum(self.degeneracy * self.E_s * self.p(self.E_s))
+        return self._probabilities @ self.E_s
 
     @property
     def expected_epsilon(self):
@@ -83,7 +162,7 @@ class NumericalIsingModel:
         """
         return self.expected_E / self._N
 
-    @property
+    @cached_property
     def expected_E_squared(self):
         """Calculate the expected energy squared
 
@@ -92,7 +171,7 @@ class NumericalIsingModel:
             E_squared : float
                 The expected energy squared
         """
-        return np.sum((self.E_s ** 2) * self.degeneracy * self.p(self.E_s))
+        return self._probabilities @ (self.E_s ** 2)
 
     @property
     def expected_epsilon_squared(self):
@@ -105,7 +184,7 @@ class NumericalIsingModel:
         """
         return self.expected_E_squared / (self._N * self._N)
 
-    @property
+    @cached_property
     def expected_abs_M(self):
         """Calculate the expected absolute magnetization
 
@@ -114,7 +193,7 @@ class NumericalIsingModel:
             M : float
                 The expected absolute magnetization
         """
-        return np.sum(abs(self.M_s) * self.degeneracy * self.p(self.E_s))
+        return self._probabilities @ self.abs_M_s
 
     @property
     def expected_abs_m(self):
@@ -127,7 +206,7 @@ class NumericalIsingModel:
         """
         return self.expected_abs_M / self._N
 
-    @property
+    @cached_property
     def expected_M_squared(self):
         """Calculate the expected magnetization squared
 
@@ -136,7 +215,7 @@ class NumericalIsingModel:
             M_squared : float
                 The expected magnetization squared
         """
-        return np.sum((self.M_s ** 2) * self.degeneracy * self.p(self.E_s))
+        return self._probabilities @ self.M_squared_s
 
     @property
     def expected_m_squared(self):
@@ -181,24 +260,42 @@ class NumericalIsingModel:
 
 
 class AnalyticalIsingModel:
-    def __init__(self, filename: str, temperature: float, L=2):
+    def __init__(self, filename: str, temperature, L=2):
         """Initialize the analytical ising model
 
+        The temperature may be an array, in which case every property is an
+        array with one value per temperature.
+
         Parameters
         ----------
             filename : str
-                The filename of the data
-            temperature : float
-                The temperature of the system
+                The filename of the data (not needed for the analytical
+                expressions, kept to match NumericalIsingModel)
+            temperature : float or array_like
+                The temperature(s) of the system
             L : int
                 The size of the lattice
         """
         assert L == 2, "Only implemented for L=2 (N=4)"
         self._L = L
         self._N = L ** 2
-        self._T = temperature
+        self._T = np.asarray(temperature, dtype=float)
         self._beta = 1 / self._T  # Boltzman-constant?
-        self._states = pd.read_csv(filename)
+
+    @cached_property
+    def _exp_8_beta(self):
+        """exp(8 beta), shared by all the analytical expressions"""
+        return np.exp(8 * self._beta)
+
+    @cached_property
+    def _cosh_8_beta(self):
+        """cosh(8 beta), shared by all the analytical expressions"""
+        return np.cosh(8 * self._beta)
+
+    @cached_property
+    def _sinh_8_beta(self):
+        """sinh(8 beta), shared by all the analytical expressions"""
+        return np.sinh(8 * self._beta)
 
     def p(self, E_s):
         """Calculate the probability of the energy E(s)
@@ -213,7 +310,7 @@ class AnalyticalIsingModel:
             p : float
                 The probability of the energy E(s)
         """
-        return 1 / self.Z * np.exp(-self._beta * E_s)
+        return 1 / self.Z[..., None] * np.exp(-self._beta[..., None] * E_s)
 
     @property
     def Z(self):
@@ -224,7 +321,7 @@ class AnalyticalIsingModel:
             Z : float
                 The partition function
         """
-        return 4 * np.cosh(8 * self._beta) + 12
+        return 4 * self._cosh_8_beta + 12
 
     @property
     def expected_epsilon(self):
@@ -235,7 +332,7 @@ class AnalyticalIsingModel:
             epsilon : float
                 The expected energy
         """
-        return -(2 * np.sinh(8 * self._beta)) / (np.cosh(8 * self._beta) + 3)
+        return -(2 * self._sinh_8_beta) / (self._cosh_8_beta + 3)
 
     @property
     def expected_E(self):
@@ -257,7 +354,7 @@ class AnalyticalIsingModel:
             epsilon_squared : float
                 The expected energy squared
         """
-        return 4 * np.cosh(8 * self._beta) / (np.cosh(8 * self._beta) + 3)
+        return 4 * self._cosh_8_beta / (self._cosh_8_beta + 3)
 
     @property
     def expected_E_squared(self):
@@ -279,7 +376,7 @@ class AnalyticalIsingModel:
             m : float
                 The expected absolute magnetization per spin
         """
-        return (np.exp(8 * self._beta) + 2) / (2 * np.cosh(8 * self._beta) + 6)
+        return (self._exp_8_beta + 2) / (2 * self._cosh_8_beta + 6)
 
     @property
     def expected_abs_M(self):
@@ -301,7 +398,7 @@ class AnalyticalIsingModel:
             m_squared : float
                 The expected magnetization squared per spin
         """
-        return (np.exp(8 * self._beta) + 1) / (2 * np.cosh(8 * self._beta) + 6)
+        return (self._exp_8_beta + 1) / (2 * self._cosh_8_beta + 6)
 
     @property
     def expected_M_squared(self):
@@ -326,8 +423,8 @@ class AnalyticalIsingModel:
         return (
             16
             / (self._T ** 2)
-            * (1 + 3 * np.cosh(8 * self._beta))
-            / ((np.cosh(8 * self._beta) + 3) ** 2)
+            * (1 + 3 * self._cosh_8_beta)
+            / ((self._cosh_8_beta + 3) ** 2)
         )
 
     @property
@@ -358,12 +455,8 @@ class AnalyticalIsingModel:
             (1 / self._N)
             * (1 / self._T)
             * (
-                (8 * np.exp(8 * self._beta) + 8) / (np.cosh(8 * self._beta) + 3)
-                - (
-                    4
-                    * (np.exp(8 * self._beta) + 2) ** 2
-                    / (np.cosh(8 * self._beta) + 3) ** 2
-                )
+                (8 * self._exp_8_beta + 8) / (self._cosh_8_beta + 3)
+                - (4 * (self._exp_8_beta + 2) ** 2 / (self._cosh_8_beta + 3) ** 2)
             )
         )
 
@@ -384,60 +477,70 @@ class AnalyticalIsingModel:
 
 
 def test_analytical_ising_model():
-    """Test the analytical ising model against numerical ising model"""
+    """Test the analytical ising model against numerical ising model
+
+    The numerical model sums the partition function in log space, so the
+    values are compared to a relative tolerance rather than exactly.
+    """
+    T = np.arange(1, 2.5, 0.1)
     numerical_ising_model = NumericalIsingModel(
-        "output/state_summary.csv", temperature=1
+        "output/state_summary.csv", temperature=T
     )
     analytical_ising_model = AnalyticalIsingModel(
-        "output/state_summary.csv", temperature=1
+        "output/state_summary.csv", temperature=T
     )
 
-    assert numerical_ising_model.Z == analytical_ising_model.Z, "Z-values are not equal"
+    def equal(a, b, tol=1e-12):
+        return np.all(abs(a - b) <= tol * np.maximum(abs(a), abs(b)))
 
-    assert (
-        numerical_ising_model.expected_epsilon
-        == analytical_ising_model.expected_epsilon
+    assert equal(
+        numerical_ising_model.Z, analytical_ising_model.Z
+    ), "Z-values are not equal"
+
+    assert equal(
+        numerical_ising_model.expected_epsilon,
+        analytical_ising_model.expected_epsilon,
     ), "Expected epsilon-values are not equal"
-    assert (
-        numerical_ising_model.expected_E == analytical_ising_model.expected_E
+    assert equal(
+        numerical_ising_model.expected_E, analytical_ising_model.expected_E
     ), "Expected E-values are not equal"
 
-    assert (
-        numerical_ising_model.expected_epsilon_squared
-        == analytical_ising_model.expected_epsilon_squared
+    assert equal(
+        numerical_ising_model.expected_epsilon_squared,
+        analytical_ising_model.expected_epsilon_squared,
     ), "Expected epsilon^2-values are not equal"
-    assert (
-        numerical_ising_model.expected_E_squared
-        == analytical_ising_model.expected_E_squared
+    assert equal(
+        numerical_ising_model.expected_E_squared,
+        analytical_ising_model.expected_E_squared,
     ), "Expected E^2-values are not equal"
 
-    assert (
-        numerical_ising_model.expected_abs_m == analytical_ising_model.expected_abs_m
+    assert equal(
+        numerical_ising_model.expected_abs_m, analytical_ising_model.expected_abs_m
     ), "Expected |m|-values are not equal"
-    assert (
-        numerical_ising_model.expected_abs_M == analytical_ising_model.expected_abs_M
+    assert equal(
+        numerical_ising_model.expected_abs_M, analytical_ising_model.expected_abs_M
     ), "Expected |M|-values are not equal"
 
-    assert (
-        numerical_ising_model.expected_m_squared
-        == analytical_ising_model.expected_m_squared
+    assert equal(
+        numerical_ising_model.expected_m_squared,
+        analytical_ising_model.expected_m_squared,
     ), "Expected m^2-values are not equal"
-    assert (
-        numerical_ising_model.expected_M_squared
-        == analytical_ising_model.expected_M_squared
+    assert equal(
+        numerical_ising_model.expected_M_squared,
+        analytical_ising_model.expected_M_squared,
     ), "Expected M^2-values are not equal"
 
-    assert (
+    assert np.all(
         abs(analytical_ising_model.C_v - analytical_ising_model.C_v_naive) < 1e-14
     ), "C_v analytical value and formula value are not equal"
-    assert (
+    assert np.all(
         abs(numerical_ising_model.C_v - analytical_ising_model.C_v) < 1e-14
     ), "C_v-values are not equal"
 
-    assert (
+    assert np.all(
         abs(numerical_ising_model.chi - analytical_ising_model.chi) < 1e-14
     ), "chi-values are not equal"
-    assert (
+    assert np.all(
         abs(analytical_ising_model.chi - analytical_ising_model.chi_naive) < 1e-14
     ), "Chi-values are not equal"
 
@@ -449,15 +552,20 @@ def main():
     """
     test_analytical_ising_model()
 
+    T = np.arange(1, 2.5, 0.1)
+    analytical_ising_model = AnalyticalIsingModel(
+        "output/state_summary.csv", temperature=T
+    )
     with open("output/analytical_L=2.csv", "w") as outfile:
         outfile.write("T,<epsilon>,<|m|>,C_v,chi\n")
-        for T in np.arange(1, 2.5, 0.1):
-            analytical_ising_model = AnalyticalIsingModel(
-                "output/state_summary.csv", temperature=T
-            )
-            outfile.write(
-                f"{T},{analytical_ising_model.expected_epsilon},{analytical_ising_model.expected_abs_m},{analytical_ising_model.C_v},{analytical_ising_model.chi}\n"
-            )
+        for row in zip(
+            T,
+            analytical_ising_model.expected_epsilon,
+            analytical_ising_model.expected_abs_m,
+            analytical_ising_model.C_v,
+            analytical_ising_model.chi,
+        ):
+            outfile.write(",".join(str(value) for value in row) + "\n")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,413 @@
+"""
+Benchmarks of the engines and of the python analysis, with regression checks
+
+The throughput of the engines (spin updates and sweeps per second of the
+Metropolis algorithm, Wolff cluster updates and the multispin coded
+IsingModel) is measured by ./runner -n, for L in 16, 32, ..., 512 and an
+increasing number of threads. The python kernels are timed on inputs of a
+fixed size, taking the best of a few repeats:
+
+    - run.get_all_states for L=4
+    - the observables of NumericalIsingModel at 100 temperatures
+    - the loaders of plot.py: the binary sample files with the burn-in
+      detection, and range queries on the result store
+    - the histogram reweighting of zoom.py
+
+The results are written to json, as a list of measurements with a name,
+parameters, a metric and a value. Two such files are compared measurement by
+measurement, and a change for the worse beyond the tolerance is reported as
+a regression:
+
+    python src/benchmark.py run --save-baseline
+    python src/benchmark.py run
+    python src/benchmark.py compare output/benchmark.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import cache
+
+OUTPUT = "output/benchmark.json"
+BASELINE = "output/benchmark_baseline.json"
+TOLERANCE = 0.15
+# metrics where a smaller value is better, the others are rates
+LOWER_IS_BETTER = {"seconds"}
+
+
+def measurement(name, params, metric, value):
+    """Describe a single measurement
+
+    Parameters
+    ----------
+        name : str
+            What was measured
+        params : dict
+            The parameters of the measurement, such as L and threads
+        metric : str
+            The unit of the value, "seconds" or a rate
+        value : float
+            The measured value
+
+    Returns
+    -------
+        measurement : dict
+    """
+    return {"name": name, "params": params, "metric": metric, "value": float(value)}
+
+
+def best_time(function, repeats=5):
+    """Time a function without arguments, taking the best of a few repeats
+
+    Parameters
+    ----------
+        function : callable
+            The function to time
+        repeats : int
+            Number of times to call the function
+
+    Returns
+    -------
+        seconds : float
+            The shortest time of a call
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def benchmark_engines(min_time=0.2):
+    """Measure the throughput of the engines with ./runner -n
+
+    Parameters
+    ----------
+        min_time : float
+            Minimum duration of every measurement in seconds
+
+    Returns
+    -------
+        measurements : list of dict
+            Spin updates and sweeps per second, for every engine, L and
+            number of threads
+    """
+    result = subprocess.run(
+        [cache.RUNNER, "-n", str(min_time)], stdout=subprocess.PIPE, text=True
+    )
+    result.check_returncode()
+    with open("output/benchmark_engines.json") as infile:
+        benchmarks = json.load(infile)["benchmarks"]
+    measurements = []
+    for benchmark in benchmarks:
+        params = {"L": benchmark["L"], "threads": benchmark["threads"]}
+        for metric in ["flips_per_second", "sweeps_per_second"]:
+            measurements.append(
+                measurement(
+                    f"engine/{benchmark['engine']}", params, metric, benchmark[metric]
+                )
+            )
+    return measurements
+
+
+def _synthetic_samples(L, T, cycles, rng):
+    """Draw correlated series of E and |M| of roughly the right size, for timing the analysis"""
+    N = L ** 2
+    window = np.ones(100) / 10
+    noise = [
+        np.convolve(rng.normal(size=cycles), window, mode="same") for _ in range(2)
+    ]
+    E = 4 * np.round((-1.5 + 0.8 * (T - 2.3)) * N / 4 + np.sqrt(N) * noise[0] / 2)
+    M = np.abs(np.round((0.5 - (T - 2.3)) * N + np.sqrt(N) * noise[1] / 2))
+    return E.astype(np.int32), M.astype(np.int32)
+
+
+def benchmark_python(repeats=5):
+    """Time the python kernels on inputs of a fixed size
+
+    Parameters
+    ----------
+        repeats : int
+            Number of times every kernel is run, the best time is kept
+
+    Returns
+    -------
+        measurements : list of dict
+            The best time of every kernel
+    """
+    import result_store
+    import samples
+    import zoom
+    from analytical_ising_model import NumericalIsingModel
+    from burn_in import burn_in_time
+    from run import get_all_states
+
+    measurements = []
+    rng = np.random.default_rng(2022)
+    with tempfile.TemporaryDirectory() as directory:
+        # exact enumeration of the states
+        state_summary = os.path.join(directory, "state_summary_L=4.csv")
+        with contextlib.redirect_stdout(io.StringIO()):
+            seconds = best_time(
+                lambda: get_all_states(4, filename=state_summary), repeats
+            )
+        measurements.append(
+            measurement("python/get_all_states", {"L": 4}, "seconds", seconds)
+        )
+
+        # observables from the degeneracies
+        temperatures = np.linspace(1, 4, 100)
+
+        def observables():
+            for T in temperatures:
+                model = NumericalIsingModel(state_summary, T, L=4)
+                model.expected_epsilon, model.expected_abs_m, model.C_v, model.chi
+
+        seconds = best_time(observables, repeats)
+        measurements.append(
+            measurement(
+                "python/numerical_observables",
+                {"L": 4, "temperatures": len(temperatures)},
+                "seconds",
+                seconds,
+            )
+        )
+
+        # the sample files read by plot.py
+        L, cycles = 20, 1000000
+        sample_file = os.path.join(directory, "samples.bin")
+        header = np.zeros(1, dtype=samples.HEADER_DTYPE)
+        header["magic"], header["version"] = samples.MAGIC, samples.VERSION
+        header["L"], header["T"], header["cycles"] = L, 2.4, cycles
+        with open(sample_file, "wb") as outfile:
+            outfile.write(header.tobytes())
+            for series in _synthetic_samples(L, 2.4, cycles, rng):
+                outfile.write(series.tobytes())
+
+        def load_samples():
+            _, sampled_energy, sampled_magnetization_abs = samples.read_samples(
+                sample_file
+            )
+            burn_in_time(sampled_energy, sampled_magnetization_abs)
+
+        seconds = best_time(load_samples, repeats)
+        measurements.append(
+            measurement(
+                "python/load_samples", {"L": L, "cycles": cycles}, "seconds", seconds
+            )
+        )
+
+        # range queries on the result store read by plot.py and zoom.py
+        store = result_store.ResultStore(os.path.join(directory, "results.bin"))
+        T = np.linspace(2.1, 2.4, 200)
+        for size in range(20, 160, 20):
+            store.append(
+                {
+                    "T": T,
+                    **{value: rng.random(len(T)) for value in result_store.VALUES},
+                },
+                "zoom",
+                size,
+            )
+        seconds = best_time(
+            lambda: store.query("zoom", T_min=2.25, T_max=2.32, columns=["C_v"]),
+            repeats,
+        )
+        measurements.append(
+            measurement(
+                "python/result_store_query", {"records": 7 * len(T)}, "seconds", seconds
+            )
+        )
+
+        # histogram reweighting of four temperatures
+        L, cycles = 20, 100000
+        reweighting_samples = [
+            (T, *_synthetic_samples(L, T, cycles, rng))
+            for T in np.linspace(2.25, 2.35, 4)
+        ]
+
+        def reweight():
+            reweighting = zoom.Reweighting(reweighting_samples, L)
+            reweighting.values(np.linspace(2.25, 2.35, 200))
+
+        seconds = best_time(reweight, repeats)
+        measurements.append(
+            measurement(
+                "python/reweighting",
+                {"L": L, "cycles": cycles, "temperatures": 4},
+                "seconds",
+                seconds,
+            )
+        )
+    return measurements
+
+
+def run(filename=OUTPUT, min_time=0.2, repeats=5, engines=True):
+    """Run the benchmarks, and write the results as json
+
+    Parameters
+    ----------
+        filename : str
+            The json-file to write to
+        min_time : float
+            Minimum duration of every engine measurement in seconds
+        repeats : int
+            Number of times every python kernel is run
+        engines : bool
+            If False, only the python kernels are benchmarked
+    """
+    measurements = benchmark_engines(min_time) if engines else []
+    measurements += benchmark_python(repeats)
+    git = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+    results = {
+        "commit": git.stdout.strip(),
+        "host": platform.node(),
+        "cores": os.cpu_count(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "measurements": measurements,
+    }
+    with open(filename, "w") as outfile:
+        json.dump(results, outfile, indent=1)
+    print(f"Wrote {len(measurements)} measurements to {filename}")
+
+
+def _key(measurement):
+    """Identify a measurement, such that it can be found in another run"""
+    return (
+        measurement["name"],
+        json.dumps(measurement["params"], sort_keys=True),
+        measurement["metric"],
+    )
+
+
+def compare(filename=OUTPUT, baseline=BASELINE, tolerance=TOLERANCE):
+    """Compare the measurements of a run with a baseline, and report regressions
+
+    Parameters
+    ----------
+        filename : str
+            The json-file of the run
+        baseline : str
+            The json-file of the baseline
+        tolerance : float
+            The relative change for the worse which is accepted
+
+    Returns
+    -------
+        regressions : list of str
+            Descriptions of the measurements which got worse beyond the tolerance
+    """
+    with open(filename) as infile:
+        current = {_key(m): m["value"] for m in json.load(infile)["measurements"]}
+    with open(baseline) as infile:
+        reference = {_key(m): m["value"] for m in json.load(infile)["measurements"]}
+
+    regressions = []
+    for key in sorted(current.keys() & reference.keys()):
+        name, params, metric = key
+        change = current[key] / reference[key] - 1
+        # positive when the measurement got better
+        improvement = -change if metric in LOWER_IS_BETTER else change
+        status = "REGRESSION" if improvement < -tolerance else ""
+        description = f"{name} {params} {metric}: {reference[key]:.4g} -> {current[key]:.4g} ({100 * change:+.1f}%)"
+        print(description, status)
+        if status:
+            regressions.append(description)
+    for key in sorted(reference.keys() - current.keys()):
+        print(f"{key[0]} {key[1]} {key[2]}: missing from {filename}")
+    print(
+        f"{len(regressions)} regressions beyond {100 * tolerance:.0f}% "
+        f"against {baseline}"
+    )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the engines and the python analysis, and compare with a baseline"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run", help="Run the benchmarks")
+    run_parser.add_argument(
+        "-o",
+        "--output",
+        help=f"The json-file to write (default {OUTPUT})",
+        default=OUTPUT,
+    )
+    run_parser.add_argument(
+        "-m",
+        "--min-time",
+        help="Minimum duration of every engine measurement in seconds (default 0.2)",
+        type=float,
+        default=0.2,
+    )
+    run_parser.add_argument(
+        "-r",
+        "--repeats",
+        help="Number of times every python kernel is run (default 5)",
+        type=int,
+        default=5,
+    )
+    run_parser.add_argument(
+        "-p",
+        "--python-only",
+        help="Only benchmark the python kernels",
+        action="store_true",
+    )
+    run_parser.add_argument(
+        "-s",
+        "--save-baseline",
+        help=f"Also store the results as the baseline, in {BASELINE}",
+        action="store_true",
+    )
+    compare_parser = subparsers.add_parser(
+        "compare", help="Compare a run with the baseline, failing on regressions"
+    )
+    compare_parser.add_argument(
+        "current",
+        help=f"The json-file of the run (default {OUTPUT})",
+        nargs="?",
+        default=OUTPUT,
+    )
+    compare_parser.add_argument(
+        "baseline",
+        help=f"The json-file of the baseline (default {BASELINE})",
+        nargs="?",
+        default=BASELINE,
+    )
+    compare_parser.add_argument(
+        "-t",
+        "--tolerance",
+        help=f"The relative change for the worse which is accepted (default {TOLERANCE})",
+        type=float,
+        default=TOLERANCE,
+    )
+    args = parser.parse_args()
+
+    if args.command == "run":
+        run(args.output, args.min_time, args.repeats, not args.python_only)
+        if args.save_baseline:
+            shutil.copyfile(args.output, BASELINE)
+    elif compare(args.current, args.baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Burn-in analysis of time series sampled from the IsingModel
+
+The running averages are found with a single cumulative sum, and the
+equilibration point is detected with MSER (marginal standard error rule):
+the series is split into batches, and the number of batches to discard
+minimizes the variance of the remaining batch means divided by the squared
+number of remaining batches. This is the same rule as stat_utils::mser,
+which the runner uses to choose the burn-in time.
+"""
+
+import numpy as np
+
+
+def running_mean(samples):
+    """Calculate the average of the first n samples, for every n
+
+    Parameters
+    ----------
+        samples : np.ndarray
+            Samples, in the order they were made
+
+    Returns
+    -------
+        running_mean : np.ndarray
+            The running average
+    """
+    return np.cumsum(samples, dtype=float) / np.arange(1, len(samples) + 1)
+
+
+def mser(samples, batch_size=5, max_fraction=0.75):
+    """Find the number of samples to discard with MSER
+
+    Parameters
+    ----------
+        samples : np.ndarray
+            Samples, in the order they were made
+        batch_size : int
+            Number of samples per batch
+        max_fraction : float
+            Largest fraction of the batches which may be discarded
+
+    Returns
+    -------
+        burn_in_time : int
+            Number of samples to discard
+    """
+    batches = len(samples) // batch_size
+    if batches < 2:
+        return 0
+    batch_means = np.mean(
+        np.asarray(samples[: batches * batch_size], dtype=float).reshape(
+            batches, batch_size
+        ),
+        axis=1,
+    )
+    # suffix sums of the batch means and of their squares
+    suffix_sum = np.cumsum(batch_means[::-1])[::-1]
+    suffix_sum_sq = np.cumsum(batch_means[::-1] ** 2)[::-1]
+    remaining = batches - np.arange(batches)
+    statistic = (suffix_sum_sq - suffix_sum ** 2 / remaining) / remaining ** 2
+    max_d = int(max_fraction * batches)
+    return int(np.argmin(statistic[: max_d + 1])) * batch_size
+
+
+def burn_in_time(sampled_energy, sampled_magnetization_abs, batch_size=5):
+    """Find the burn-in time of a simulation, when both E and |M| have equilibrated
+
+    Parameters
+    ----------
+        sampled_energy : np.ndarray
+            Energy sampled from IsingModel
+        sampled_magnetization_abs : np.ndarray
+            Absolute magnetization sampled from IsingModel
+        batch_size : int
+            Number of samples per batch
+
+    Returns
+    -------
+        burn_in_time : int
+            Number of samples to discard
+    """
+    return max(
+        mser(sampled_energy, batch_size), mser(sampled_magnetization_abs, batch_size)
+    )
@@ -0,0 +1,209 @@
+"""
+Content-addressed cache of the results of runner invocations
+
+Every invocation is keyed on its arguments together with a hash of the
+runner executable. The sample sizes and burn-in settings are compiled
+into the runner, so any change to them (or to the engine) gives new keys,
+and identical invocations give identical keys.
+
+An entry holds the stdout of the invocation and copies of the files it
+wrote. On a hit, the files are copied back into place instead of running
+the simulation again. The cache directory is bounded in size, and the
+least recently used entries are evicted first.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+
+CACHE_DIR = ".cache/runner"
+MAX_BYTES = 4 * 2 ** 30
+RUNNER = "./runner"
+
+enabled = True
+
+
+def _file_hash(filename, chunk_size=2 ** 20):
+    """Calculate the sha256 hash of a file"""
+    h = hashlib.sha256()
+    with open(filename, "rb") as infile:
+        for chunk in iter(lambda: infile.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+_engine_hashes = {}
+
+
+def engine_hash(runner=None):
+    """Get the hash of the runner executable, following the symlink
+
+    Parameters
+    ----------
+        runner : str
+            Path of the runner, by default RUNNER
+
+    Returns
+    -------
+        hash : str
+            The sha256 hash of the executable
+    """
+    path = os.path.realpath(runner or RUNNER)
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    if key not in _engine_hashes:
+        _engine_hashes[key] = _file_hash(path)
+    return _engine_hashes[key]
+
+
+def cache_key(args, runner=None):
+    """Find the key of an invocation of the runner
+
+    Parameters
+    ----------
+        args : list of str
+            The arguments to the runner
+        runner : str
+            Path of the runner, by default RUNNER
+
+    Returns
+    -------
+        key : str
+            The sha256 hash of the arguments and of the runner
+    """
+    description = json.dumps(
+        {"args": [str(arg) for arg in args], "engine": engine_hash(runner)}
+    )
+    return hashlib.sha256(description.encode()).hexdigest()
+
+
+def _size(directory):
+    """Calculate the total size of the files in a directory"""
+    return sum(
+        os.path.getsize(os.path.join(root, filename))
+        for root, _, filenames in os.walk(directory)
+        for filename in filenames
+    )
+
+
+def evict(cache_dir=CACHE_DIR, max_bytes=MAX_BYTES):
+    """Remove the least recently used entries until the cache fits within max_bytes
+
+    Parameters
+    ----------
+        cache_dir : str
+            The cache directory
+        max_bytes : int
+            The maximum total size of the entries
+    """
+    if not os.path.isdir(cache_dir):
+        return
+    entries = []
+    for key in os.listdir(cache_dir):
+        entry = os.path.join(cache_dir, key)
+        if os.path.isdir(entry) and not key.startswith("."):
+            entries.append((os.path.getmtime(entry), _size(entry), entry))
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in entries:
+        if total <= max_bytes:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
+
+
+def _matching(outputs):
+    """Find the files matching any of the glob patterns"""
+    return sorted({filename for pattern in outputs for filename in glob.glob(pattern)})
+
+
+def _file_hash_name(filename):
+    """Name a cached copy of a file by the hash of its path"""
+    return hashlib.sha256(filename.encode()).hexdigest()
+
+
+def run(
+    args, outputs=(), echo=False, threads=None, cache_dir=CACHE_DIR, max_bytes=MAX_BYTES
+):
+    """Run the runner, or restore the result of an identical earlier run
+
+    Files matching the output patterns are removed before the run, such
+    that only the files written by this invocation are stored.
+
+    Parameters
+    ----------
+        args : list of str
+            The arguments to the runner
+        outputs : list of str
+            Glob patterns of the files written by the invocation
+        echo : bool
+            If True, the stdout of the invocation is printed
+        threads : int
+            Number of OpenMP threads of the runner, by default all cores
+        cache_dir : str
+            The cache directory
+        max_bytes : int
+            The maximum total size of the cache
+
+    Returns
+    -------
+        result : subprocess.CompletedProcess
+            The result of the invocation, with stdout as text
+    """
+    command = [RUNNER, *map(str, args)]
+    env = None
+    if threads is not None:
+        env = dict(os.environ, OMP_NUM_THREADS=str(threads))
+    for filename in _matching(outputs):
+        os.remove(filename)
+
+    if not enabled:
+        result = subprocess.run(command, stdout=subprocess.PIPE, text=True, env=env)
+        if echo:
+            print(result.stdout, end="")
+        return result
+
+    key = cache_key(args)
+    entry = os.path.join(cache_dir, key)
+    if os.path.isdir(entry):
+        with open(os.path.join(entry, "entry.json")) as infile:
+            description = json.load(infile)
+        for filename in description["files"]:
+            os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+            shutil.copyfile(
+                os.path.join(entry, "files", _file_hash_name(filename)), filename
+            )
+        os.utime(entry)
+        if echo:
+            print(description["stdout"], end="")
+        return subprocess.CompletedProcess(command, 0, description["stdout"])
+
+    result = subprocess.run(command, stdout=subprocess.PIPE, text=True, env=env)
+    if echo:
+        print(result.stdout, end="")
+    if result.returncode != 0:
+        return result
+
+    # write the entry to a temporary directory first, such that a partly
+    # written entry is never found
+    os.makedirs(cache_dir, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".", dir=cache_dir)
+    os.makedirs(os.path.join(staging, "files"))
+    files = _matching(outputs)
+    for filename in files:
+        shutil.copyfile(
+            filename, os.path.join(staging, "files", _file_hash_name(filename))
+        )
+    with open(os.path.join(staging, "entry.json"), "w") as outfile:
+        json.dump({"args": command, "files": files, "stdout": result.stdout}, outfile)
+    try:
+        os.rename(staging, entry)
+    except OSError:
+        # an identical run finished first
+        shutil.rmtree(staging, ignore_errors=True)
+    evict(cache_dir, max_bytes)
+    return result
@@ -0,0 +1,332 @@
+"""
+Vectorized Metropolis algorithm for the IsingModel, using a red/black
+checkerboard decomposition of the lattice
+
+The spins of one colour only interact with spins of the other colour, so
+all spins of one colour can be updated at once. One call to metropolis()
+updates the red and then the black sublattice, which is one MC-cycle of
+L * L attempted spin flips, like IsingModel::metropolis in the c++ code.
+
+ReplicaIsingModel keeps R independent lattices (e.g. one per temperature of
+a sweep) in a single (R, L, L) array, and advances all of them with the
+same vectorized operations.
+
+Use to get samples in-process, without building and calling the runner
+"""
+
+import numpy as np
+
+
+def checkerboard_neighbours(L):
+    """Find the flat indices of the two sublattices and of their neighbours
+
+    Parameters
+    ----------
+        L : int
+            Size of the lattice, must be even for the periodic lattice to be
+            a checkerboard. For L=2 both sites of a colour share the same
+            neighbours and the update is not ergodic, so L >= 4 is needed
+
+    Returns
+    -------
+        sites : list of np.ndarray
+            The flat indices of the red and of the black sites
+        neighbours : list of np.ndarray
+            For each colour, the flat indices of the 4 neighbours of every site,
+            with shape (4, L * L / 2)
+    """
+    assert L % 2 == 0 and L >= 4, "The checkerboard decomposition needs an even L >= 4"
+    i, j = np.indices((L, L))
+    sites, neighbours = [], []
+    for colour in [0, 1]:
+        mask = (i + j) % 2 == colour
+        ix, iy = i[mask], j[mask]
+        sites.append(ix * L + iy)
+        neighbours.append(
+            np.stack(
+                [
+                    ix * L + (iy + 1) % L,
+                    ix * L + (iy - 1) % L,
+                    ((ix + 1) % L) * L + iy,
+                    ((ix - 1) % L) * L + iy,
+                ]
+            )
+        )
+    return sites, neighbours
+
+
+class CheckerboardIsingModel:
+    def __init__(self, L, T, random_spins=True, seed=None):
+        """Initialize the checkerboard ising model
+
+        Parameters
+        ----------
+            L : int
+                Size of the lattice
+            T : float
+                Temperature of the system
+            random_spins : bool
+                If True, starting spin state is chosen randomly. Else all
+                spins are pointing in the same direction
+            seed : int
+                Seed for the RNG
+        """
+        self._L = L
+        self._N = L ** 2
+        self._T = T
+        self._beta = 1 / T
+        self._rng = np.random.default_rng(seed)
+        self._sites, self._neighbours = checkerboard_neighbours(L)
+
+        if random_spins:
+            self.spins = self._rng.choice(np.array([-1, 1], dtype=np.int8), self._N)
+        else:
+            self.spins = np.ones(self._N, dtype=np.int8)
+
+        spins = self.spins.reshape(L, L).astype(int)
+        self.E = -int(
+            np.sum(spins * np.roll(spins, 1, axis=0))
+            + np.sum(spins * np.roll(spins, 1, axis=1))
+        )
+        self.M = int(np.sum(spins))
+
+        # precomputed exponential values, indexed by delta_E / 4 + 2
+        self.exp_factors = np.exp(-self._beta * np.arange(-8, 9, 4))
+
+    def metropolis(self):
+        """Performs one MC-cycle, updating the red and then the black sites"""
+        for sites, neighbours in zip(self._sites, self._neighbours):
+            s = self.spins[sites].astype(int)
+            delta_E = 2 * s * np.sum(self.spins[neighbours], axis=0, dtype=int)
+            w = self.exp_factors[delta_E // 4 + 2]
+            flip = self._rng.random(len(sites)) <= w
+
+            self.spins[sites[flip]] *= -1
+            self.E += int(np.sum(delta_E[flip]))
+            self.M -= 2 * int(np.sum(s[flip]))
+
+    def get_energy(self):
+        """Get the energy of the IsingModel"""
+        return self.E
+
+    def get_magnetization(self):
+        """Get the magnetization of the IsingModel"""
+        return self.M
+
+    def get_epsilon(self):
+        """Get the epsilon of the IsingModel"""
+        return self.E / self._N
+
+    def get_m(self):
+        """Get m of the IsingModel"""
+        return self.M / self._N
+
+    def get_spins(self):
+        """Get the matrix of spins"""
+        return self.spins.reshape(self._L, self._L)
+
+
+class ReplicaIsingModel:
+    def __init__(self, L, temperatures, random_spins=True, seed=None):
+        """Initialize R replicas of the checkerboard ising model
+
+        Parameters
+        ----------
+            L : int
+                Size of the lattices
+            temperatures : array_like
+                Temperature of every replica
+            random_spins : bool
+                If True, starting spin states are chosen randomly. Else all
+                spins are pointing in the same direction
+            seed : int
+                Seed for the RNG, which is shared by all the replicas
+        """
+        self._L = L
+        self._N = L ** 2
+        self._T = np.atleast_1d(np.asarray(temperatures, dtype=float))
+        self._R = len(self._T)
+        self._beta = 1 / self._T
+        self._rng = np.random.default_rng(seed)
+        self._sites, self._neighbours = checkerboard_neighbours(L)
+
+        shape = (self._R, self._N)
+        if random_spins:
+            self.spins = self._rng.choice(np.array([-1, 1], dtype=np.int8), shape)
+        else:
+            self.spins = np.ones(shape, dtype=np.int8)
+
+        spins = self.spins.reshape(self._R, L, L).astype(int)
+        self.E = -(
+            np.sum(spins * np.roll(spins, 1, axis=1), axis=(1, 2))
+            + np.sum(spins * np.roll(spins, 1, axis=2), axis=(1, 2))
+        )
+        self.M = np.sum(spins, axis=(1, 2))
+
+        # precomputed exponential values for every replica, indexed by delta_E / 4 + 2
+        self.exp_factors = np.exp(-self._beta[:, None] * np.arange(-8, 9, 4))
+
+    def metropolis(self):
+        """Performs one MC-cycle of every replica, updating the red and then the black sites"""
+        for sites, neighbours in zip(self._sites, self._neighbours):
+            s = self.spins[:, sites].astype(int)
+            delta_E = 2 * s * np.sum(self.spins[:, neighbours], axis=1, dtype=int)
+            w = np.take_along_axis(self.exp_factors, delta_E // 4 + 2, axis=1)
+            flip = self._rng.random(s.shape) <= w
+
+            self.spins[:, sites] = np.where(flip, -s, s)
+            self.E += np.sum(delta_E * flip, axis=1)
+            self.M -= 2 * np.sum(s * flip, axis=1)
+
+    def get_energy(self):
+        """Get the energy of every replica"""
+        return self.E
+
+    def get_magnetization(self):
+        """Get the magnetization of every replica"""
+        return self.M
+
+    def get_spins(self):
+        """Get the matrix of spins of every replica"""
+        return self.spins.reshape(self._R, self._L, self._L)
+
+
+def sample(iters, L, T, seed=None, burn_in_time=10000, random_spins=True):
+    """Samples from the checkerboard IsingModel, once per MC-cycle
+
+    Parameters
+    ----------
+        iters : int
+            Number of samples to make
+        L : int
+            Size of the IsingModel
+        T : float
+            Temperature of the IsingModel
+        seed : int
+            Seed for RNG
+        burn_in_time : int
+            Number of iterations to discard
+        random_spins : bool
+            If True, starting spin state of the IsingModel is chosen randomly.
+            Else all spins are pointing in the same direction
+
+    Returns
+    -------
+        sampled_energy, sampled_magnetization_abs : np.ndarray
+            The energy and the absolute magnetization after every MC-cycle
+    """
+    model = CheckerboardIsingModel(L, T, random_spins, seed)
+    for _ in range(burn_in_time):
+        model.metropolis()
+
+    sampled_energy = np.empty(iters, dtype=np.int32)
+    sampled_magnetization_abs = np.empty(iters, dtype=np.int32)
+    for i in range(iters):
+        model.metropolis()
+        sampled_energy[i] = model.E
+        sampled_magnetization_abs[i] = abs(model.M)
+    return sampled_energy, sampled_magnetization_abs
+
+
+def sample_replicas(
+    iters, L, temperatures, seed=None, burn_in_time=10000, random_spins=True
+):
+    """Samples from one replica per temperature, once per MC-cycle
+
+    Parameters
+    ----------
+        iters : int
+            Number of samples to make
+        L : int
+            Size of the IsingModels
+        temperatures : array_like
+            Temperature of every replica
+        seed : int
+            Seed for RNG
+        burn_in_time : int
+            Number of iterations to discard
+        random_spins : bool
+            If True, starting spin states are chosen randomly. Else all spins
+            are pointing in the same direction
+
+    Returns
+    -------
+        sampled_energy, sampled_magnetization_abs : np.ndarray
+            The energy and the absolute magnetization after every MC-cycle,
+            with shape (R, iters)
+    """
+    model = ReplicaIsingModel(L, temperatures, random_spins, seed)
+    for _ in range(burn_in_time):
+        model.metropolis()
+
+    sampled_energy = np.empty((model._R, iters), dtype=np.int32)
+    sampled_magnetization_abs = np.empty((model._R, iters), dtype=np.int32)
+    for i in range(iters):
+        model.metropolis()
+        sampled_energy[:, i] = model.E
+        sampled_magnetization_abs[:, i] = abs(model.M)
+    return sampled_energy, sampled_magnetization_abs
+
+
+def values(sampled_energy, sampled_magnetization_abs, L, T):
+    """From sampled values, estimates <epsilon>, <|m|>, C_v and chi
+
+    Parameters
+    ----------
+        sampled_energy : np.ndarray
+            Energy sampled from IsingModel, the last axis is time
+        sampled_magnetization_abs : np.ndarray
+            Absolute magnetization sampled from IsingModel, the last axis is time
+        L : int
+            Size of the IsingModel
+        T : float or np.ndarray
+            Temperature of the IsingModel (one per replica)
+
+    Returns
+    -------
+        expected_epsilon, expected_m_abs, c_v, chi : float or np.ndarray
+            The estimated values (one per replica)
+    """
+    N = L ** 2
+    T = np.asarray(T, dtype=float)
+    E = np.asarray(sampled_energy, dtype=float)
+    M = np.asarray(sampled_magnetization_abs, dtype=float)
+    expected_epsilon = np.mean(E, axis=-1) / N
+    expected_m_abs = np.mean(M, axis=-1) / N
+    c_v = (1 / N) * (1 / (T * T)) * (np.mean(E * E, axis=-1) - np.mean(E, axis=-1) ** 2)
+    chi = (1 / N) * (1 / T) * (np.mean(M * M, axis=-1) - np.mean(M, axis=-1) ** 2)
+    return expected_epsilon, expected_m_abs, c_v, chi
+
+
+def look_between_temperatures(
+    T_min, T_max, L, steps, seed=None, iters=1000000, burn_in_time=30000
+):
+    """Estimates values for all temperatures of a sweep, with one replica per temperature
+
+    Parameters
+    ----------
+        T_min : float
+            The minimum temperature to estimate for
+        T_max : float
+            The maximum temperature to estimate for (non inclusive)
+        L : int
+            The size of the IsingModels
+        steps : int
+            The number of temperatures between T_min and T_max
+        seed : int
+            Seed for RNG
+        iters : int
+            Number of samples to make for every temperature
+        burn_in_time : int
+            Number of iterations to discard
+
+    Returns
+    -------
+        T, expected_epsilon, expected_m_abs, c_v, chi : np.ndarray
+            The temperatures and the estimated values, sorted by temperature
+    """
+    T = T_min + np.arange(steps) * (T_max - T_min) / steps
+    sampled_energy, sampled_magnetization_abs = sample_replicas(
+        iters, L, T, seed, burn_in_time
+    )
+    return (T, *values(sampled_energy, sampled_magnetization_abs, L, T))
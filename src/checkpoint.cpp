@@ -0,0 +1,50 @@
+#include "project4/checkpoint.hpp"
+
+#include <cstdint>
+#include <cstdio>
+#include <fstream>
+#include <sstream>
+
+// IMPORTANT NOTE:
+// Documentation is found in the header-file
+
+std::string checkpoint::engine_hash(){
+    static const std::string hash = [](){
+        std::ifstream executable("/proc/self/exe", std::ios::binary);
+        if (!executable) return std::string("unknown");
+        uint64_t h = 14695981039346656037ULL;
+        char buffer[1 << 16];
+        while (executable.read(buffer, sizeof(buffer)) or executable.gcount() > 0){
+            for (std::streamsize i = 0; i < executable.gcount(); i++){
+                h = (h ^ (unsigned char) buffer[i]) * 1099511628211ULL;
+            }
+        }
+        std::ostringstream hex;
+        hex << std::hex << h;
+        return hex.str();
+    }();
+    return hash;
+}
+
+void checkpoint::save(const std::string &filename, IsingModel &model, const State &state){
+    std::string temporary = filename + ".tmp";
+    std::ofstream outfile(temporary);
+    outfile << "ISINGCHK 4\n";
+    outfile << state.engine << " " << state.sample_size << "\n";
+    state.moments.save(outfile);
+    outfile << state.burn_in_time << " " << state.clusters_per_iteration << "\n";
+    model.save_state(outfile);
+    outfile.close();
+    std::rename(temporary.c_str(), filename.c_str());
+}
+
+bool checkpoint::load(const std::string &filename, IsingModel &model, State &state){
+    std::ifstream infile(filename);
+    std::string magic;
+    int version;
+    if (!(infile >> magic >> version) or magic != "ISINGCHK" or version != 4) return false;
+    infile >> state.engine >> state.sample_size;
+    state.moments.load(infile);
+    infile >> state.burn_in_time >> state.clusters_per_iteration;
+    return !infile.fail() and model.load_state(infile);
+}
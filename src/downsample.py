@@ -0,0 +1,128 @@
+"""
+Shape-preserving downsampling of series before they are plotted
+
+A plotted series never needs more points than the figure can show, and
+every point ends up as a coordinate in the tikz-file. Two downsamplers are
+available:
+
+    - lttb (largest triangle three buckets, Steinarsson 2013): the series is
+      split into buckets, and from every bucket the point forming the
+      largest triangle with the point chosen from the previous bucket and
+      the average of the next bucket is kept. This keeps the visual shape
+      of smooth curves such as running averages
+    - minmax: the smallest and largest value of every bucket are kept, in
+      the order they appear. This keeps the envelope of noisy series
+
+Both keep the first and the last point.
+"""
+
+import numpy as np
+
+POINT_BUDGET = 500
+
+
+def _bucket_edges(n, buckets):
+    """Split the inner points 1, ..., n - 2 into buckets of (almost) equal size"""
+    return 1 + np.floor(np.arange(buckets + 1) * (n - 2) / buckets).astype(int)
+
+
+def lttb(x, y, points=POINT_BUDGET):
+    """Downsample a series with the largest triangle three buckets algorithm
+
+    Parameters
+    ----------
+        x : np.ndarray
+            The x-values, in increasing order
+        y : np.ndarray
+            The y-values
+        points : int
+            The largest number of points to keep, at least 3
+
+    Returns
+    -------
+        x, y : np.ndarray
+            The downsampled series
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    n = len(x)
+    if n <= points or points < 3:
+        return x, y
+    edges = _bucket_edges(n, points - 2)
+    kept = np.empty(points, dtype=int)
+    kept[0], kept[-1] = 0, n - 1
+    for k in range(points - 2):
+        start, end = edges[k], edges[k + 1]
+        if k + 1 < points - 2:
+            x_next = np.mean(x[end : edges[k + 2]])
+            y_next = np.mean(y[end : edges[k + 2]])
+        else:
+            x_next, y_next = x[-1], y[-1]
+        x_previous, y_previous = x[kept[k]], y[kept[k]]
+        # twice the area of the triangles, the constant factor does not matter
+        area = np.abs(
+            (x_previous - x_next) * (y[start:end] - y_previous)
+            - (x_previous - x[start:end]) * (y_next - y_previous)
+        )
+        kept[k + 1] = start + np.argmax(area)
+    return x[kept], y[kept]
+
+
+def minmax(x, y, points=POINT_BUDGET):
+    """Downsample a series to the minimum and maximum of every bucket
+
+    Parameters
+    ----------
+        x : np.ndarray
+            The x-values, in increasing order
+        y : np.ndarray
+            The y-values
+        points : int
+            The largest number of points to keep, at least 4
+
+    Returns
+    -------
+        x, y : np.ndarray
+            The downsampled series
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    n = len(x)
+    if n <= points or points < 4:
+        return x, y
+    buckets = (points - 2) // 2
+    edges = _bucket_edges(n, buckets)
+    # sorted by bucket and then by value, the first and last point of every
+    # bucket are its minimum and maximum
+    inner = np.arange(1, n - 1)
+    bucket = np.searchsorted(edges, inner, side="right") - 1
+    order = np.lexsort((y[inner], bucket))
+    first = np.searchsorted(bucket[order], np.arange(buckets))
+    last = np.append(first[1:], len(inner)) - 1
+    lowest, highest = inner[order[first]], inner[order[last]]
+    kept = np.unique(np.concatenate([[0, n - 1], lowest, highest]))
+    return x[kept], y[kept]
+
+
+def downsample(x, y, points=POINT_BUDGET, method="lttb"):
+    """Downsample a series, see lttb and minmax
+
+    Parameters
+    ----------
+        x : np.ndarray
+            The x-values, in increasing order
+        y : np.ndarray
+            The y-values
+        points : int
+            The largest number of points to keep
+        method : str
+            "lttb" or "minmax"
+
+    Returns
+    -------
+        x, y : np.ndarray
+            The downsampled series
+    """
+    if method == "lttb":
+        return lttb(x, y, points)
+    if method == "minmax":
+        return minmax(x, y, points)
+    raise ValueError(f"Unknown downsampling method {method}")
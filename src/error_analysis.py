@@ -0,0 +1,330 @@
+"""
+Statistical errors of values estimated from correlated MC-samples
+
+Consecutive MC-cycles are correlated, so the naive standard error
+sigma / sqrt(n) is too small. This module estimates
+
+    - the integrated autocorrelation time tau_int = 1/2 + sum_t rho(t), with
+      the autocorrelation function rho found by FFT and the sum truncated
+      with Sokal's automatic window. The effective sample size is
+      n / (2 tau_int)
+    - the standard error of a mean by blocking (Flyvbjerg and Petersen),
+      where neighbouring samples are averaged pairwise until the blocks are
+      uncorrelated
+    - the standard errors of C_v and chi, which are not means, with a
+      jackknife over blocks of samples
+
+All of these read the samples chunk by chunk, so they work on the
+memory-mapped sample files (see samples.py) without loading the whole
+series.
+"""
+
+import glob
+
+import numpy as np
+
+from samples import read_samples
+
+CHUNK_SIZE = 2 ** 20
+
+
+def _chunks(x, chunk_size=CHUNK_SIZE):
+    """Iterate over a series in chunks of floats"""
+    for start in range(0, len(x), chunk_size):
+        yield np.asarray(x[start : start + chunk_size], dtype=float)
+
+
+def autocorrelation(x, max_lag=None, chunk_size=CHUNK_SIZE):
+    """Calculate the normalized autocorrelation function with FFT
+
+    The autocovariance is accumulated chunk by chunk, ignoring the pairs of
+    samples in different chunks, which is negligible when max_lag is much
+    smaller than chunk_size.
+
+    Parameters
+    ----------
+        x : np.ndarray
+            The series
+        max_lag : int
+            The largest lag to calculate, by default half the chunk size
+        chunk_size : int
+            Number of samples to transform at once
+
+    Returns
+    -------
+        rho : np.ndarray
+            The autocorrelation for the lags 0, ..., max_lag - 1
+    """
+    n = len(x)
+    if max_lag is None:
+        max_lag = min(n, chunk_size) // 2
+    max_lag = max(1, min(max_lag, n, chunk_size))
+    mean = sum(np.sum(chunk) for chunk in _chunks(x, chunk_size)) / n
+
+    covariance = np.zeros(max_lag)
+    pairs = np.zeros(max_lag)
+    for chunk in _chunks(x, chunk_size):
+        chunk = chunk - mean
+        size = 2 ** int(np.ceil(np.log2(2 * len(chunk))))
+        f = np.fft.rfft(chunk, size)
+        lags = min(max_lag, len(chunk))
+        covariance[:lags] += np.fft.irfft(f * np.conj(f), size)[:lags]
+        pairs[:lags] += len(chunk) - np.arange(lags)
+
+    covariance = covariance / np.maximum(pairs, 1)
+    if covariance[0] <= 0:
+        # a constant series, every sample is independent of the others
+        rho = np.zeros(max_lag)
+        rho[0] = 1
+        return rho
+    return covariance / covariance[0]
+
+
+def integrated_autocorrelation_time(x, c=6, max_lag=None, chunk_size=CHUNK_SIZE):
+    """Calculate the integrated autocorrelation time, using Sokal's automatic window
+
+    The sum over the autocorrelation function is truncated at the smallest
+    window W with W >= c tau_int(W).
+
+    Parameters
+    ----------
+        x : np.ndarray
+            The series
+        c : float
+            Size of the window in units of tau_int
+        max_lag : int
+            The largest lag to consider, see autocorrelation
+        chunk_size : int
+            Number of samples to transform at once
+
+    Returns
+    -------
+        tau_int : float
+            The integrated autocorrelation time, 1/2 for uncorrelated samples
+    """
+    rho = autocorrelation(x, max_lag, chunk_size)
+    if len(rho) < 2:
+        return 0.5
+    tau = 0.5 + np.cumsum(rho[1:])
+    windows = np.arange(1, len(rho))
+    in_window = windows >= c * tau
+    W = np.argmax(in_window) if np.any(in_window) else len(tau) - 1
+    return max(float(tau[W]), 0.5)
+
+
+class Blocking:
+    def __init__(self):
+        """Streaming blocking analysis of the standard error of a mean
+
+        At level k the series consists of the averages of 2^k neighbouring
+        samples. The sums needed for the variance of every level are kept,
+        such that the samples can be added chunk by chunk with memory
+        logarithmic in the length of the series.
+        """
+        self._count = []
+        self._sum = []
+        self._sum_squared = []
+        self._pending = []
+
+    def add(self, samples):
+        """Add the next samples of the series
+
+        Parameters
+        ----------
+            samples : array_like
+                The samples, in the order they were made
+        """
+        x = np.asarray(samples, dtype=float)
+        level = 0
+        while len(x) > 0:
+            if level == len(self._count):
+                self._count.append(0)
+                self._sum.append(0.0)
+                self._sum_squared.append(0.0)
+                self._pending.append(None)
+            self._count[level] += len(x)
+            self._sum[level] += np.sum(x)
+            self._sum_squared[level] += np.sum(x * x)
+
+            if self._pending[level] is not None:
+                x = np.concatenate([[self._pending[level]], x])
+            if len(x) % 2:
+                self._pending[level], x = x[-1], x[:-1]
+            else:
+                self._pending[level] = None
+            x = (x[0::2] + x[1::2]) / 2
+            level += 1
+
+    @property
+    def mean(self):
+        """The mean of the series"""
+        return self._sum[0] / self._count[0]
+
+    def standard_errors(self, min_blocks=32):
+        """Calculate the naive standard error of the mean at every level
+
+        Parameters
+        ----------
+            min_blocks : int
+                Levels with fewer blocks are left out
+
+        Returns
+        -------
+            errors, uncertainties : np.ndarray
+                The standard error at every level, and its own standard error
+        """
+        errors, uncertainties = [], []
+        for count, total, total_squared in zip(
+            self._count, self._sum, self._sum_squared
+        ):
+            if count < min_blocks:
+                break
+            variance = max(total_squared - total * total / count, 0) / (count - 1)
+            errors.append(np.sqrt(variance / count))
+            uncertainties.append(errors[-1] / np.sqrt(2 * (count - 1)))
+        return np.array(errors), np.array(uncertainties)
+
+    def standard_error(self, min_blocks=32):
+        """Calculate the standard error of the mean, at the plateau of the levels
+
+        The plateau is the first level where the error does not grow
+        significantly with one more level of blocking.
+
+        Parameters
+        ----------
+            min_blocks : int
+                Levels with fewer blocks are left out
+
+        Returns
+        -------
+            error : float
+                The standard error of the mean
+        """
+        errors, uncertainties = self.standard_errors(min_blocks)
+        if len(errors) == 0:
+            return np.nan
+        for level in range(len(errors) - 1):
+            if errors[level + 1] <= errors[level] + uncertainties[level]:
+                return float(errors[level])
+        return float(errors[-1])
+
+
+def blocking_error(x, chunk_size=CHUNK_SIZE):
+    """Calculate the standard error of the mean of a correlated series with blocking
+
+    Parameters
+    ----------
+        x : np.ndarray
+            The series
+        chunk_size : int
+            Number of samples to read at once
+
+    Returns
+    -------
+        error : float
+            The standard error of the mean
+    """
+    blocking = Blocking()
+    for chunk in _chunks(x, chunk_size):
+        blocking.add(chunk)
+    return blocking.standard_error()
+
+
+def _block_sums(x, blocks):
+    """Calculate the sums of x and x^2 within contiguous blocks, leaving out the remainder"""
+    size = len(x) // blocks
+    sums, sums_squared = np.empty(blocks), np.empty(blocks)
+    for k in range(blocks):
+        block = np.asarray(x[k * size : (k + 1) * size], dtype=float)
+        sums[k] = np.sum(block)
+        sums_squared[k] = np.sum(block * block)
+    return sums, sums_squared, size
+
+
+def analyse(sampled_energy, sampled_magnetization_abs, L, T, blocks=None):
+    """Estimate <epsilon>, <|m|>, C_v and chi together with their standard errors
+
+    Parameters
+    ----------
+        sampled_energy : np.ndarray
+            Energy sampled from IsingModel
+        sampled_magnetization_abs : np.ndarray
+            Absolute magnetization sampled from IsingModel
+        L : int
+            Size of the IsingModel
+        T : float
+            Temperature of the IsingModel
+        blocks : int
+            Number of blocks for the jackknife errors of C_v and chi. By
+            default the blocks are made 20 autocorrelation times long, with
+            between 10 and 100 blocks
+
+    Returns
+    -------
+        analysis : dict
+            The values and their errors (keys "<epsilon>", "<epsilon>_error"
+            and so on), the autocorrelation times "tau_E" and "tau_M", and the
+            effective sample size "n_eff"
+    """
+    N = L ** 2
+    n = len(sampled_energy)
+    tau_E = integrated_autocorrelation_time(sampled_energy)
+    tau_M = integrated_autocorrelation_time(sampled_magnetization_abs)
+    if blocks is None:
+        blocks = int(np.clip(n / (20 * max(tau_E, tau_M)), 10, 100))
+
+    # jackknife over blocks, every estimate leaves out one block
+    E_sums, E_squared_sums, size = _block_sums(sampled_energy, blocks)
+    M_sums, M_squared_sums, _ = _block_sums(sampled_magnetization_abs, blocks)
+    count = (blocks - 1) * size
+    E = (np.sum(E_sums) - E_sums) / count
+    E_squared = (np.sum(E_squared_sums) - E_squared_sums) / count
+    M = (np.sum(M_sums) - M_sums) / count
+    M_squared = (np.sum(M_squared_sums) - M_squared_sums) / count
+    c_v = (E_squared - E * E) / (N * T * T)
+    chi = (M_squared - M * M) / (N * T)
+
+    def jackknife_error(estimates):
+        return float(
+            np.sqrt(
+                (blocks - 1) / blocks * np.sum((estimates - np.mean(estimates)) ** 2)
+            )
+        )
+
+    E_mean = np.sum(E_sums) / (blocks * size)
+    M_mean = np.sum(M_sums) / (blocks * size)
+    E_var = np.sum(E_squared_sums) / (blocks * size) - E_mean ** 2
+    M_var = np.sum(M_squared_sums) / (blocks * size) - M_mean ** 2
+    return {
+        "<epsilon>": float(E_mean / N),
+        "<epsilon>_error": blocking_error(sampled_energy) / N,
+        "<|m|>": float(M_mean / N),
+        "<|m|>_error": blocking_error(sampled_magnetization_abs) / N,
+        "C_v": float(E_var / (N * T * T)),
+        "C_v_error": jackknife_error(c_v),
+        "chi": float(M_var / (N * T)),
+        "chi_error": jackknife_error(chi),
+        "tau_E": tau_E,
+        "tau_M": tau_M,
+        "n_eff": n / (2 * max(tau_E, tau_M)),
+    }
+
+
+def main():
+    """Analyse all the sample files in output, and report errors and effective sample sizes"""
+    for filename in sorted(glob.glob("output/samples_*.bin")):
+        header, sampled_energy, sampled_magnetization_abs = read_samples(filename)
+        analysis = analyse(
+            sampled_energy, sampled_magnetization_abs, header["L"], header["T"]
+        )
+        print(filename)
+        for value in ["<epsilon>", "<|m|>", "C_v", "chi"]:
+            print(f"\t{value} = {analysis[value]} +- {analysis[value + '_error']}")
+        print(
+            f"\ttau_E = {analysis['tau_E']:.1f}, tau_M = {analysis['tau_M']:.1f}, "
+            f"{header['cycles']} cycles give n_eff = {analysis['n_eff']:.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+Exact solution of the IsingModel for a finite LxL lattice with periodic
+boundary conditions, using the closed form partition function of Kaufman
+(Phys. Rev. 76, 1232 (1949))
+
+    Z = 1/2 (2 sinh 2K)^(N/2) (Z_1 + Z_2 + Z_3 + Z_4)
+
+where K = J / k_B T and
+
+    Z_1 = prod_{r=0}^{L-1} 2 cosh(L/2 gamma_{2r+1})
+    Z_2 = prod_{r=0}^{L-1} 2 sinh(L/2 gamma_{2r+1})
+    Z_3 = prod_{r=0}^{L-1} 2 cosh(L/2 gamma_{2r})
+    Z_4 = prod_{r=0}^{L-1} 2 sinh(L/2 gamma_{2r})
+
+with cosh(gamma_k) = cosh(2K) coth(2K) - cos(pi k / L) and
+gamma_0 = 2K + ln(tanh(K)). The energy moments follow from the first and
+second derivative of ln(Z) with respect to K, which are found analytically.
+Everything is done in log space, such that large lattices do not overflow.
+
+Use to test against the nummerical implementation for L > 2
+"""
+
+from functools import cached_property
+
+import numpy as np
+
+from analytical_ising_model import AnalyticalIsingModel
+
+
+def _log_cosh(x):
+    """Calculate ln(2 cosh(x)) without overflow"""
+    x = np.abs(x)
+    return x + np.log1p(np.exp(-2 * x))
+
+
+def _log_abs_sinh(x):
+    """Calculate ln(|2 sinh(x)|) without overflow"""
+    x = np.abs(x)
+    return x + np.log1p(-np.exp(-2 * x))
+
+
+class ExactIsingModel:
+    def __init__(self, temperature, L=2):
+        """Initialize the exact ising model
+
+        Parameters
+        ----------
+            temperature : float or array_like
+                The temperature(s) of the system
+            L : int
+                The size of the lattice
+        """
+        self._L = L
+        self._N = L ** 2
+        self._T = np.asarray(temperature, dtype=float)
+        self._beta = 1 / self._T  # Boltzman-constant?
+
+    @cached_property
+    def _log_Z_and_derivatives(self):
+        """Calculate ln(Z) and its first and second derivative with respect to beta
+
+        Returns
+        -------
+            log_Z, d_log_Z, d2_log_Z : tuple of np.ndarray
+                ln(Z), d ln(Z) / d beta and d^2 ln(Z) / d beta^2
+        """
+        L, N = self._L, self._N
+        K = self._beta[..., None]
+        s, c = np.sinh(2 * K), np.cosh(2 * K)
+
+        # gamma_k for k = 0, ..., 2L - 1 together with derivatives w.r.t. K
+        k = np.arange(2 * L)
+        cosh_gamma = c * c / s - np.cos(np.pi * k / L)
+        d_cosh_gamma = 2 * c - 2 * c / (s * s)
+        d2_cosh_gamma = 4 * s - 4 / s + 8 * c * c / (s * s * s)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            gamma = np.arccosh(cosh_gamma)
+            sinh_gamma = np.sinh(gamma)
+            d_gamma = d_cosh_gamma / sinh_gamma
+            d2_gamma = (d2_cosh_gamma - cosh_gamma * d_gamma ** 2) / sinh_gamma
+
+        # gamma_0 carries a sign, which changes at the critical temperature
+        gamma[..., 0] = 2 * K[..., 0] + np.log(np.tanh(K[..., 0]))
+        d_gamma[..., 0] = 2 + 2 / s[..., 0]
+        d2_gamma[..., 0] = -4 * c[..., 0] / (s[..., 0] * s[..., 0])
+
+        # ln|Z_i|, sign(Z_i) and the derivatives of ln|Z_i| for i = 1, ..., 4
+        log_Z_i, sign_Z_i, d_log_Z_i, d2_log_Z_i = [], [], [], []
+        for offset, use_cosh in [(1, True), (1, False), (0, True), (0, False)]:
+            x = L / 2 * gamma[..., offset::2]
+            dx = L / 2 * d_gamma[..., offset::2]
+            d2x = L / 2 * d2_gamma[..., offset::2]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                if use_cosh:
+                    log_f = _log_cosh(x)
+                    g = np.tanh(x)
+                    dg = 1 - g * g
+                else:
+                    log_f = _log_abs_sinh(x)
+                    g = 1 / np.tanh(x)
+                    dg = 1 - g * g
+            log_Z_i.append(np.sum(log_f, axis=-1))
+            sign_Z_i.append(np.prod(np.sign(x), axis=-1) if not use_cosh else 1.0)
+            d_log_Z_i.append(np.sum(dx * g, axis=-1))
+            d2_log_Z_i.append(np.sum(d2x * g + dx * dx * dg, axis=-1))
+
+        # Near the critical temperature gamma_0 vanishes, and the derivatives
+        # of ln|Z_4| cancel catastrophically. Z_4 = 2 sinh(x_0) P, with
+        # x_0 = L/2 gamma_0 and P the product of the other factors, is linear
+        # in x_0 there, so Z_4 and its derivatives are found from those of
+        # 2 sinh(x_0) and of ln(P) instead, both scaled by exp(-|x_0|)
+        x_0, dx_0, d2x_0 = x[..., 0], dx[..., 0], d2x[..., 0]
+        log_P = np.sum(log_f[..., 1:], axis=-1)
+        sign_P = np.prod(np.sign(x[..., 1:]), axis=-1)
+        d_log_P = np.sum((dx * g)[..., 1:], axis=-1)
+        d2_log_P = np.sum((d2x * g + dx * dx * dg)[..., 1:], axis=-1)
+        sinh_0 = -np.sign(x_0) * np.expm1(-2 * np.abs(x_0))
+        d_sinh_0 = (1 + np.exp(-2 * np.abs(x_0))) * dx_0
+        d2_sinh_0 = sinh_0 * dx_0 ** 2 + (1 + np.exp(-2 * np.abs(x_0))) * d2x_0
+
+        log_Z_i = np.stack(np.broadcast_arrays(*log_Z_i))
+        sign_Z_i = np.stack(np.broadcast_arrays(*sign_Z_i))
+        d_log_Z_i = np.stack(d_log_Z_i)
+        d2_log_Z_i = np.stack(d2_log_Z_i)
+
+        # signed sum of Z_1 + Z_2 + Z_3 + Z_4 and of its derivatives, relative
+        # to the largest |Z_i|
+        log_Z_max = np.max(log_Z_i, axis=0)
+        with np.errstate(invalid="ignore"):
+            values = sign_Z_i * np.exp(log_Z_i - log_Z_max)
+            first = values * d_log_Z_i
+            second = values * (d2_log_Z_i + d_log_Z_i ** 2)
+        P = sign_P * np.exp(log_P + np.abs(x_0) - log_Z_max)
+        values[3] = sinh_0 * P
+        first[3] = (d_sinh_0 + sinh_0 * d_log_P) * P
+        second[3] = (
+            d2_sinh_0 + 2 * d_sinh_0 * d_log_P + sinh_0 * (d2_log_P + d_log_P ** 2)
+        ) * P
+        total = np.sum(values, axis=0)
+        log_sum = log_Z_max + np.log(total)
+        d_log_sum = np.sum(first, axis=0) / total
+        d2_log_sum = np.sum(second, axis=0) / total - d_log_sum ** 2
+
+        # the prefactor 1/2 (2 sinh 2K)^(N/2)
+        s, c = s[..., 0], c[..., 0]
+        log_Z = -np.log(2) + N / 2 * np.log(2 * s) + log_sum
+        d_log_Z = N * c / s + d_log_sum
+        d2_log_Z = -2 * N / (s * s) + d2_log_sum
+
+        return log_Z, d_log_Z, d2_log_Z
+
+    @property
+    def log_Z(self):
+        """Calculate the logarithm of the partition function
+
+        Returns
+        -------
+            log_Z : float or np.ndarray
+                The logarithm of the partition function
+        """
+        return self._log_Z_and_derivatives[0]
+
+    @property
+    def Z(self):
+        """Calculate the partition function (overflows for large lattices, see log_Z)
+
+        Returns
+        -------
+            Z : float or np.ndarray
+                The partition function
+        """
+        return np.exp(self.log_Z)
+
+    @property
+    def expected_E(self):
+        """Calculate the expected energy
+
+        Returns
+        -------
+            E : float or np.ndarray
+                The expected energy
+        """
+        return -self._log_Z_and_derivatives[1]
+
+    @property
+    def expected_epsilon(self):
+        """Calculate the expected energy per spin
+
+        Returns
+        -------
+            epsilon : float or np.ndarray
+                The expected energy
+        """
+        return self.expected_E / self._N
+
+    @property
+    def expected_E_squared(self):
+        """Calculate the expected energy squared
+
+        Returns
+        -------
+            E_squared : float or np.ndarray
+                The expected energy squared
+        """
+        return self._log_Z_and_derivatives[2] + self.expected_E ** 2
+
+    @property
+    def expected_epsilon_squared(self):
+        """Calculate the expected energy squared per spin
+
+        Returns
+        -------
+            epsilon_squared : float or np.ndarray
+                The expected energy squared
+        """
+        return self.expected_E_squared / (self._N * self._N)
+
+    @property
+    def C_v(self):
+        """Calculate the specific heat capacity
+
+        Returns
+        -------
+            C_v : float or np.ndarray
+                The specific heat capacity
+        """
+        return (
+            (1 / self._N) * (1 / (self._T * self._T)) * self._log_Z_and_derivatives[2]
+        )
+
+
+def test_exact_ising_model():
+    """Test the exact ising model against the analytical 2x2 solution
+
+    The critical temperature, where gamma_0 = 0, is included, and C_v of a
+    larger lattice is checked to be continuous there.
+    """
+    T_c = 2 / np.log(1 + np.sqrt(2))
+    T = np.append(np.arange(1, 2.5, 0.1), T_c)
+    exact_ising_model = ExactIsingModel(T, L=2)
+    for i, temperature in enumerate(T):
+        analytical_ising_model = AnalyticalIsingModel(
+            "output/state_summary.csv", temperature=temperature
+        )
+        assert (
+            abs(exact_ising_model.Z[i] / analytical_ising_model.Z - 1) < 1e-12
+        ), "Z-values are not equal"
+        assert (
+            abs(
+                exact_ising_model.expected_epsilon[i]
+                - analytical_ising_model.expected_epsilon
+            )
+            < 1e-12
+        ), "Expected epsilon-values are not equal"
+        assert (
+            abs(exact_ising_model.C_v[i] - analytical_ising_model.C_v) < 1e-12
+        ), "C_v-values are not equal"
+
+    C_v = ExactIsingModel(T_c * np.array([1 - 1e-9, 1, 1 + 1e-9]), L=20).C_v
+    assert np.all(
+        np.abs(C_v - C_v[1]) < 1e-6
+    ), "C_v is not continuous at the critical temperature"
+
+
+def main():
+    """
+    Verify the exact expressions against the analytical 2x2 case and write
+    the exact values for the lattice sizes used in the simulations to file
+    """
+    test_exact_ising_model()
+
+    T = np.linspace(2.1, 2.4, 301)
+    for L in range(20, 160, 20):
+        exact_ising_model = ExactIsingModel(T, L=L)
+        np.savetxt(
+            f"output/exact_L={L}.csv",
+            np.column_stack(
+                [T, exact_ising_model.expected_epsilon, exact_ising_model.C_v]
+            ),
+            delimiter=",",
+            header="T,<epsilon>,C_v",
+            comments="",
+        )
+
+
+if __name__ == "__main__":
+    main()
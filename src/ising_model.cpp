@@ -6,15 +6,18 @@ using namespace std;
 // IMPORTANT NOTE:
 // Documentation is found in the header-file
 
-IsingModel::IsingModel(int lattice_length, double T, bool random_spins, int seed){
+IsingModel::IsingModel(int lattice_length, double T, bool random_spins, int seed, uint64_t stream){
     L = lattice_length;
     beta = 1/T; 
+    p_add = 1 - exp(-2 * beta);
     rand_spins = random_spins;
-    rng = mt19937(seed);
+    rng = Philox(seed, stream);
     rand_index = uniform_int_distribution<int>(0, L-1);
     rand_1_or_0 = uniform_int_distribution<int>(0, 1);
     uniform = uniform_real_distribution<double>(0, 1);
     initialize_spins(L);
+    in_cluster = vector<vector<int>>(L, vector<int>(L, 0));
+    cluster_id = 0;
     set_energy();
     set_magnetization();
     precompute_exp_factors();
@@ -53,6 +56,16 @@ void IsingModel::set_magnetization(){
     M = magnetization;
 }
 
+void IsingModel::set_temperature(double T){
+    beta = 1/T;
+    p_add = 1 - exp(-2 * beta);
+    precompute_exp_factors();
+}
+
+double IsingModel::get_temperature(){
+    return 1/beta;
+}
+
 int IsingModel::get_magnetization(){
     return M;
 }
@@ -69,6 +82,10 @@ double IsingModel::get_m(){
     return (double)M / (L * L);
 }
 
+long long IsingModel::get_accepted_flips(){
+    return accepted_flips;
+}
+
 vector<vector<int>> IsingModel::get_spins(){
     return spins;
 }
@@ -106,10 +123,60 @@ void IsingModel::metropolis(){
             E += delta_E;
             // Update magnetization
             M += 2 * spins[ix][iy];
+            accepted_flips++;
         }
     }
 }
 
+int IsingModel::wolff(){
+    // Draw the seed of the cluster, and flip it
+    int ix = rand_index(rng);
+    int iy = rand_index(rng);
+    int cluster_spin = spins[ix][iy];
+    spins[ix][iy] *= -1;
+    cluster_id++;
+    in_cluster[ix][iy] = cluster_id;
+    vector<pair<int, int>> cluster = {{ix, iy}};
+    // Grow the cluster, flipping the spins as they are added
+    for (size_t k = 0; k < cluster.size(); k++){
+        ix = cluster[k].first;
+        iy = cluster[k].second;
+        pair<int, int> neighbours[4] = {{ix, (iy + 1) % L},
+                                        {ix, (iy - 1 + L) % L},
+                                        {(ix + 1) % L, iy},
+                                        {(ix - 1 + L) % L, iy}};
+        for (auto const& neighbour : neighbours){
+            int &spin = spins[neighbour.first][neighbour.second];
+            if (spin == cluster_spin && uniform(rng) < p_add){
+                spin *= -1;
+                in_cluster[neighbour.first][neighbour.second] = cluster_id;
+                cluster.push_back(neighbour);
+            }
+        }
+    }
+    // Only the bonds on the boundary of the cluster change the energy
+    int delta_E = 0;
+    for (auto const& site : cluster){
+        ix = site.first;
+        iy = site.second;
+        pair<int, int> neighbours[4] = {{ix, (iy + 1) % L},
+                                        {ix, (iy - 1 + L) % L},
+                                        {(ix + 1) % L, iy},
+                                        {(ix - 1 + L) % L, iy}};
+        for (auto const& neighbour : neighbours){
+            if (in_cluster[neighbour.first][neighbour.second] != cluster_id){
+                delta_E += 2 * cluster_spin * spins[neighbour.first][neighbour.second];
+            }
+        }
+    }
+    int cluster_size = cluster.size();
+    // Update energy
+    E += delta_E;
+    // Update magnetization
+    M -= 2 * cluster_spin * cluster_size;
+    return cluster_size;
+}
+
 void IsingModel::print(){
     for (int i=0; i<L; i++){
         for (int j=0; j<L; j++){
@@ -118,3 +185,27 @@ void IsingModel::print(){
         cout << "\n";
     }
 }
+
+void IsingModel::save_state(ostream &out){
+    out << L << " " << E << " " << M << "\n";
+    for (int i=0; i<L; i++){
+        for (int j=0; j<L; j++){
+            out << spins[i][j] << " ";
+        }
+        out << "\n";
+    }
+    out << rng << "\n";
+}
+
+bool IsingModel::load_state(istream &in){
+    int saved_L;
+    if (!(in >> saved_L) or saved_L != L) return false;
+    in >> E >> M;
+    for (int i=0; i<L; i++){
+        for (int j=0; j<L; j++){
+            in >> spins[i][j];
+        }
+    }
+    in >> rng;
+    return !in.fail();
+}
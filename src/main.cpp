@@ -1,5 +1,11 @@
 #include "project4/ising_model.hpp"
+#include "project4/multispin_ising_model.hpp"
 #include "project4/stat_utils.hpp"
+#include "project4/sample_io.hpp"
+#include "project4/checkpoint.hpp"
+#include "project4/wang_landau.hpp"
+#include "project4/philox.hpp"
+#include "project4/telemetry.hpp"
 
 #include <iostream>
 #include <vector>
@@ -11,6 +17,10 @@
 #include <string>
 #include <chrono>
 #include <sstream>
+#include <cmath>
+#include <functional>
+#include <cassert>
+#include <stdexcept>
 
 using namespace std;
 
@@ -25,14 +35,243 @@ void print_help_message() {
     cout << "Options:" << endl;
     cout << "\t-h\tShow this help message" << endl;
     cout << "\t-t\tTest implementation" << endl;
-    cout << "\t-b\tFinds burn-in time" << endl;
-    cout << "\t-w\tWrites samples to file. Provide L, T, and seed" << endl;
+    cout << "\t-b\tWrites samples without burn-in and prints the detected burn-in times" << endl;
+    cout << "\t-w\tWrites samples to a binary file. Provide L, T, and seed" << endl;
     cout << "\t-s\tFinds values for L in 20, 40, 60, 80, 100, 120, 140, 160 for T in the range [2.1, 2.4]" << endl;
     cout << "\t-z\tZooms in and finds values. Provide L, T_min, T_max and seed as system argunments" << endl;
+    cout << "\t-v\tFinds values for a single temperature and prints them. Provide L, T and seed" << endl;
+    cout << "\t-m\tWrites samples of E and |M| at 4 temperatures for histogram reweighting. Provide L, T_min, T_max and seed" << endl;
+    cout << "\t-c\tUse Wolff cluster updates instead of the Metropolis algorithm. Use together with -s, -z, -m or -v" << endl;
+    cout << "\t-x\tUse parallel tempering over the temperatures. Use together with -s or -z" << endl;
+    cout << "\t-k\tCheckpoint every temperature, and resume from existing checkpoints of the same build. Finished checkpoints are removed, unless extended with -e. Use together with -s, -z or -v" << endl;
+    cout << "\t-e\tExtend a checkpointed run by N more samples. Provide N, use together with -v" << endl;
+    cout << "\t-d\tEstimates the density of states with Wang-Landau sampling. Provide L, seed and optionally the final ln f (default 1e-6)" << endl;
+    cout << "\t-n\tBenchmarks the throughput of the engines and writes it to output/benchmark_engines.json. Optionally provide the minimum time of every measurement in seconds (default 0.2)" << endl;
+    cout << "\t-p\tUse the multispin coded IsingModel, with 64 spins per word, for large lattices. L must be a multiple of 128. Use together with -w, -z, -m or -v" << endl;
+}
+
+// Pass as burn_in_time to detect the burn-in time with MSER instead of using a fixed number of iterations
+const int AUTOMATIC_BURN_IN = -1;
+// Number of iterations between each checkpoint
+const int CHECKPOINT_INTERVAL = 10000;
+
+/**
+ * @brief Performs a Wolff cluster update
+ * 
+ * @param model The IsingModel to update
+ * @return int The number of flipped spins
+ */
+int cluster_update(IsingModel &model){
+    return model.wolff();
+}
+
+/**
+ * @brief Whether an IsingModel implements Wolff cluster updates
+ * 
+ * @return bool True
+ */
+bool has_cluster_updates(IsingModel &){
+    return true;
+}
+
+/**
+ * @brief The multispin coded IsingModel only implements the Metropolis algorithm, and main falls back to it
+ * when cluster updates are asked for
+ * 
+ * @return bool False
+ */
+bool has_cluster_updates(MultispinIsingModel &){
+    return false;
+}
+
+/**
+ * @brief Name the engine of a run, for the telemetry
+ * 
+ * @param cluster If True, Wolff cluster updates are used instead of the Metropolis algorithm
+ * @return string "wolff" or "metropolis"
+ */
+string engine_name(IsingModel &, bool cluster){
+    return cluster ? "wolff" : "metropolis";
+}
+
+/**
+ * @brief Name the engine of a run with the multispin coded IsingModel, for the telemetry
+ * 
+ * @return string "multispin"
+ */
+string engine_name(MultispinIsingModel &, bool){
+    return "multispin";
+}
+
+/**
+ * @brief An IsingModel together with the settings of its updates, such that a run can be continued in several parts
+ * 
+ * @tparam Model IsingModel, or MultispinIsingModel for large lattices
+ */
+template <class Model>
+struct Sampler{
+    Model model;
+    int L;
+    bool cluster;
+    // With cluster updates, an iteration flips a fixed number of clusters, chosen
+    // during the burn-in such that about L * L spins are flipped per iteration
+    int clusters_per_iteration = 1;
+    long long flipped = 0, clusters = 0;
+    long long iterations = 0;
+    // Telemetry of the run, written by end_measurement
+    telemetry::Run run;
+    telemetry::Stopwatch stopwatch;
+
+    Sampler(int L, double T, int seed, bool random_spins, bool cluster, uint64_t stream = 0) : model(L, T, random_spins, seed, stream), L(L), cluster(cluster) {
+        if (cluster and !has_cluster_updates(model)){
+            throw invalid_argument("Cluster updates are not implemented for the " + engine_name(model, cluster) + " engine");
+        }
+        run.L = L;
+        run.T = T;
+        run.seed = seed;
+        run.stream = stream;
+        run.engine = engine_name(model, cluster);
+        run.start_time = stopwatch.start_time();
+    }
+
+    /**
+     * @brief Performs one MC-cycle, or clusters_per_iteration cluster updates
+     * 
+     * @param burning_in If True, clusters_per_iteration is adapted
+     */
+    void iterate(bool burning_in){
+        iterations++;
+        if (cluster){
+            for (int k = 0; k < clusters_per_iteration; k++){
+                flipped += cluster_update(model);
+                clusters++;
+            }
+            if (burning_in) clusters_per_iteration = max(1, (int) round((double) L * L * clusters / flipped));
+        }
+        else model.metropolis();
+    }
+
+    /**
+     * @brief Burns in the IsingModel.
+     * With automatic burn-in, a pilot run is made and stat_utils::mser finds where E and |M| have equilibrated.
+     * If that is not within the first half of the pilot run, the pilot run is doubled. The samples of the pilot run
+     * after the detected burn-in time are kept. With cluster updates, the pilot run adapts clusters_per_iteration, so
+     * its samples are discarded, and clusters_per_iteration is fixed from the end of the pilot run
+     * 
+     * @param burn_in_time Number of iterations to discard, or AUTOMATIC_BURN_IN
+     * @param sampled_energy Destination of the kept energies
+     * @param sampled_magnetization_abs Destination of the kept absolute magnetizations
+     * @param max_kept Maximum number of pilot samples to keep
+     * @return int The number of iterations which were discarded
+     */
+    int burn_in(int burn_in_time, vector<int> &sampled_energy, vector<int> &sampled_magnetization_abs, int max_kept){
+        const int min_pilot = 1000, max_pilot = 1 << 20;
+        if (burn_in_time != AUTOMATIC_BURN_IN){
+            for (int i = 0; i < burn_in_time; i++) iterate(true);
+            return burn_in_time;
+        }
+        vector<int> pilot_energy, pilot_magnetization_abs;
+        int pilot = min_pilot;
+        while (true){
+            while ((int) pilot_energy.size() < pilot){
+                iterate(true);
+                pilot_energy.push_back(model.get_energy());
+                pilot_magnetization_abs.push_back(abs(model.get_magnetization()));
+            }
+            burn_in_time = max(stat_utils::mser(pilot_energy), stat_utils::mser(pilot_magnetization_abs));
+            if (2 * burn_in_time <= pilot or pilot >= max_pilot) break;
+            pilot *= 2;
+        }
+        if (cluster) return pilot;
+        for (int i = burn_in_time; i < pilot and i - burn_in_time < max_kept; i++){
+            sampled_energy.push_back(pilot_energy[i]);
+            sampled_magnetization_abs.push_back(pilot_magnetization_abs[i]);
+        }
+        return burn_in_time;
+    }
+
+    /**
+     * @brief Ends the burn-in phase of the telemetry
+     * 
+     * @param burn_in_time Number of iterations which were discarded
+     */
+    void end_burn_in(int burn_in_time){
+        run.burn_in_time = burn_in_time;
+        run.burn_in_seconds = stopwatch.lap();
+        run.burn_in_sweeps = iterations;
+    }
+
+    /**
+     * @brief Ends the measurement phase of the telemetry, and appends the run to the telemetry file
+     * 
+     * @param samples Number of samples of the run
+     */
+    void end_measurement(long long samples){
+        run.measure_seconds = stopwatch.lap();
+        run.measure_sweeps = iterations - run.burn_in_sweeps;
+        run.samples = samples;
+        if (cluster) run.mean_cluster_size = clusters > 0 ? (double) flipped / clusters : 0;
+        else {
+            run.accepted_flips = model.get_accepted_flips();
+            run.attempted_flips = iterations * L * L;
+        }
+        telemetry::write(run);
+    }
+};
+
+/**
+ * @brief The multispin coded IsingModel has no cluster updates, which the constructor rejects
+ */
+template <>
+void Sampler<MultispinIsingModel>::iterate(bool){
+    iterations++;
+    model.metropolis();
 }
 
 /*
- * @brief Samples from IsingModel, once per MC-cycle
+ * @brief Samples from IsingModel, once per MC-cycle, handing every sample to record. With automatic burn-in,
+ * the samples of the pilot run after the detected burn-in time are recorded first, see Sampler::burn_in
+ * 
+ * @param record Called with E and |M| of every sample
+ * @param iters Number of samples to make
+ * @param L Size of the IsingModel
+ * @param T Temperature of the IsingModel
+ * @param seed Seed for RNG
+ * @param burn_in_time Number of iterations to discard, or AUTOMATIC_BURN_IN
+ * @param random_spins If True, starting spin state of the IsingModel is chosen randomly. Else all spins are poining in the same direction
+ * @param cluster If True, Wolff cluster updates are used instead of the Metropolis algorithm
+ * @return int The number of iterations which were discarded
+ */
+template <class Model>
+int sample(function<void(int, int)> record, const int iters, int L, double T, int seed, int burn_in_time, bool random_spins, bool cluster, uint64_t stream){
+    Sampler<Model> sampler(L, T, seed, random_spins, cluster, stream);
+    vector<int> kept_energy, kept_magnetization_abs;
+    burn_in_time = sampler.burn_in(burn_in_time, kept_energy, kept_magnetization_abs, iters);
+    sampler.end_burn_in(burn_in_time);
+    for (size_t i = 0; i < kept_energy.size(); i++) record(kept_energy[i], kept_magnetization_abs[i]);
+    for (int sampled = kept_energy.size(); sampled < iters; sampled++){
+        sampler.iterate(false);
+        record(sampler.model.get_energy(), abs(sampler.model.get_magnetization()));
+    }
+    sampler.end_measurement(iters);
+    return burn_in_time;
+}
+
+/*
+ * @brief Samples from IsingModel or MultispinIsingModel, see sample above
+ * 
+ * @param packed If True, the multispin coded MultispinIsingModel is used, which needs L to be a multiple of 128
+ * @param stream Id of the RNG stream for the same seed, see stream_id
+ * @return int The number of iterations which were discarded
+ */
+int sample(function<void(int, int)> record, const int iters, int L, double T, int seed, int burn_in_time = AUTOMATIC_BURN_IN, bool random_spins = true, bool cluster = false, bool packed = false, uint64_t stream = 0){
+    if (packed) return sample<MultispinIsingModel>(record, iters, L, T, seed, burn_in_time, random_spins, cluster, stream);
+    return sample<IsingModel>(record, iters, L, T, seed, burn_in_time, random_spins, cluster, stream);
+}
+
+/*
+ * @brief Samples from IsingModel, once per MC-cycle, keeping the raw series. Only use when the series itself is needed,
+ * otherwise accumulate the moments with constant memory
  * 
  * @param sampled_energy Destination of the sampled energy
  * @param sampled_magnetization_abs Destination of the samped absouloute magnetization
@@ -40,43 +279,89 @@ void print_help_message() {
  * @param L Size of the IsingModel
  * @param T Temperature of the IsingModel
  * @param seed Seed for RNG
- * @param burn_in_time Number of iterations to discard
+ * @param burn_in_time Number of iterations to discard, or AUTOMATIC_BURN_IN
  * @param random_spins If True, starting spin state of the IsingModel is chosen randomly. Else all spins are poining in the same direction
+ * @param cluster If True, Wolff cluster updates are used instead of the Metropolis algorithm
+ * @param packed If True, the multispin coded MultispinIsingModel is used, which needs L to be a multiple of 128
+ * @param stream Id of the RNG stream for the same seed, see stream_id
+ * @return int The number of iterations which were discarded
  */
-void sample(vector<int> &sampled_energy, vector<int> &sampled_magnetization_abs, const int iters, int L, double T, int seed, int burn_in_time = 10000, bool random_spins = true){
-    IsingModel model(L, T, random_spins, seed);
-    for (int i = -burn_in_time; i < iters; i++){
-        model.metropolis();
-        if (i < 0) continue;
-        sampled_energy.push_back(model.get_energy());
-        sampled_magnetization_abs.push_back(abs(model.get_magnetization()));
-    }
+int sample(vector<int> &sampled_energy, vector<int> &sampled_magnetization_abs, const int iters, int L, double T, int seed, int burn_in_time = AUTOMATIC_BURN_IN, bool random_spins = true, bool cluster = false, bool packed = false, uint64_t stream = 0){
+    sampled_energy.reserve(sampled_energy.size() + iters);
+    sampled_magnetization_abs.reserve(sampled_magnetization_abs.size() + iters);
+    auto record = [&](int E, int M_abs){
+        sampled_energy.push_back(E);
+        sampled_magnetization_abs.push_back(M_abs);
+    };
+    return sample(record, iters, L, T, seed, burn_in_time, random_spins, cluster, packed, stream);
+}
+
+/*
+ * @brief Samples from IsingModel, once per MC-cycle, accumulating the moments of E and |M| with constant memory
+ * 
+ * @param moments Destination of the moments
+ * @param iters Number of samples to make
+ * @param L Size of the IsingModel
+ * @param T Temperature of the IsingModel
+ * @param seed Seed for RNG
+ * @param burn_in_time Number of iterations to discard, or AUTOMATIC_BURN_IN
+ * @param random_spins If True, starting spin state of the IsingModel is chosen randomly. Else all spins are poining in the same direction
+ * @param cluster If True, Wolff cluster updates are used instead of the Metropolis algorithm
+ * @param packed If True, the multispin coded MultispinIsingModel is used, which needs L to be a multiple of 128
+ * @param stream Id of the RNG stream for the same seed, see stream_id
+ * @return int The number of iterations which were discarded
+ */
+int accumulate(stat_utils::Moments &moments, const int iters, int L, double T, int seed, int burn_in_time = AUTOMATIC_BURN_IN, bool random_spins = true, bool cluster = false, bool packed = false, uint64_t stream = 0){
+    auto record = [&](int E, int M_abs){moments.add(E, M_abs);};
+    return sample(record, iters, L, T, seed, burn_in_time, random_spins, cluster, packed, stream);
 }
 
 
 /**
- * @brief writes samples of &epsilon; and |m|
+ * @brief writes samples of E and |M| to a binary sample file, see sample_io.hpp
  * 
- * @param N Numbers of MC-iterations
+ * @param iters Numbers of MC-iterations
  * @param L Size of the Lattice (will have L * L elements)
  * @param T temperature
- * @param burn_in_time Number of iterations to discard when producing estimates 
+ * @param seed Seed for RNG
+ * @param burn_in_time Number of iterations to discard when producing estimates, or AUTOMATIC_BURN_IN
+ * @param packed If True, the multispin coded MultispinIsingModel is used, which needs L to be a multiple of 128
  */
-void write_samples(const int iters, const int L, double T, int seed, int burn_in_time = 10000){
-    const int N = L * L;
+void write_samples(const int iters, const int L, double T, int seed, int burn_in_time = AUTOMATIC_BURN_IN, bool packed = false){
     vector<int> sampled_energy;
     vector<int> sampled_magnetization_abs;
-    sample(sampled_energy, sampled_magnetization_abs, iters, L, T, seed);
-    auto scale = [N](int x){return (double)x / N;};
+    burn_in_time = sample(sampled_energy, sampled_magnetization_abs, iters, L, T, seed, burn_in_time, true, false, packed);
     ostringstream out;
     out.precision(1);
     out << fixed << T;
-    ofstream outfile("output/samples_L=" + to_string(L) + "_T=" + out.str() + ".csv");
-    outfile << "epsilon,|m|" << endl;
-    for (int i = 0; i < iters; i++){
-        outfile << scale(sampled_energy[i]) << "," << sampled_magnetization_abs[i] << endl;
+    sample_io::write_samples("output/samples_L=" + to_string(L) + "_T=" + out.str() + ".bin",
+                             sampled_energy, sampled_magnetization_abs, L, T, seed, burn_in_time);
+}
+
+/**
+ * @brief Writes samples of E and |M| for a few temperatures in [T_min, T_max], used for histogram reweighting.
+ * The samples for temperature T are written to output/samples_zoom_L=<L>_T=<T>.bin, see sample_io.hpp
+ * 
+ * @param T_min The minimum temperature to sample at
+ * @param T_max The maximum temperature to sample at (inclusive)
+ * @param L Size of the IsingModel
+ * @param steps The number of temperatures to sample at
+ * @param seed Seed for RNG, temperature i uses the stream stream_id(L, i)
+ * @param cluster If True, Wolff cluster updates are used instead of the Metropolis algorithm
+ * @param packed If True, the multispin coded MultispinIsingModel is used, which needs L to be a multiple of 128
+ */
+void write_reweighting_samples(double T_min, double T_max, int L, int steps, int seed, bool cluster = false, bool packed = false){
+    int sample_size = 1000000;
+    double dT = steps > 1 ? (T_max - T_min) / (steps - 1) : 0;
+    #pragma omp parallel for
+    for (int i = 0; i < steps; i++){
+        double T = T_min + i * dT;
+        vector<int> sampled_energy;
+        vector<int> sampled_magnetization_abs;
+        int burn_in_time = sample(sampled_energy, sampled_magnetization_abs, sample_size, L, T, seed, AUTOMATIC_BURN_IN, true, cluster, packed, stream_id(L, i));
+        sample_io::write_samples("output/samples_zoom_L=" + to_string(L) + "_T=" + to_string(T) + ".bin",
+                                 sampled_energy, sampled_magnetization_abs, L, T, seed, burn_in_time);
     }
-    outfile.close();
 }
 
 /**
@@ -92,7 +377,7 @@ void write_samples(const int iters, const int L, double T, int seed, int burn_in
  * @param c_v Destination of C_v
  * @param chi Destination of &chi;
  */
-void values(vector<int> sampled_energy, vector<int> sampled_magnetization_abs, int sample_size, int L, double T, 
+void values(const vector<int> &sampled_energy, const vector<int> &sampled_magnetization_abs, int sample_size, int L, double T, 
 double &expected_epsilon, double &expected_m_abs, double &c_v, double &chi){
     int N = L * L;
     auto scale = [N](int x){return (double)x / N;};
@@ -109,26 +394,116 @@ double &expected_epsilon, double &expected_m_abs, double &c_v, double &chi){
 
 
 
+/**
+ * @brief Estimates <&epsilon;>, <|m|>, C_v and &chi; like write_values_to_file, but saves a checkpoint to
+ * output/checkpoint_L=<L>_T=<T>_seed=<seed>[_stream=<stream>].chk every CHECKPOINT_INTERVAL iterations. If the checkpoint exists,
+ * and was written by the same build of the runner with the same sample size, the run continues from it instead of
+ * starting over. The checkpoint is removed once the run has finished, unless it is extended, such that an extended
+ * run can be extended again with more samples, reusing the equilibrated state
+ * 
+ * @param L problem size
+ * @param T temperature
+ * @param seed Seed for RNG
+ * @param stream Id of the RNG stream for the same seed, see stream_id
+ * @param sample_size Number of samples, if the run is not extended
+ * @param extend_by Number of samples to add to a run which already has sample_size samples or more
+ * @param cluster If True, Wolff cluster updates are used instead of the Metropolis algorithm
+ * @param expected_epsilon Destinatipn of <&epsilon;>
+ * @param expected_m_abs Destination of <|m|>
+ * @param c_v Destination of C_v
+ * @param chi Destination of &chi;
+ */
+void checkpointed_values(int L, double T, int seed, uint64_t stream, int sample_size, int extend_by, bool cluster, 
+double &expected_epsilon, double &expected_m_abs, double &c_v, double &chi){
+    string filename = "output/checkpoint_L=" + to_string(L) + "_T=" + to_string(T) + "_seed=" + to_string(seed)
+                    + (stream ? "_stream=" + to_string(stream) : "") + (cluster ? "_cluster" : "") + ".chk";
+    Sampler<IsingModel> sampler(L, T, seed, true, cluster, stream);
+    checkpoint::State state;
+    if (!checkpoint::load(filename, sampler.model, state) or state.engine != checkpoint::engine_hash()
+        or state.sample_size != sample_size){
+        sampler = Sampler<IsingModel>(L, T, seed, true, cluster, stream);
+        state = checkpoint::State();
+        state.engine = checkpoint::engine_hash();
+        state.sample_size = sample_size;
+        vector<int> kept_energy, kept_magnetization_abs;
+        state.burn_in_time = sampler.burn_in(AUTOMATIC_BURN_IN, kept_energy, kept_magnetization_abs, sample_size);
+        for (size_t i = 0; i < kept_energy.size(); i++) state.moments.add(kept_energy[i], kept_magnetization_abs[i]);
+        state.clusters_per_iteration = sampler.clusters_per_iteration;
+        checkpoint::save(filename, sampler.model, state);
+    }
+    else sampler.run.resumed = true;
+    sampler.clusters_per_iteration = state.clusters_per_iteration;
+    sampler.end_burn_in(state.burn_in_time);
+
+    long long target = sample_size;
+    if (extend_by > 0) target = max(target, state.moments.count()) + extend_by;
+    while (state.moments.count() < target){
+        sampler.iterate(false);
+        state.moments.add(sampler.model.get_energy(), abs(sampler.model.get_magnetization()));
+        if (state.moments.count() % CHECKPOINT_INTERVAL == 0) checkpoint::save(filename, sampler.model, state);
+    }
+    if (extend_by > 0) checkpoint::save(filename, sampler.model, state);
+    else remove(filename.c_str());
+    sampler.end_measurement(state.moments.count());
+    state.moments.values(L, T, expected_epsilon, expected_m_abs, c_v, chi);
+}
+
 /**
  * @brief estimates <&epsilon;>, <|m|>, C_v and &chiand writes them to the outfile in that order, all after the temperature
  * @param L problem size
  * @param T temperature
  * @param outfile csv-file to write results
+ * @param cluster If True, Wolff cluster updates are used instead of the Metropolis algorithm
+ * @param use_checkpoint If True, the run is checkpointed and resumed, see checkpointed_values
+ * @param extend_by Number of samples to add to a finished checkpointed run
+ * @param packed If True, the multispin coded MultispinIsingModel is used, which needs L to be a multiple of 128
+ * @param stream Id of the RNG stream for the same seed, see stream_id
  */
-void write_values_to_file(int L, double T, int seed, ofstream &outfile){
+void write_values_to_file(int L, double T, int seed, ostream &outfile, bool cluster = false, bool use_checkpoint = false, int extend_by = 0, bool packed = false, uint64_t stream = 0){
     int sample_size = 1000000;
-    vector<int> sampled_energy;
-    vector<int> sampled_magnetization_abs;
-    sample(sampled_energy, sampled_magnetization_abs, sample_size, L, T, seed, 30000);
     double expected_epsilon, expected_m_abs, c_v, chi;
-    values(sampled_energy, sampled_magnetization_abs, sample_size, L, T, expected_epsilon, expected_m_abs, c_v, chi);
+    if (use_checkpoint){
+        checkpointed_values(L, T, seed, stream, sample_size, extend_by, cluster, expected_epsilon, expected_m_abs, c_v, chi);
+    }
+    else {
+        stat_utils::Moments moments;
+        accumulate(moments, sample_size, L, T, seed, AUTOMATIC_BURN_IN, true, cluster, packed, stream);
+        moments.values(L, T, expected_epsilon, expected_m_abs, c_v, chi);
+    }
     outfile << T << "," << expected_epsilon << "," << expected_m_abs << "," << c_v << "," << chi << endl;
 }
 
 /**
- * @brief Trying to estimate the burn in time in the IsingModel
+ * @brief Estimates values for every temperature in parallel, see write_values_to_file, and writes them to the outfile
+ * sorted by temperature. Temperature i uses the RNG stream stream_id(L, i) of the seed, so the results are the same
+ * whichever thread runs which temperature
  * 
- * @param N TODO: Rename?
+ * @param temperatures The temperatures
+ * @param L problem size
+ * @param seed Seed for RNG
+ * @param outfile csv-file to write results
+ * @param cluster If True, Wolff cluster updates are used instead of the Metropolis algorithm
+ * @param use_checkpoint If True, the runs are checkpointed and resumed, see checkpointed_values
+ * @param packed If True, the multispin coded MultispinIsingModel is used, which needs L to be a multiple of 128
+ */
+void write_values_for_temperatures(const vector<double> &temperatures, int L, int seed, ostream &outfile, bool cluster = false, bool use_checkpoint = false, bool packed = false){
+    int steps = temperatures.size();
+    vector<string> rows(steps);
+    #pragma omp parallel for schedule(dynamic)
+    for (int i = 0; i < steps; i++){
+        ostringstream row;
+        write_values_to_file(L, temperatures[i], seed, row, cluster, use_checkpoint, 0, packed, stream_id(L, i));
+        rows[i] = row.str();
+    }
+    for (const string &row : rows) outfile << row;
+}
+
+/**
+ * @brief Samples the IsingModel without any burn-in, to estimate the burn in time. The samples are written
+ * to a binary sample file, see sample_io.hpp, and the running averages are computed when plotting.
+ * The burn-in time detected by stat_utils::mser is printed
+ * 
+ * @param N Number of MC-iterations
  * @param L Size of the IsingModel
  * @param T Temperature of the IsingModel
  * @param seed seed for RNG
@@ -137,19 +512,8 @@ void write_values_to_file(int L, double T, int seed, ofstream &outfile){
 void find_burn_in_time(int N, int L, double T, int seed, bool random_spins=true){
     vector<int> sampled_E;
     vector<int> sampled_M_abs;
-    vector<double> E_avg;
-    vector<double> M_abs_avg;
-    vector<int> N_vector;
     sample(sampled_E, sampled_M_abs, N, L, T, seed, 0, random_spins);
-    for (int i=0; i<N; i++){
-        double expected_eps, expected_m_abs, c_v, chi;
-        values(sampled_E, sampled_M_abs, i+1, L, T, expected_eps, expected_m_abs, c_v, chi);
-        E_avg.push_back(expected_eps);
-        M_abs_avg.push_back(expected_m_abs);
-        N_vector.push_back(i+1);
-    }
 
-    ofstream burn_in_csv;
     string spins_are_random;
     if (random_spins){
         spins_are_random = "random";
@@ -158,54 +522,81 @@ void find_burn_in_time(int N, int L, double T, int seed, bool random_spins=true)
         spins_are_random = "nonrandom";
     }
     string filename = "output/burn_in_L_" + to_string(L) + "_T_" 
-                    + to_string(T) + "_" + spins_are_random + ".csv";
-    burn_in_csv.open(filename);
-    burn_in_csv << "N,expected_E,expected_M\n";
-
-    for (int i=0; i<N; i++){
-        burn_in_csv << N_vector[i] << "," << E_avg[i] 
-                    << "," << M_abs_avg[i] << "\n";
-    }
-    burn_in_csv.close();
+                    + to_string(T) + "_" + spins_are_random + ".bin";
+    sample_io::write_samples(filename, sampled_E, sampled_M_abs, L, T, seed, 0);
+    cout << "L=" << L << ", T=" << T << ", " << spins_are_random << " spins: detected burn-in time "
+         << max(stat_utils::mser(sampled_E), stat_utils::mser(sampled_M_abs)) << endl;
 }
 
 /**
  * @brief Testing for convergence against analytical results in the 2x2 case
  * 
+ * @param seed Seed for RNG
+ * @param cluster If True, Wolff cluster updates are used instead of the Metropolis algorithm
  * @return int number of samples needed for convergence
  */
-int test2x2(int seed){
+int test2x2(int seed, bool cluster = false){
     const double tol = 1e-3;
-    vector<int> sampled_energy;
-    vector<int> sampled_magnetization_abs;
     double T = 2.;
     int max_sample_size = 10000;
-    sample(sampled_energy, sampled_magnetization_abs, max_sample_size, 2, T, seed, 0);
-    double expected_epsilon, expected_m_abs, c_v, chi;
     double analytical_expected_epsilon = -1.8008253628497959, analytical_expected_m_abs = 0.9337091730054017, analytical_c_v = 0.3610959875477656, analytical_chi = 0.09079837108784634;
-    int using_sample_size = 1;
-    do {
-        values(sampled_energy, sampled_magnetization_abs, using_sample_size, 2, T, expected_epsilon, expected_m_abs, c_v, chi);
-        using_sample_size++;
-    } while((abs(expected_epsilon - analytical_expected_epsilon) > tol 
-            or abs(expected_m_abs - analytical_expected_m_abs) > tol 
-            or abs(c_v - analytical_c_v) > tol 
-            or abs(chi - analytical_chi) > tol)
-            and using_sample_size < max_sample_size);
+    // The estimates are updated with every sample, and checked until they have converged
+    stat_utils::Moments moments;
+    int using_sample_size = max_sample_size;
+    bool converged = false;
+    auto record = [&](int E, int M_abs){
+        moments.add(E, M_abs);
+        if (converged or moments.count() >= max_sample_size) return;
+        double expected_epsilon, expected_m_abs, c_v, chi;
+        moments.values(2, T, expected_epsilon, expected_m_abs, c_v, chi);
+        if (abs(expected_epsilon - analytical_expected_epsilon) <= tol 
+            and abs(expected_m_abs - analytical_expected_m_abs) <= tol 
+            and abs(c_v - analytical_c_v) <= tol 
+            and abs(chi - analytical_chi) <= tol){
+            converged = true;
+            using_sample_size = moments.count() + 1;
+        }
+    };
+    sample(record, max_sample_size, 2, T, seed, 0, true, cluster);
     return using_sample_size;
 }
 
+/**
+ * @brief Testing that the energy and magnetization tracked by the multispin coded IsingModel match the ones
+ * counted from the spins, after every few MC-cycles
+ * 
+ * @param seed Seed for RNG
+ * @param checks Number of times to compare, at every temperature
+ * @param sweeps Number of MC-cycles between the comparisons
+ * @return bool True if they matched every time
+ */
+bool test_multispin(int seed, int checks = 5, int sweeps = 20){
+    const int L = 128;
+    for (double T : {1., 2.3, 4.}){
+        MultispinIsingModel model(L, T, true, seed);
+        for (int check = 0; check < checks; check++){
+            for (int i = 0; i < sweeps; i++) model.metropolis();
+            int M = 0;
+            for (int i = 0; i < L; i++){
+                for (int j = 0; j < L; j++) M += model.get_spin(i, j);
+            }
+            if (model.get_energy() != model.count_energy() or model.get_magnetization() != M) return false;
+        }
+    }
+    return true;
+}
+
 /**
  * @brief Performs timing to compare parallel and serial code
  * 
  * @param L Size of the IsingModel
- * @param T Temperature of the IsingModel
+ * @param T The lowest temperature of the timed scan, which covers [T, T + 0.3)
  */
 void timing_parallel_vs_serial(int L, double T) {
     int repeats = 10;
 
-    double T_min = 2.1;
-    double T_max = 2.1;
+    double T_min = T;
+    double T_max = T + 0.3;
     int steps = 48;
     double dT = (T_max - T_min) / steps;
     int seed = 42;
@@ -215,13 +606,11 @@ void timing_parallel_vs_serial(int L, double T) {
 
     for (int i = 0; i < repeats; i++) {
         auto start = chrono::high_resolution_clock::now();
-        ofstream outfile1("output/values_L=" + to_string(L) + ".csv");
-        #pragma omp parallel for
-        for (int i = 0; i < steps; i++){
-            double T = T_min + i * dT;
-            write_values_to_file(L, T, seed, outfile1);
-        }
-        outfile1.close();
+        // the values are discarded, such that the scan in output/values_L=<L>.csv is kept
+        ostringstream outfile1;
+        vector<double> temperatures;
+        for (int i = 0; i < steps; i++) temperatures.push_back(T_min + i * dT);
+        write_values_for_temperatures(temperatures, L, seed, outfile1);
 
         auto end = chrono::high_resolution_clock::now();
         chrono::duration<double> diff_parallel = end - start;
@@ -231,12 +620,11 @@ void timing_parallel_vs_serial(int L, double T) {
 
     for (int i = 0; i < repeats; i++) {
         auto start = chrono::high_resolution_clock::now();
-        ofstream outfile2("output/values_L=" + to_string(L) + ".csv");
+        ostringstream outfile2;
         for (int i = 0; i < steps; i++){
             double T = T_min + i * dT;
-            write_values_to_file(L, T, seed, outfile2);
+            write_values_to_file(L, T, seed, outfile2, false, false, 0, false, stream_id(L, i));
         }
-        outfile2.close();
 
         auto end = chrono::high_resolution_clock::now();
         chrono::duration<double> diff_serial = end - start;
@@ -244,7 +632,7 @@ void timing_parallel_vs_serial(int L, double T) {
     }
 
     ofstream timingfile("output/timing.txt");
-    timingfile << "Average timing for L=" << L << ", T=" << T << " and steps=" << steps << ", with " << repeats << " repeats" << endl;
+    timingfile << "Average timing for L=" << L << ", T in [" << T_min << ", " << T_max << ") and steps=" << steps << ", with " << repeats << " repeats" << endl;
 
     timingfile << "Average time for parallel: " << total_time_parallel / repeats << endl;
     timingfile << "Average time for serial: " << total_time_serial / repeats << endl;
@@ -254,8 +642,190 @@ void timing_parallel_vs_serial(int L, double T) {
 }
 
 /**
- * @brief Writes estimated values from IsingModels within the specified range of temperatures
- * Important: If this is ran on multiple cores, you may not assume the file is sorted by temperature!
+ * @brief Performs one update of an IsingModel for the benchmark
+ * 
+ * @param model The IsingModel
+ * @param cluster If True, a Wolff cluster update is performed instead of a MC-cycle of the Metropolis algorithm
+ * @param L Size of the IsingModel
+ * @return double The number of spins visited by the update
+ */
+double benchmark_update(IsingModel &model, bool cluster, int L){
+    if (cluster) return model.wolff();
+    model.metropolis();
+    return L * L;
+}
+
+/**
+ * @brief Performs one MC-cycle of a MultispinIsingModel for the benchmark, see benchmark_update above
+ */
+double benchmark_update(MultispinIsingModel &model, bool /* cluster */, int L){
+    model.metropolis();
+    return L * L;
+}
+
+/**
+ * @brief Measures the throughput of an engine. Every thread advances its own model, with its own RNG stream,
+ * and the number of updates is doubled until the measurement takes at least min_time seconds
+ * 
+ * @param L Size of the IsingModel
+ * @param T Temperature of the IsingModel
+ * @param threads Number of OpenMP threads, each advancing one model
+ * @param min_time Minimum duration of the measurement in seconds
+ * @param cluster If True, Wolff cluster updates are used instead of the Metropolis algorithm
+ * @return pair<double, double> The spin updates per second and the sweeps (L^2 spin updates) per second, summed over the threads
+ */
+template <class Model>
+pair<double, double> throughput(int L, double T, int threads, double min_time, bool cluster = false){
+    vector<unique_ptr<Model>> models;
+    for (int t = 0; t < threads; t++) models.emplace_back(new Model(L, T, true, 1234, stream_id(L, 0, t)));
+    double flips = 0;
+    double seconds = 0;
+    for (long updates = 1; seconds < min_time; updates *= 2){
+        flips = 0;
+        auto start = chrono::high_resolution_clock::now();
+        #pragma omp parallel for num_threads(threads) reduction(+:flips)
+        for (int t = 0; t < threads; t++){
+            for (long i = 0; i < updates; i++) flips += benchmark_update(*models[t], cluster, L);
+        }
+        chrono::duration<double> diff = chrono::high_resolution_clock::now() - start;
+        seconds = diff.count();
+    }
+    return {flips / seconds, flips / seconds / (L * L)};
+}
+
+/**
+ * @brief Benchmarks the throughput of the engines for L in 16, 32, ..., 512 and an increasing number of threads,
+ * and writes the results as json. The multispin coded IsingModel is only benchmarked for L a multiple of 128
+ * 
+ * @param filename The json-file to write to
+ * @param min_time Minimum duration of every measurement in seconds
+ * @param T Temperature of the IsingModels, close to T_c where the Wolff clusters are of intermediate size
+ */
+void benchmark_engines(string filename, double min_time = 0.2, double T = 2.3){
+    vector<int> thread_counts;
+    for (int threads = 1; threads < omp_get_max_threads(); threads *= 2) thread_counts.push_back(threads);
+    thread_counts.push_back(omp_get_max_threads());
+
+    ofstream outfile(filename);
+    outfile << "{\"T\": " << T << ", \"min_time\": " << min_time << ", \"benchmarks\": [";
+    bool first = true;
+    for (int L = 16; L <= 512; L *= 2){
+        for (int threads : thread_counts){
+            for (string engine : {"metropolis", "wolff", "multispin"}){
+                if (engine == "multispin" and L % 128 != 0) continue;
+                pair<double, double> rates = engine == "multispin"
+                    ? throughput<MultispinIsingModel>(L, T, threads, min_time)
+                    : throughput<IsingModel>(L, T, threads, min_time, engine == "wolff");
+                cout << engine << " L=" << L << " threads=" << threads << ": " << rates.first << " spin updates/s, "
+                     << rates.second << " sweeps/s" << endl;
+                outfile << (first ? "" : ",") << "\n  {\"engine\": \"" << engine << "\", \"L\": " << L << ", \"threads\": " << threads
+                        << ", \"flips_per_second\": " << rates.first << ", \"sweeps_per_second\": " << rates.second << "}";
+                first = false;
+            }
+        }
+    }
+    outfile << "\n]}" << endl;
+    outfile.close();
+}
+
+/**
+ * @brief Estimates values for a ladder of temperatures using parallel tempering (replica exchange).
+ * All replicas are advanced together, and every swap_interval iterations swaps between neighbouring
+ * temperatures are proposed. During the first half of the burn-in the spacing of the ladder is adapted,
+ * such that the swap acceptance rates become roughly equal, with T_min and the highest temperature kept fixed.
+ * 
+ * @param T_min The minimum temperature to estimate for
+ * @param T_max The maximum temperature to estimate for (non inclusive)
+ * @param L The size of the IsingModel
+ * @param steps The number of temperatures between T_min and T_max
+ * @param seed Seed for RNG
+ * @param outfile csv-file to write results, sorted by temperature
+ * @param sample_size Number of samples to make for every temperature
+ * @param burn_in_time Number of iterations to discard, shared by the whole ladder
+ * @param swap_interval Number of iterations between each round of proposed swaps
+ */
+void parallel_tempering(double T_min, double T_max, int L, int steps, int seed, ofstream &outfile, 
+int sample_size = 1000000, int burn_in_time = 30000, int swap_interval = 10){
+    const int adapt_interval = 1000;
+    double dT = (T_max - T_min) / steps;
+    vector<double> temperatures;
+    vector<IsingModel> models;
+    // replica[t] is the index of the model currently at temperature t
+    vector<int> replica;
+    for (int t = 0; t < steps; t++){
+        temperatures.push_back(T_min + t * dT);
+        models.push_back(IsingModel(L, temperatures[t], true, seed, stream_id(L, t)));
+        replica.push_back(t);
+    }
+    // The swaps use a stream of their own
+    Philox rng(seed, stream_id(L, 0, 1));
+    uniform_real_distribution<double> uniform(0, 1);
+    vector<long long> swaps_proposed(steps, 0), swaps_accepted(steps, 0);
+    vector<stat_utils::Moments> moments(steps);
+
+    for (int i = -burn_in_time; i < sample_size; i++){
+        #pragma omp parallel for
+        for (int t = 0; t < steps; t++){
+            models[t].metropolis();
+        }
+
+        if ((i + burn_in_time) % swap_interval == 0){
+            // Alternate between swapping the even and the odd pairs
+            for (int t = ((i + burn_in_time) / swap_interval) % 2; t + 1 < steps; t += 2){
+                IsingModel &cold = models[replica[t]], &hot = models[replica[t + 1]];
+                double delta = (1. / temperatures[t] - 1. / temperatures[t + 1]) * (cold.get_energy() - hot.get_energy());
+                swaps_proposed[t]++;
+                if (delta >= 0 or uniform(rng) < exp(delta)){
+                    swaps_accepted[t]++;
+                    swap(replica[t], replica[t + 1]);
+                    models[replica[t]].set_temperature(temperatures[t]);
+                    models[replica[t + 1]].set_temperature(temperatures[t + 1]);
+                }
+            }
+        }
+
+        if (i < -burn_in_time / 2 and (i + burn_in_time + 1) % adapt_interval == 0 and steps > 2){
+            // Widen the gaps with high acceptance rates and narrow the gaps with low acceptance rates
+            vector<double> gaps(steps - 1);
+            double mean_acceptance = 0, old_width = temperatures[steps - 1] - temperatures[0], new_width = 0;
+            for (int t = 0; t + 1 < steps; t++){
+                mean_acceptance += (double) swaps_accepted[t] / max(swaps_proposed[t], 1LL) / (steps - 1);
+            }
+            for (int t = 0; t + 1 < steps; t++){
+                double acceptance = (double) swaps_accepted[t] / max(swaps_proposed[t], 1LL);
+                gaps[t] = (temperatures[t + 1] - temperatures[t]) * (acceptance + 0.05) / (mean_acceptance + 0.05);
+                new_width += gaps[t];
+            }
+            for (int t = 0; t + 1 < steps; t++){
+                temperatures[t + 1] = temperatures[t] + gaps[t] * old_width / new_width;
+                models[replica[t + 1]].set_temperature(temperatures[t + 1]);
+            }
+            fill(swaps_proposed.begin(), swaps_proposed.end(), 0);
+            fill(swaps_accepted.begin(), swaps_accepted.end(), 0);
+        }
+
+        if (i < 0) continue;
+        for (int t = 0; t < steps; t++){
+            moments[t].add(models[replica[t]].get_energy(), abs(models[replica[t]].get_magnetization()));
+        }
+    }
+
+    cout << "Swap acceptance rates:";
+    for (int t = 0; t + 1 < steps; t++){
+        cout << " " << (double) swaps_accepted[t] / max(swaps_proposed[t], 1LL);
+    }
+    cout << endl;
+
+    for (int t = 0; t < steps; t++){
+        double expected_epsilon, expected_m_abs, c_v, chi;
+        moments[t].values(L, temperatures[t], expected_epsilon, expected_m_abs, c_v, chi);
+        outfile << temperatures[t] << "," << expected_epsilon << "," << expected_m_abs << "," << c_v << "," << chi << endl;
+    }
+}
+
+/**
+ * @brief Writes estimated values from IsingModels within the specified range of temperatures, sorted by temperature.
+ * Temperature i uses the RNG stream stream_id(L, i) of the seed, so the results do not depend on the number of threads
  * 
  * @param T_min The minimum temperature to estimate for
  * @param T_max The maximum temperature to estimate for (non inclusive)
@@ -263,28 +833,63 @@ void timing_parallel_vs_serial(int L, double T) {
  * @param steps The number of temperatures between T_min and T_max
  * @param seed Seed for RNG
  * @param filename Filename of the outputfile
+ * @param cluster If True, Wolff cluster updates are used instead of the Metropolis algorithm
+ * @param replica_exchange If True, the temperatures are simulated together using parallel tempering
+ * @param use_checkpoint If True, every temperature is checkpointed and resumed, see checkpointed_values
+ * @param packed If True, the multispin coded MultispinIsingModel is used, which needs L to be a multiple of 128
  */
-void look_between_temperatures(double T_min, double T_max, int L, int steps, int &seed, string filename){
+void look_between_temperatures(double T_min, double T_max, int L, int steps, int seed, string filename, bool cluster = false, bool replica_exchange = false, bool use_checkpoint = false, bool packed = false){
     cout << "Testing for " << L << "x" << L << endl;
     double dT = (T_max - T_min) / steps;
     ofstream outfile(filename);
     outfile << "T,<epsilon>,<|m|>,C_v,chi" << endl;
-    #pragma omp parallel for
-    for (int i = 0; i < steps; i++){
-        double T = T_min + i * dT;
-        write_values_to_file(L, T, seed++, outfile);
+    if (replica_exchange){
+        if (cluster) cout << "Cluster updates are not used with parallel tempering, using the Metropolis algorithm" << endl;
+        if (packed) cout << "The multispin coded IsingModel is not used with parallel tempering, using IsingModel" << endl;
+        parallel_tempering(T_min, T_max, L, steps, seed, outfile);
+        outfile.close();
+        return;
     }
+    vector<double> temperatures;
+    for (int i = 0; i < steps; i++) temperatures.push_back(T_min + i * dT);
+    write_values_for_temperatures(temperatures, L, seed, outfile, cluster, use_checkpoint, packed);
     outfile.close();
 }
 
 
 
 int main(int argc, char *argv[]){
+    bool use_checkpoint = has_flag("-k", argv, argv + argc);
+    int extend_by = 0;
+    char **extend = find(argv, argv + argc, string("-e"));
+    if (extend != argv + argc and extend + 1 != argv + argc){
+        extend_by = atoi(*(extend + 1));
+        use_checkpoint = true;
+    }
+    bool packed = has_flag("-p", argv, argv + argc);
+    bool cluster = has_flag("-c", argv, argv + argc);
+    if (packed and cluster){
+        cout << "Cluster updates are not implemented for the multispin coded IsingModel, using the Metropolis algorithm" << endl;
+        cluster = false;
+    }
+    bool takes_L = has_flag("-w", argv, argv + argc) or has_flag("-z", argv, argv + argc)
+                   or has_flag("-m", argv, argv + argc) or has_flag("-v", argv, argv + argc);
+    if (packed and takes_L and (argc < 3 or atoi(argv[2]) <= 0 or atoi(argv[2]) % 128 != 0)){
+        cout << "The multispin coded IsingModel needs L to be a positive multiple of 128" << endl;
+        return 1;
+    }
+    if (packed and use_checkpoint){
+        cout << "Checkpoints are not implemented for the multispin coded IsingModel, running without checkpoints" << endl;
+        use_checkpoint = false;
+    }
     if (has_flag("-h", argv, argv + argc)) print_help_message();
     else if (has_flag("-t", argv, argv + argc)) {
         int seed = 3875623;
         cout << "Testing for convergence against analytical results in the 2x2 case. Needed sample size: " << test2x2(seed) << endl;
-        timing_parallel_vs_serial(20, 2.);
+        cout << "Testing for convergence against analytical results in the 2x2 case, using Wolff cluster updates. Needed sample size: " << test2x2(seed, true) << endl;
+        cout << "Testing the tracked energy and magnetization of the multispin coded IsingModel: "
+             << (test_multispin(seed) ? "passed" : "failed") << endl;
+        timing_parallel_vs_serial(20, 2.1);
     }
     else if (has_flag("-b", argv, argv + argc)) { 
         int seed =  23344;
@@ -309,19 +914,44 @@ int main(int argc, char *argv[]){
         int L = atoi(argv[2]);
         double T = atof(argv[3]);
         int seed =atoi(argv[4]);
-        write_samples(100000, L, T, seed);
+        write_samples(100000, L, T, seed, AUTOMATIC_BURN_IN, packed);
     }
     
     else if (has_flag("-s", argv, argv + argc)){
+        bool replica_exchange = has_flag("-x", argv, argv + argc);
         int seed = 456788;
         int steps = 24;
         double T_min = 2.1;
         double T_max = 2.4;
         for (int L = 20; L <= 140; L += 20) {
-            look_between_temperatures(T_min, T_max, L, steps, seed, "output/values_L=" + to_string(L) + ".csv");
+            look_between_temperatures(T_min, T_max, L, steps, seed, "output/values_L=" + to_string(L) + ".csv", cluster, replica_exchange, use_checkpoint);
+        }
+    }
+    else if (has_flag("-v", argv, argv + argc)){
+        if (argc < 5){
+            cout << "Please include L, T and seed" << endl;
+            return 1;
+        }
+        int L = atoi(argv[2]);
+        double T = atof(argv[3]);
+        int seed = atoi(argv[4]);
+        cout << "T,<epsilon>,<|m|>,C_v,chi" << endl;
+        write_values_to_file(L, T, seed, cout, cluster, use_checkpoint, extend_by, packed);
+    }
+    else if (has_flag("-m", argv, argv + argc)){
+        int steps = 4;
+        if (argc < 6){
+            cout << "Please include L, T_min, T_max and seed" << endl;
+            return 1;
         }
+        int L = atoi(argv[2]);
+        double T_min = atof(argv[3]);
+        double T_max = atof(argv[4]);
+        int seed = atoi(argv[5]);
+        write_reweighting_samples(T_min, T_max, L, steps, seed, cluster, packed);
     }
     else if (has_flag("-z", argv, argv + argc)){
+        bool replica_exchange = has_flag("-x", argv, argv + argc);
         int steps = 24;
         if (argc < 5){
              cout << "Please include L, T_min, T_max and seed" << endl;
@@ -331,7 +961,23 @@ int main(int argc, char *argv[]){
         double T_min = atof(argv[3]);
         double T_max = atof(argv[4]);
         int seed = atoi(argv[5]);
-        look_between_temperatures(T_min, T_max, L, steps, seed, "output/values_zoom_L=" + to_string(L) + ".csv");
+        look_between_temperatures(T_min, T_max, L, steps, seed, "output/values_zoom_L=" + to_string(L) + ".csv", cluster, replica_exchange, use_checkpoint, packed);
+    }
+    else if (has_flag("-d", argv, argv + argc)){
+        if (argc < 4){
+            cout << "Please include L and seed" << endl;
+            return 1;
+        }
+        int L = atoi(argv[2]);
+        int seed = atoi(argv[3]);
+        double log_f_final = argc > 4 ? atof(argv[4]) : 1e-6;
+        WangLandau wang_landau(L, seed);
+        wang_landau.run(log_f_final);
+        wang_landau.write("output/density_of_states_L=" + to_string(L) + ".csv");
+    }
+    else if (has_flag("-n", argv, argv + argc)){
+        double min_time = argc > 2 ? atof(argv[2]) : 0.2;
+        benchmark_engines("output/benchmark_engines.json", min_time);
     }
     return 0;
 }
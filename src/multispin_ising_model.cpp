@@ -0,0 +1,144 @@
+#include "project4/multispin_ising_model.hpp"
+
+#include <cmath>
+#include <stdexcept>
+
+// IMPORTANT NOTE:
+// Documentation is found in the header-file
+
+MultispinIsingModel::MultispinIsingModel(int lattice_length, double T, bool random_spins, int seed, uint64_t stream){
+    if (lattice_length <= 0 or lattice_length % 128 != 0){
+        throw std::invalid_argument("The multispin coded IsingModel needs L to be a positive multiple of 128");
+    }
+    L = lattice_length;
+    words = L / 128;
+    rng = Philox(seed, stream);
+    set_temperature(T);
+    for (int colour = 0; colour < 2; colour++){
+        sublattice[colour] = vector<uint64_t>(L * words, 0);
+        if (random_spins){
+            for (auto &word : sublattice[colour]) word = rng();
+        }
+    }
+    long long down = 0;
+    for (int colour = 0; colour < 2; colour++){
+        for (auto word : sublattice[colour]) down += __builtin_popcountll(word);
+    }
+    M = L * L - 2 * down;
+    E = count_energy();
+}
+
+void MultispinIsingModel::set_temperature(double T){
+    beta = 1 / T;
+    p = exp(-4 * beta);
+}
+
+double MultispinIsingModel::get_temperature(){
+    return 1 / beta;
+}
+
+int MultispinIsingModel::get_energy(){
+    return E;
+}
+
+int MultispinIsingModel::get_magnetization(){
+    return M;
+}
+
+double MultispinIsingModel::get_epsilon(){
+    return (double) E / (L * L);
+}
+
+double MultispinIsingModel::get_m(){
+    return (double) M / (L * L);
+}
+
+long long MultispinIsingModel::get_accepted_flips(){
+    return accepted_flips;
+}
+
+void MultispinIsingModel::locate(int i, int j, int &colour, int &word, int &bit){
+    // the red spins of row i are in the columns 2k + i % 2, and the black spins in the columns 2k + 1 - i % 2
+    colour = (i + j) % 2;
+    int k = j / 2;
+    word = i * words + k / 64;
+    bit = k % 64;
+}
+
+int MultispinIsingModel::get_spin(int i, int j){
+    int colour, word, bit;
+    locate(i, j, colour, word, bit);
+    return (sublattice[colour][word] >> bit) & 1 ? -1 : 1;
+}
+
+int MultispinIsingModel::count_energy(){
+    int energy = 0;
+    for (int i = 0; i < L; i++){
+        for (int j = 0; j < L; j++){
+            energy -= get_spin(i, j) * (get_spin((i + 1) % L, j) + get_spin(i, (j + 1) % L));
+        }
+    }
+    return energy;
+}
+
+uint64_t MultispinIsingModel::bernoulli_mask(){
+    uint64_t mask = 0, undecided = ~0ULL;
+    double q = p;
+    for (int k = 0; k < 53 && undecided; k++){
+        uint64_t r = rng();
+        q *= 2;
+        if (q >= 1){
+            // a uniform bit 0 where the probability has a 1 means the uniform number is smaller
+            q -= 1;
+            mask |= undecided & ~r;
+            undecided &= r;
+        }
+        else undecided &= ~r;
+    }
+    return mask;
+}
+
+void MultispinIsingModel::half_sweep(int colour){
+    vector<uint64_t> &spins = sublattice[colour];
+    const vector<uint64_t> &neighbours = sublattice[1 - colour];
+    long long delta_E = 0, delta_M = 0;
+    for (int i = 0; i < L; i++){
+        const uint64_t *up = &neighbours[((i - 1 + L) % L) * words];
+        const uint64_t *down = &neighbours[((i + 1) % L) * words];
+        const uint64_t *row = &neighbours[i * words];
+        // the fourth neighbour is in the same row, one spin before or after in the packed order
+        bool previous = (i + colour) % 2 == 0;
+        for (int w = 0; w < words; w++){
+            uint64_t side;
+            if (previous) side = (row[w] << 1) | (row[(w - 1 + words) % words] >> 63);
+            else side = (row[w] >> 1) | (row[(w + 1) % words] << 63);
+            uint64_t s = spins[i * words + w];
+            // a set bit marks an anti-aligned neighbour, and a counts them bit-sliced as b0 + 2 b1 + 4 b2
+            uint64_t x1 = s ^ up[w], x2 = s ^ down[w], x3 = s ^ row[w], x4 = s ^ side;
+            uint64_t s1 = x1 ^ x2, c1 = x1 & x2, s2 = x3 ^ x4, c2 = x3 & x4;
+            uint64_t b0 = s1 ^ s2, b1 = c1 ^ c2 ^ (s1 & s2), b2 = c1 & c2;
+            // delta_E = 8 - 4a, so a >= 2 is always accepted, a = 1 with probability p and a = 0 with probability p^2
+            uint64_t flip = b1 | b2;
+            uint64_t a_is_1 = b0 & ~flip, a_is_0 = ~(b0 | flip);
+            if (a_is_1 | a_is_0){
+                uint64_t r1 = bernoulli_mask();
+                flip |= a_is_1 & r1;
+                if (a_is_0 & r1) flip |= a_is_0 & r1 & bernoulli_mask();
+            }
+            spins[i * words + w] = s ^ flip;
+
+            int flipped = __builtin_popcountll(flip);
+            accepted_flips += flipped;
+            delta_E += 8 * flipped - 4 * (__builtin_popcountll(flip & b0) + 2 * __builtin_popcountll(flip & b1) + 4 * __builtin_popcountll(flip & b2));
+            // a spin pointing up (bit 0) changes M by -2, and a spin pointing down by 2
+            delta_M += -2 * flipped + 4 * __builtin_popcountll(flip & s);
+        }
+    }
+    E += delta_E;
+    M += delta_M;
+}
+
+void MultispinIsingModel::metropolis(){
+    half_sweep(0);
+    half_sweep(1);
+}
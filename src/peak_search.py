@@ -0,0 +1,198 @@
+"""
+Adaptive search for the temperatures where C_v and chi attain their maximum.
+
+Instead of simulating a fixed grid of temperatures, every new simulation is
+placed by a golden-section search inside the bracket that is known to
+contain the maximum. The search stops once the bracket is narrower than the
+requested tolerance. Since the simulated values are noisy, the final
+estimate is the vertex of a parabola fitted to the simulations close to the
+final bracket, rather than the best single simulation.
+"""
+
+import numpy as np
+
+import cache
+
+GOLDEN_RATIO = (np.sqrt(5) - 1) / 2
+
+
+def simulate(L, T, seed, cluster=False, checkpoint=False):
+    """Estimate <epsilon>, <|m|>, C_v and chi at a single temperature with ./runner -v
+
+    Parameters
+    ----------
+        L : int
+            The size of the lattice
+        T : float
+            The temperature
+        seed : int
+            Seed for RNG
+        cluster : bool
+            If True, the runner uses Wolff cluster updates
+        checkpoint : bool
+            If True, the runner checkpoints the simulation, and resumes an
+            interrupted simulation with the same parameters. Ignored when
+            the cache is disabled, such that every simulation starts over
+
+    Returns
+    -------
+        values : dict
+            The estimated values, keyed by the column names of the runner
+    """
+    checkpoint = checkpoint and cache.enabled
+    flags = (["-c"] if cluster else []) + (["-k"] if checkpoint else [])
+    result = cache.run(["-v", L, repr(float(T)), seed, *flags])
+    result.check_returncode()
+    header, row = result.stdout.strip().splitlines()[-2:]
+    values = dict(zip(header.split(","), map(float, row.split(","))))
+    values["T"] = float(T)
+    return values
+
+
+class PeakSearch:
+    def __init__(self, L, seed, cluster=False, simulate=simulate):
+        """Adaptive search for the maxima of C_v and chi for one lattice size
+
+        All the simulations are kept, such that the searches for C_v and chi
+        share the temperatures they have in common.
+
+        Parameters
+        ----------
+            L : int
+                The size of the lattice
+            seed : int
+                Seed for RNG, incremented for every simulation
+            cluster : bool
+                If True, the runner uses Wolff cluster updates
+            simulate : callable
+                Function of (L, T, seed, cluster) returning the values at T
+        """
+        self._L = L
+        self._seed = seed
+        self._cluster = cluster
+        self._simulate = simulate
+        self.simulations = {}
+
+    def evaluate(self, T, value):
+        """Get a value at the temperature T, simulating only if T is new
+
+        Parameters
+        ----------
+            T : float
+                The temperature
+            value : str
+                The column to return, "C_v" or "chi"
+
+        Returns
+        -------
+            value : float
+        """
+        T = round(float(T), 12)
+        if T not in self.simulations:
+            self.simulations[T] = self._simulate(self._L, T, self._seed, self._cluster)
+            self._seed += 1
+        return self.simulations[T][value]
+
+    def search(self, value, T_min, T_max, tol=1e-3):
+        """Find the maximum of a value with golden-section search
+
+        Parameters
+        ----------
+            value : str
+                The column to maximize, "C_v" or "chi"
+            T_min : float
+                The lower end of the bracket
+            T_max : float
+                The upper end of the bracket
+            tol : float
+                The requested width of the final bracket
+
+        Returns
+        -------
+            T_peak : float
+                The estimated temperature of the maximum
+        """
+        a, b = T_min, T_max
+        c = b - GOLDEN_RATIO * (b - a)
+        d = a + GOLDEN_RATIO * (b - a)
+        f_c, f_d = self.evaluate(c, value), self.evaluate(d, value)
+        while b - a > tol:
+            if f_c > f_d:
+                b, d, f_d = d, c, f_c
+                c = b - GOLDEN_RATIO * (b - a)
+                f_c = self.evaluate(c, value)
+            else:
+                a, c, f_c = c, d, f_d
+                d = a + GOLDEN_RATIO * (b - a)
+                f_d = self.evaluate(d, value)
+
+        # least squares parabola through the simulations around the final bracket
+        T = np.array(sorted(self.simulations))
+        f = np.array([self.simulations[t][value] for t in T])
+        width = max(b - a, tol)
+        close = np.abs(T - (a + b) / 2) <= 4 * width
+        if np.sum(close) >= 3:
+            curvature, slope, _ = np.polyfit(T[close], f[close], 2)
+            if curvature < 0:
+                vertex = -slope / (2 * curvature)
+                if a - width <= vertex <= b + width:
+                    return vertex
+        return (a + b) / 2
+
+    def write(self, filename):
+        """Write all the simulations, sorted by temperature
+
+        Parameters
+        ----------
+            filename : str
+                The csv-file to write to
+        """
+        with open(filename, "w") as outfile:
+            outfile.write("T,<epsilon>,<|m|>,C_v,chi\n")
+            for T in sorted(self.simulations):
+                values = self.simulations[T]
+                outfile.write(
+                    ",".join(
+                        str(values[column])
+                        for column in ["T", "<epsilon>", "<|m|>", "C_v", "chi"]
+                    )
+                    + "\n"
+                )
+
+
+def adaptive_zoom(T_min=2.1, T_max=2.4, tol=1e-3, cluster=False):
+    """Find T_c(L) for the lattice sizes of the report with adaptive searches
+
+    Parameters
+    ----------
+        T_min : float
+            The lower end of the initial bracket
+        T_max : float
+            The upper end of the initial bracket
+        tol : float
+            The requested accuracy of the temperature of the maximum
+        cluster : bool
+            If True, the runner uses Wolff cluster updates
+    """
+    # a scan and a zoom with 24 temperatures each
+    fixed_grid_simulations = 2 * 24
+    seed = 7531
+    for L in range(20, 160, 20):
+        peak_search = PeakSearch(L, seed, cluster)
+        T_c_v = peak_search.search("C_v", T_min, T_max, tol)
+        T_chi = peak_search.search("chi", T_min, T_max, tol)
+        peak_search.write(f"output/values_adaptive_L={L}.csv")
+        print(f"L = {L} - argmax C_v: {T_c_v}, argmax chi {T_chi}")
+        print(
+            f"Used {len(peak_search.simulations)} simulations, "
+            f"compared with {fixed_grid_simulations} for the fixed grid"
+        )
+        seed += 1000
+
+
+def main(cluster=False):
+    adaptive_zoom(cluster=cluster)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+#include "project4/philox.hpp"
+
+// IMPORTANT NOTE:
+// Documentation is found in the header-file
+
+Philox::Philox(uint64_t seed, uint64_t stream) : seed(seed), stream(stream), position(0) {}
+
+void Philox::discard(unsigned long long z){
+    position += z;
+    // The next output is the second of its block, which has to be calculated
+    if (position % 2) generate();
+}
+
+std::ostream &operator<<(std::ostream &out, const Philox &rng){
+    return out << rng.seed << " " << rng.stream << " " << rng.position;
+}
+
+std::istream &operator>>(std::istream &in, Philox &rng){
+    in >> rng.seed >> rng.stream >> rng.position;
+    if (rng.position % 2) rng.generate();
+    return in;
+}
+
+uint64_t stream_id(int L, int T_index, int chain){
+    return ((uint64_t) (L & 0xFFFFFF) << 40) | ((uint64_t) (T_index & 0xFFFFFF) << 16) | (uint64_t) (chain & 0xFFFF);
+}
@@ -1,10 +1,18 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import seaborn as sns
 import numpy as np
 import matplotlib.pyplot as plt
 import pandas as pd
-import scipy.stats as stats
+from scipy.optimize import curve_fit
 import tikzplotlib
 
+import burn_in
+import downsample
+import result_store
+from samples import read_samples
+
 sns.set_theme()
 
 
@@ -29,14 +37,25 @@ def tweak_tikz_plots(filename):
                 f.write(line)
 
 
-def save_tikz(filename):
+def save_tikz(filename, points=downsample.POINT_BUDGET, method="lttb"):
     """Saves the plot as a tikz-tex file
 
+    Every line with more points than the budget is downsampled first, such
+    that the tikz-file stays small and compiles fast.
+
     Parameters
     ----------
         filename : str
             The filename of the tikz plot to be saved
+        points : int
+            The largest number of points of every line
+        method : str
+            The downsampler, "lttb" or "minmax" (see downsample.py)
     """
+    for line in plt.gca().get_lines():
+        x, y = line.get_data()
+        if len(x) > points:
+            line.set_data(*downsample.downsample(x, y, points, method))
     plt.grid(True)
     tikzplotlib.clean_figure()
     tikzplotlib.save(filename)
@@ -44,44 +63,70 @@ def save_tikz(filename):
     plt.clf()
 
 
-def plot_burn_in_times(l_values, plot_lengths, temperatures=[1, 2.4]):
+def plot_burn_in_times(l_values, plot_lengths=None, temperatures=[1, 2.4]):
     """Plots the burn in times for different temperatures and lattice sizes
 
+    The burn-in time of every simulation is detected with MSER, and marked
+    with a dashed line.
+
     Parameters
     ----------
         l_values : list
             The lattice sizes to be used
         plot_lengths : list
-            The lengths of the burn in times to be plotted
+            The lengths of the burn in times to be plotted. If None, every
+            plot shows three times the longest detected burn-in time
         temperatures : list
             The temperatures to be used
     """
-    assert (
+    assert plot_lengths is None or (
         len(l_values) == len(plot_lengths) / 2
     ), "l_values and plot_lenghts must have the same length"
 
     for i, L in enumerate(l_values):
+        simulations = {}
+        for randomness, order_type in zip(
+            ["random", "nonrandom"], ["Unordered", "Ordered"]
+        ):
+            for T in temperatures:
+                filename = f"burn_in_L_{L}_T_{T:.6f}_{randomness}.bin"
+                _, sampled_energy, sampled_magnetization_abs = read_samples(
+                    "output/" + filename, L, T
+                )
+                simulations[order_type, T] = (
+                    sampled_energy,
+                    sampled_magnetization_abs,
+                    burn_in.burn_in_time(sampled_energy, sampled_magnetization_abs),
+                )
+                print(
+                    f"L={L}, T={T}, {order_type}: "
+                    f"detected burn-in time {simulations[order_type, T][2]}"
+                )
+
         for j, value_type in enumerate(["Energy", "Magnetization"]):
-            for randomness, order_type in zip(
-                ["random", "nonrandom"], ["Unordered", "Ordered"]
-            ):
-                for T in temperatures:
-                    filename = f"burn_in_L_{L}_T_{T:.6f}_{randomness}.csv"
-
-                    df = pd.read_csv("output/" + filename)
-
-                    if value_type == "Energy":
-                        plt.plot(
-                            df.N[: plot_lengths[2 * i + j]],
-                            df.expected_E[: plot_lengths[2 * i + j]],
-                            label=f"{order_type}, $T={T}$",
-                        )
-                    else:
-                        plt.plot(
-                            df.N[: plot_lengths[2 * i + j]],
-                            df.expected_M[: plot_lengths[2 * i + j]],
-                            label=f"{order_type}, $T={T}$",
-                        )
+            if plot_lengths is None:
+                length = max(
+                    500,
+                    3
+                    * max(burn_in_time for _, _, burn_in_time in simulations.values()),
+                )
+            else:
+                length = plot_lengths[2 * i + j]
+            for (order_type, T), (
+                sampled_energy,
+                sampled_magnetization_abs,
+                burn_in_time,
+            ) in simulations.items():
+                sampled = (
+                    sampled_energy
+                    if value_type == "Energy"
+                    else sampled_magnetization_abs
+                )
+                # running average over the first N samples, per spin
+                running_mean = burn_in.running_mean(sampled[:length]) / L ** 2
+                N = np.arange(1, len(running_mean) + 1)
+                (line,) = plt.plot(N, running_mean, label=f"{order_type}, $T={T}$")
+                plt.axvline(burn_in_time, color=line.get_color(), linestyle="--")
 
             plt.legend()
             estimated_what = (
@@ -104,22 +149,27 @@ def plot_probability_distribution():
     """Plots probability distribution for different temperatures"""
     L = "20"
     for T in ["1.0", "2.1", "2.4"]:
-        df = pd.read_csv(f"output/samples_L={L}_T={T}.csv")
+        _, sampled_energy, _ = read_samples(
+            f"output/samples_L={L}_T={T}.bin", int(L), float(T)
+        )
+        epsilon = sampled_energy / int(L) ** 2
         plt.title(fr"Estimated probability distribution of $\epsilon$ at $T={T}J/k_B$")
         plt.xlabel(r"$\epsilon$ $[J]$")
         plt.ylabel(fr"$p(\epsilon; {T} J / k_B)$")
-        plt.hist(df.epsilon, bins="auto", density=True)
+        plt.hist(epsilon, bins="auto", density=True)
         filename = f"plots/distributions/epsilon_L={L}_T={T}.tex"
         save_tikz(filename)
-        print(f"Variance at T={T}: {df.epsilon.var()}")
-        print(f"Expected value at T={T}: {df.epsilon.mean()}")
+        print(f"Variance at T={T}: {epsilon.var(ddof=1)}")
+        print(f"Expected value at T={T}: {epsilon.mean()}")
 
 
 def plot_values():
-    """Plots expected values for different lattice sizes"""
+    """Plots expected values for different lattice sizes, read from the result store"""
     all_L = range(40, 160, 20)
 
-    dfs = {L: pd.read_csv(f"output/values_L={L}.csv") for L in all_L}
+    store = result_store.ResultStore()
+    store.sync_outputs()
+    values = store.query("scan", list(all_L))
     for i, (value, ylabel, unit) in enumerate(
         zip(
             ["<epsilon>", "<|m|>", "C_v", "chi"],
@@ -128,9 +178,8 @@ def plot_values():
         )
     ):
         for L in all_L:
-            df = dfs[L]
-            df.sort_values("T", inplace=True, ignore_index=True)
-            plt.plot(df["T"], df[value], label=f"L={L}")
+            in_L = values["L"] == L
+            plt.plot(values["T"][in_L], values[value][in_L], label=f"L={L}")
 
         plt.title(f"Estimated values of ${ylabel}$ for different T")
         plt.ylabel(f"${ylabel}$ [${unit}$]")
@@ -144,32 +193,55 @@ def plot_values():
 def estimate_T_inf(value: str):
     """Estimates T_inf based observed values
 
+    The temperatures of the maxima found by zoom.py are fitted with weighted
+    least squares, using their jackknife errors. Maxima without an error are
+    left out. If zoom.py has not written output/T_c_zoom.csv, the
+    temperatures with the largest zoomed value in the result store are
+    fitted without weights instead.
+
     Parameters
     ----------
         value : str
             The value to base the estimate of T_inf
     """
-    y = []
-    x = []
     label = value if value == "C_v" else r"\chi"
-    for L in range(40, 160, 20):
-        df = pd.read_csv(f"output/values_zoom_L={L}.csv")
-        argmax = df[value].idxmax()
-        y.append(df.iloc[argmax]["T"])
-        x.append(1 / L)
-    linear_fit = stats.linregress(x, y)
+    if os.path.exists("output/T_c_zoom.csv"):
+        df = pd.read_csv("output/T_c_zoom.csv")
+        df = df[(df.L >= 40) & (df[f"{value}_error"] > 0)]
+        x = (1 / df.L).to_numpy()
+        y = df[value].to_numpy()
+        y_error = df[f"{value}_error"].to_numpy()
+    else:
+        all_L = range(40, 160, 20)
+        store = result_store.ResultStore()
+        store.sync_outputs()
+        values = store.query("zoom", list(all_L), columns=[value])
+        x, y, y_error = [], [], None
+        for L in all_L:
+            in_L = values["L"] == L
+            y.append(values["T"][in_L][np.argmax(values[value][in_L])])
+            x.append(1 / L)
+        x, y = np.asarray(x), np.asarray(y)
+    (slope, intercept), covariance = curve_fit(
+        lambda x, slope, intercept: slope * x + intercept,
+        x,
+        y,
+        sigma=y_error,
+        absolute_sigma=y_error is not None,
+    )
+    estimate, estimate_error = intercept, np.sqrt(covariance[1, 1])
+    print(f"T_c(inf) from {value}: {estimate} +- {estimate_error}")
     plt.title(
         r"Observations of $T_c(L)$ against $L^{-1}$ and linear fit to find $T_c(\infty)$"
     )
-    plt.scatter(x, y, label=r"Observed $T_c$")
-    estimate = linear_fit.intercept
+    plt.errorbar(x, y, yerr=y_error, fmt="o", label=r"Observed $T_c$")
     plt.scatter(
         [0] * len(x),
         [estimate] * len(x),
         s=40,
-        label=fr"$T_c(\infty) = {estimate: .5f}$",
+        label=fr"$T_c(\infty) = {estimate: .5f} \pm {estimate_error:.5f}$",
     )
-    plt.plot([0, max(x)], estimate + linear_fit.slope * np.asarray([0, max(x)]))
+    plt.plot([0, max(x)], estimate + slope * np.asarray([0, max(x)]))
     plt.legend()
     plt.title(fr"Estimating $T_c(\infty)$ using ${label}$")
     plt.ylabel("$T_c$ [$J / k_B$]")
@@ -179,13 +251,29 @@ def estimate_T_inf(value: str):
     save_tikz(filename)
 
 
-def main():
-    """Main function"""
-    plot_burn_in_times(l_values=[20, 100], plot_lengths=[6_000, 20_000, 1_500, 3_000])
-    plot_probability_distribution()
-    plot_values()
-    estimate_T_inf("C_v")
-    estimate_T_inf("chi")
+def main(processes=None):
+    """Main function
+
+    The figures are independent, and are rendered in parallel.
+
+    Parameters
+    ----------
+        processes : int
+            Number of processes rendering figures, by default one per core
+    """
+    figures = [
+        (plot_burn_in_times, [20]),
+        (plot_burn_in_times, [100]),
+        (plot_probability_distribution,),
+        (plot_values,),
+        (estimate_T_inf, "C_v"),
+        (estimate_T_inf, "chi"),
+    ]
+    # every process has its own pyplot state, so the figures do not mix
+    with ProcessPoolExecutor(processes) as executor:
+        futures = [executor.submit(*figure) for figure in figures]
+        for future in futures:
+            future.result()
 
 
 if __name__ == "__main__":
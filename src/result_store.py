@@ -0,0 +1,284 @@
+"""
+Append-only store of the estimated values of every run
+
+Every row of values (<epsilon>, <|m|>, C_v and chi at a temperature) is a
+fixed size record in output/results.bin, keyed on the kind of run (a scan,
+a zoom and so on), L, T and the seed. The file starts with a 16 byte
+header, followed by the records in the order they were appended:
+
+    kind    uint8       index in KINDS
+    L       int32
+    T       float64
+    seed    int64       0 when unknown
+    time    float64     when the record was appended, in seconds since the epoch
+    <epsilon>, <|m|>, C_v, chi      float64
+
+Appends hold an exclusive lock on the file and write all their records at
+once, so concurrent runs never interleave. The records of an append form a
+batch, which shares its time, and every batch gets a later time than the
+batch before it. Readers memory-map the records, and ignore a partly
+written record at the end.
+
+A run on a new grid of temperatures replaces the earlier runs, like the
+csv-files which every run overwrites, so a query only returns the latest
+batch of every (kind, L). Queries are answered from an index sorted by
+(kind, L, T), so a query only reads the records of the lattice sizes it
+asks for, and returns sorted columns:
+
+    store = ResultStore()
+    values = store.query("scan", T_min=2.25, T_max=2.32, columns=["C_v"])
+    values["L"], values["T"], values["C_v"]
+
+The runner itself writes csv-files, see sync_outputs for importing them.
+"""
+
+import fcntl
+import glob
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+MAGIC = b"ISINGRES"
+VERSION = 1
+STORE = "output/results.bin"
+KINDS = ["scan", "zoom", "adaptive", "analytical", "exact", "wang_landau"]
+VALUES = ["<epsilon>", "<|m|>", "C_v", "chi"]
+
+HEADER_DTYPE = np.dtype([("magic", "S8"), ("version", "<u4"), ("reserved", "<u4")])
+RECORD_DTYPE = np.dtype(
+    [
+        ("kind", "u1"),
+        ("L", "<i4"),
+        ("T", "<f8"),
+        ("seed", "<i8"),
+        ("time", "<f8"),
+    ]
+    + [(value, "<f8") for value in VALUES]
+)
+
+# the csv-files written by the runner and the python scripts, and the kind of their rows
+OUTPUTS = {
+    "scan": "output/values_L=*.csv",
+    "zoom": "output/values_zoom_L=*.csv",
+    "adaptive": "output/values_adaptive_L=*.csv",
+    "analytical": "output/analytical_L=*.csv",
+    "exact": "output/exact_L=*.csv",
+    "wang_landau": "output/values_wang_landau_L=*.csv",
+}
+
+
+class ResultStore:
+    def __init__(self, filename=STORE):
+        """Append values to the store, and query them
+
+        Parameters
+        ----------
+            filename : str
+                The store file, created on the first append
+        """
+        self._filename = filename
+        self._records = np.zeros(0, dtype=RECORD_DTYPE)
+        self._index = np.zeros(0, dtype=int)
+        self._keys = np.zeros(0, dtype=np.int64)
+
+    def append(self, rows, kind, L, seed=0):
+        """Append rows of values from a single run
+
+        Parameters
+        ----------
+            rows : pd.DataFrame or list of dict
+                The values, with the columns T, <epsilon>, <|m|>, C_v and chi.
+                Missing values are stored as NaN
+            kind : str
+                The kind of run, one of KINDS
+            L : int
+                The size of the lattice
+            seed : int or array_like
+                The seed of the run, or of every row
+        """
+        df = pd.DataFrame(rows)
+        records = np.zeros(len(df), dtype=RECORD_DTYPE)
+        records["kind"] = KINDS.index(kind)
+        records["L"] = L
+        records["T"] = df["T"]
+        records["seed"] = seed
+        for value in VALUES:
+            records[value] = df[value] if value in df else np.nan
+
+        os.makedirs(os.path.dirname(self._filename) or ".", exist_ok=True)
+        fd = os.open(self._filename, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            size = os.fstat(fd).st_size
+            if size == 0:
+                header = np.zeros(1, dtype=HEADER_DTYPE)
+                header["magic"], header["version"] = MAGIC, VERSION
+                os.write(fd, header.tobytes())
+            # the time identifies the batch, so it is later than the last batch
+            records["time"] = time.time()
+            count = (size - HEADER_DTYPE.itemsize) // RECORD_DTYPE.itemsize
+            if count > 0:
+                last = os.pread(
+                    fd,
+                    RECORD_DTYPE.itemsize,
+                    HEADER_DTYPE.itemsize + (count - 1) * RECORD_DTYPE.itemsize,
+                )
+                last_time = np.frombuffer(last, dtype=RECORD_DTYPE)["time"][0]
+                records["time"] = max(time.time(), last_time + 1e-6)
+            os.write(fd, records.tobytes())
+        finally:
+            os.close(fd)
+
+    def _load(self):
+        """Map the records, and index them again if the store has grown"""
+        if not os.path.exists(self._filename):
+            return
+        size = os.path.getsize(self._filename)
+        count = (size - HEADER_DTYPE.itemsize) // RECORD_DTYPE.itemsize
+        if count <= len(self._records):
+            return
+        header = np.fromfile(self._filename, dtype=HEADER_DTYPE, count=1)[0]
+        assert header["magic"] == MAGIC, f"{self._filename} is not a result store"
+        assert (
+            header["version"] == VERSION
+        ), f"Unknown result store version in {self._filename}"
+        self._records = np.memmap(
+            self._filename,
+            dtype=RECORD_DTYPE,
+            mode="r",
+            offset=HEADER_DTYPE.itemsize,
+            shape=(count,),
+        )
+
+        # sorted by (kind, L, T), the latest record last among equal keys
+        kind, L, T = (np.asarray(self._records[name]) for name in ["kind", "L", "T"])
+        order = np.lexsort((np.arange(count), T, L, kind))
+        self._index = order
+        self._keys = (kind[order].astype(np.int64) << 32) | L[order].astype(np.int64)
+
+    def query(
+        self,
+        kind,
+        L=None,
+        T_min=-np.inf,
+        T_max=np.inf,
+        columns=VALUES,
+        latest_batch=True,
+    ):
+        """Find the latest values of a kind of run, in a range of temperatures
+
+        Parameters
+        ----------
+            kind : str
+                The kind of run, one of KINDS
+            L : int or list of int
+                The lattice sizes, by default all of them
+            T_min : float
+                The lowest temperature, inclusive
+            T_max : float
+                The highest temperature, inclusive
+            columns : list of str
+                The values to return
+            latest_batch : bool
+                If True, only the latest batch of every lattice size is
+                used. If False, the latest record at every temperature of
+                all the batches is used
+
+        Returns
+        -------
+            values : dict of np.ndarray
+                L, T, seed and the requested columns, sorted by L and then T
+        """
+        self._load()
+        kind = KINDS.index(kind)
+        in_kind = slice(
+            np.searchsorted(self._keys, kind << 32),
+            np.searchsorted(self._keys, (kind + 1) << 32),
+        )
+        if L is None:
+            L = np.unique(self._keys[in_kind] & 0xFFFFFFFF)
+        selected = []
+        for size in np.atleast_1d(L):
+            key = (kind << 32) | int(size)
+            start = np.searchsorted(self._keys, key)
+            end = np.searchsorted(self._keys, key, side="right")
+            index = self._index[start:end]
+            if latest_batch and len(index):
+                times = np.asarray(self._records["time"][index])
+                index = index[times == times.max()]
+            T = np.asarray(self._records["T"][index])
+            # the latest record of every temperature
+            latest = np.ones(len(T), dtype=bool)
+            latest[:-1] = T[1:] != T[:-1]
+            index, T = index[latest], T[latest]
+            selected.append(
+                index[
+                    np.searchsorted(T, T_min) : np.searchsorted(T, T_max, side="right")
+                ]
+            )
+        records = self._records[np.concatenate([np.zeros(0, dtype=int), *selected])]
+        return {
+            name: np.asarray(records[name]) for name in ["L", "T", "seed", *columns]
+        }
+
+    def latest_time(self, kind, L):
+        """Find when values of a kind of run and lattice size were last appended
+
+        Parameters
+        ----------
+            kind : str
+                The kind of run, one of KINDS
+            L : int
+                The size of the lattice
+
+        Returns
+        -------
+            time : float
+                Seconds since the epoch, or -inf if there are no such values
+        """
+        times = self.query(kind, L, columns=["time"])["time"]
+        return np.max(times) if len(times) else -np.inf
+
+    def sync_outputs(self, outputs=OUTPUTS):
+        """Import the csv-files which are newer than the values in the store
+
+        The runner writes csv-files, which are imported the first time they
+        are queried after having been written.
+
+        Parameters
+        ----------
+            outputs : dict
+                Glob patterns of the csv-files, keyed by the kind of their rows
+
+        Returns
+        -------
+            imported : list of str
+                The imported csv-files
+        """
+        imported = []
+        for kind, pattern in outputs.items():
+            for filename in sorted(glob.glob(pattern)):
+                L = int(re.search(r"L=(\d+)", os.path.basename(filename)).group(1))
+                if os.path.getmtime(filename) > self.latest_time(kind, L):
+                    self.append(pd.read_csv(filename), kind, L)
+                    imported.append(filename)
+        return imported
+
+
+def main():
+    """Import the csv-files in output into the store, and summarize it"""
+    store = ResultStore()
+    for filename in store.sync_outputs():
+        print(f"Imported {filename}")
+    for kind in KINDS:
+        values = store.query(kind, columns=[])
+        for L in np.unique(values["L"]):
+            T = values["T"][values["L"] == L]
+            print(f"{kind} L={L}: {len(T)} temperatures in [{T[0]}, {T[-1]}]")
+
+
+if __name__ == "__main__":
+    main()
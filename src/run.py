@@ -1,54 +1,172 @@
+"""
+Command line interface to the python scripts and some of the c++ files
+
+Every subcommand imports its modules only when it is selected, such that the
+light subcommands do not pay for importing matplotlib, pandas and scipy.
+The time spent importing them is reported with --timing, and --check-startup
+checks that the light subcommands start within STARTUP_BUDGET seconds.
+"""
+
+import time
+
+START = time.perf_counter()
+
 import argparse
-import itertools
-import numpy as np
-from collections import defaultdict
-import plot
-import analytical_ising_model
-import zoom
+import importlib
+import os
+import re
 import subprocess
+import sys
+
+import numpy as np
+
+# modules which the light subcommands must not import
+HEAVY_MODULES = ["matplotlib", "seaborn", "tikzplotlib", "pandas", "scipy"]
+# the light subcommands, and the seconds their cold start may take
+LIGHT_COMMANDS = [
+    ["--help"],
+    ["--states", "--dry-run"],
+    ["--analytical", "--dry-run"],
+    ["--exact", "--dry-run"],
+]
+STARTUP_BUDGET = 0.5
+
+timings = [("python modules of run.py", time.perf_counter() - START)]
+
+
+def load(name):
+    """Import the module of a subcommand, recording the time it took
+
+    Parameters
+    ----------
+        name : str
+            Name of the module
+
+    Returns
+    -------
+        module : module
+            The imported module
+    """
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    timings.append((f"import {name}", time.perf_counter() - start))
+    return module
+
+
+def report_timings():
+    """Print the time spent importing and running, in the order it was spent"""
+    print("Startup-time breakdown:")
+    for what, seconds in timings:
+        print(f"\t{what}: {1000 * seconds:.1f} ms")
+    print(f"\ttotal: {1000 * (time.perf_counter() - START):.1f} ms")
 
 
-def get_all_states(L):
+def check_startup(commands=LIGHT_COMMANDS, budget=STARTUP_BUDGET):
+    """Check that the light subcommands start fast, from a cold python process
+
+    Every command is run in a new python process with -X importtime, and
+    fails if it takes longer than the budget or imports a heavy module.
+
+    Parameters
+    ----------
+        commands : list of list of str
+            The arguments of the light subcommands
+        budget : float
+            The number of seconds every command may take
+
+    Returns
+    -------
+        ok : bool
+            True if every command started within the budget
+    """
+    ok = True
+    for command in commands:
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", __file__, *command],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        seconds = time.perf_counter() - start
+        imported = set(re.findall(r"\|\s*([\w.]+)$", result.stderr, re.MULTILINE))
+        heavy = sorted(
+            module
+            for module in HEAVY_MODULES
+            if any(name == module or name.startswith(module + ".") for name in imported)
+        )
+        passed = result.returncode == 0 and seconds <= budget and not heavy
+        print(
+            f"run.py {' '.join(command)}: {1000 * seconds:.0f} ms "
+            f"(budget {1000 * budget:.0f} ms)"
+            + (f", imports {', '.join(heavy)}" if heavy else "")
+            + ("" if passed else " FAILED")
+        )
+        ok = ok and passed
+    return ok
+
+
+def get_all_states(L, chunk_size=2 ** 16, filename=None):
     """List all possible states of a LxL lattice (equivelant states grouped)
 
+    The states are enumerated in chunks of integer bit patterns, so the
+    memory usage is independent of the number of states. Every chunk is
+    turned into a stack of spin configurations, and the energy and
+    magnetization of the whole stack are found at once. Only the first half
+    of the bit patterns are visited, as flipping every spin leaves the
+    energy unchanged and negates the magnetization.
+
     Parameters
     ----------
         L : int
             Lattice size
+        chunk_size : int
+            Number of states to handle at once
+        filename : str
+            The file to write the state summary to. Defaults to
+            output/state_summary.csv for L=2 and output/state_summary_L={L}.csv
+            otherwise
     """
     N = L ** 2
+    if filename is None:
+        filename = (
+            "output/state_summary.csv" if L == 2 else f"output/state_summary_L={L}.csv"
+        )
 
-    spins = itertools.product([-1, 1], repeat=N)
+    # E(s) is in [-2N, 2N] and M(s) in [-N, N]
+    shape = (4 * N + 1, 2 * N + 1)
+    histogram = np.zeros(shape[0] * shape[1], dtype=np.int64)
+    bits = np.arange(N, dtype=np.int64)
 
-    state_summary = []
+    # the highest bit is kept at zero, the other half is found by symmetry
+    n_states = 2 ** (N - 1)
+    for start in range(0, n_states, chunk_size):
+        patterns = np.arange(start, min(start + chunk_size, n_states), dtype=np.int64)
+        spins = (((patterns[:, None] >> bits) & 1) * 2 - 1).astype(np.int8)
+        spins = spins.reshape(-1, L, L)
 
-    for spin in spins:
-        spin = np.array(spin).reshape(L, L)
+        E_h = np.sum(spins * np.roll(spins, 1, axis=1), axis=(1, 2), dtype=np.int64)
+        E_v = np.sum(spins * np.roll(spins, 1, axis=2), axis=(1, 2), dtype=np.int64)
+        E_s = -(E_h + E_v)
+        M_s = np.sum(spins, axis=(1, 2), dtype=np.int64)
 
-        positive_spins = np.sum(spin == 1)
+        index = (E_s + 2 * N) * shape[1] + (M_s + N)
+        histogram += np.bincount(index, minlength=histogram.size)
 
-        E_h = np.multiply(spin, np.roll(spin, 1, axis=0))
-        E_v = np.multiply(spin, np.roll(spin, 1, axis=1))
-        E_s = -(np.sum(E_h) + np.sum(E_v))
-
-        M_s = np.sum(spin)
-
-        state_summary.append([positive_spins, E_s, M_s])
-
-    # extract the unique states and number of degeneracies
-    unique_states = np.unique(state_summary, axis=0)
-    degeneracies = defaultdict(int)
-    for state in state_summary:
-        degeneracies[str(state)] += 1
+    histogram = histogram.reshape(shape)
+    histogram += histogram[:, ::-1]
 
     # combine degeneracies and unique states
     states = []
-    for state in unique_states:
-        states.append([*state, degeneracies[str(list(state))]])
+    for E_index, M_index in zip(*np.nonzero(histogram)):
+        E_s = E_index - 2 * N
+        M_s = M_index - N
+        positive_spins = (M_s + N) // 2
+        states.append([positive_spins, E_s, M_s, histogram[E_index, M_index]])
 
     # write state summary to csv file with header
     np.savetxt(
-        "output/state_summary.csv",
+        filename,
         sorted(states, reverse=True),
         delimiter=",",
         fmt="%s",
@@ -66,8 +184,10 @@ if __name__ == "__main__":
     parser.add_argument(
         "-s",
         "--states",
-        help="To get information about different states",
-        action="store_true",
+        help="To get information about different states, optionally provide L (default 2)",
+        nargs="?",
+        const=2,
+        type=int,
     )
     parser.add_argument(
         "-p",
@@ -81,18 +201,78 @@ if __name__ == "__main__":
         help="To generate analytical values",
         action="store_true",
     )
+    parser.add_argument(
+        "-ex",
+        "--exact",
+        help="To generate exact values for the lattice sizes used in the simulations",
+        action="store_true",
+    )
     parser.add_argument(
         "-z",
         "--zoom",
         help="Find maximum values and zoom",
         action="store_true",
     )
+    parser.add_argument(
+        "-ad",
+        "--adaptive",
+        help="Find the maximum of C_v and chi with an adaptive search instead of a fixed grid",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-e",
+        "--errors",
+        help="Estimate errors, autocorrelation times and effective sample sizes of the sample files",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-wl",
+        "--wang-landau",
+        help="Estimate the density of states with Wang-Landau sampling, and find the values at every temperature from it, optionally provide L (default 32)",
+        nargs="?",
+        const=32,
+        type=int,
+    )
+    parser.add_argument(
+        "-q",
+        "--queue",
+        help="Scan and zoom like -z, as the coordinator of a work queue in the directory QUEUE on a shared filesystem",
+    )
+    parser.add_argument(
+        "-qw",
+        "--queue-worker",
+        help="Run the shards of the work queue in the directory QUEUE, until the coordinator has finished",
+    )
+    parser.add_argument(
+        "-tm",
+        "--telemetry",
+        help="Summarize the telemetry of the runner per sweep, showing the load imbalance and the pathological temperatures",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-c",
+        "--cluster",
+        help="Use Wolff cluster updates instead of the Metropolis algorithm when zooming or searching",
+        action="store_true",
+    )
     parser.add_argument(
         "-r",
         "--reproduce",
         help="Reproduce the experiment as done in the report, using the same seed",
         action="store_true",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        help="The number of cores to run simulations on (default all)",
+        type=int,
+    )
+    parser.add_argument(
+        "-nc",
+        "--no-cache",
+        help="Always run the simulations, instead of reusing cached results of identical runs",
+        action="store_true",
+    )
     parser.add_argument(
         "-a",
         "--all",
@@ -100,23 +280,102 @@ if __name__ == "__main__":
         action="store_true",
     )
 
+    parser.add_argument(
+        "-ti",
+        "--timing",
+        help="Report the time spent starting up and importing the modules of the selected subcommands",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-cs",
+        "--check-startup",
+        help=f"Check that the light subcommands start within {STARTUP_BUDGET} s, without importing {', '.join(HEAVY_MODULES)}",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-dr",
+        "--dry-run",
+        help="Import the modules of the selected subcommands without running them, to time the startup",
+        action="store_true",
+    )
+
     args = parser.parse_args()
+    timings.append(("parse the arguments", time.perf_counter() - START - timings[0][1]))
+
+    # the modules needed by the selected subcommands
+    needed = {
+        "cache": args.no_cache or args.reproduce,
+        "plot": args.plot or args.all or args.reproduce,
+        "analytical_ising_model": args.analytical or args.all,
+        "exact_ising_model": args.exact or args.all,
+        "zoom": args.zoom or args.all or args.reproduce,
+        "peak_search": args.adaptive,
+        "error_analysis": args.errors or args.all or args.reproduce,
+        "wang_landau": args.wang_landau,
+        "work_queue": args.queue or args.queue_worker,
+        "scheduler": args.reproduce,
+        "telemetry": args.telemetry or args.reproduce,
+    }
+    modules = {name: load(name) for name, selected in needed.items() if selected}
+    # the runner processes started by this invocation form a single sweep
+    os.environ.setdefault("TELEMETRY_SWEEP", f"run.py-{os.getpid()}-{time.time():.3f}")
 
     if not any(vars(args).values()):
         parser.print_help()
+    if args.dry_run:
+        if args.timing:
+            report_timings()
+        sys.exit()
+    if args.no_cache:
+        modules["cache"].enabled = False
     if args.states or args.all:
-        get_all_states(2)
+        get_all_states(args.states or 2)
     if args.plot or args.all:
-        plot.main()
+        modules["plot"].main()
     if args.analytical or args.all:
-        analytical_ising_model.main()
+        modules["analytical_ising_model"].main()
+    if args.exact or args.all:
+        modules["exact_ising_model"].main()
     if args.zoom or args.all:
-        zoom.main()
+        modules["zoom"].main(args.cluster, args.jobs)
+    if args.adaptive:
+        modules["peak_search"].main(args.cluster)
+    if args.errors or args.all:
+        modules["error_analysis"].main()
+    if args.wang_landau:
+        modules["wang_landau"].main(args.wang_landau)
+    if args.queue:
+        modules["work_queue"].coordinate(args.queue, args.cluster)
+    if args.queue_worker:
+        modules["work_queue"].worker(args.queue_worker)
     if args.reproduce:
+        cache, zoom, plot = modules["cache"], modules["zoom"], modules["plot"]
         subprocess.run(["./runner", "-t"])
-        subprocess.run(["./runner", "-b"])
-        subprocess.run(["./runner", "-w", "20", "1.0", "8888"])
-        subprocess.run(["./runner", "-w", "20", "2.4", "8889"])
-        subprocess.run(["./runner", "-s"])
-        zoom.main()
+        scheduler = modules["scheduler"].Scheduler(args.jobs)
+        # 40000 cycles for 4 runs at L=20 and 4 runs at L=100
+        scheduler.add(
+            "burn-in",
+            lambda: cache.run(["-b"], outputs=["output/burn_in_L_*.bin"], echo=True),
+            cost=0.04 * (4 * 20 ** 2 + 4 * 100 ** 2),
+        )
+        for T, seed in [("1.0", 8888), ("2.1", 8890), ("2.4", 8889)]:
+            scheduler.add(
+                f"samples T={T}",
+                lambda T=T, seed=seed: cache.run(
+                    ["-w", 20, T, seed], outputs=[f"output/samples_L=20_T={T}.bin"]
+                ),
+                cost=0.1 * 20 ** 2,
+            )
+        zoom_tasks = zoom.add_scan_and_zoom(scheduler)
+        scheduler.run()
+        zoom.write_peaks([task.result for task in zoom_tasks])
+        modules["error_analysis"].main()
         plot.main()
+        # the runs of this reproduction
+        modules["telemetry"].main(sweep=os.environ["TELEMETRY_SWEEP"])
+    if args.telemetry:
+        modules["telemetry"].main()
+    if args.timing:
+        report_timings()
+    if args.check_startup and not check_startup():
+        sys.exit(1)
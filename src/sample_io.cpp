@@ -0,0 +1,30 @@
+#include "project4/sample_io.hpp"
+
+#include <cstring>
+#include <fstream>
+
+// IMPORTANT NOTE:
+// Documentation is found in the header-file
+
+static_assert(sizeof(sample_io::Header) == 48, "The binary sample header must be 48 bytes");
+
+void sample_io::write_samples(const std::string &filename, const std::vector<int> &sampled_energy,
+                              const std::vector<int> &sampled_magnetization_abs, int L, double T, int seed, int burn_in_time){
+    Header header;
+    std::memcpy(header.magic, "ISINGSMP", 8);
+    header.version = 1;
+    header.L = L;
+    header.T = T;
+    header.seed = seed;
+    header.burn_in_time = burn_in_time;
+    header.cycles = sampled_energy.size();
+
+    std::vector<int32_t> energy(sampled_energy.begin(), sampled_energy.end());
+    std::vector<int32_t> magnetization_abs(sampled_magnetization_abs.begin(), sampled_magnetization_abs.end());
+
+    std::ofstream outfile(filename, std::ios::binary);
+    outfile.write(reinterpret_cast<const char*>(&header), sizeof(header));
+    outfile.write(reinterpret_cast<const char*>(energy.data()), energy.size() * sizeof(int32_t));
+    outfile.write(reinterpret_cast<const char*>(magnetization_abs.data()), magnetization_abs.size() * sizeof(int32_t));
+    outfile.close();
+}
@@ -0,0 +1,140 @@
+"""
+Read the binary sample files written by the runner (see sample_io.hpp)
+
+A sample file starts with a 48 byte header, followed by the sampled energies
+and then the sampled absolute magnetizations, each stored as cycles int32.
+The samples are memory-mapped, so only the parts that are used are read from
+disk, and no text has to be parsed.
+
+Earlier versions of the runner wrote the samples as csv-files instead, which
+are read when there is no binary file, see read_csv_samples.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+MAGIC = b"ISINGSMP"
+VERSION = 1
+
+HEADER_DTYPE = np.dtype(
+    [
+        ("magic", "S8"),
+        ("version", "<u4"),
+        ("L", "<i4"),
+        ("T", "<f8"),
+        ("seed", "<i8"),
+        ("burn_in_time", "<i8"),
+        ("cycles", "<i8"),
+    ]
+)
+
+
+def read_header(filename):
+    """Read the header of a binary sample file
+
+    Parameters
+    ----------
+        filename : str
+            The sample file to read
+
+    Returns
+    -------
+        header : dict
+            L, T, seed, burn_in_time and cycles of the simulation
+    """
+    header = np.fromfile(filename, dtype=HEADER_DTYPE, count=1)
+    assert len(header) == 1, f"{filename} is too short to be a sample file"
+    header = header[0]
+    assert header["magic"] == MAGIC, f"{filename} is not a sample file"
+    assert header["version"] == VERSION, f"Unknown sample file version in {filename}"
+    return {
+        name: header[name].item()
+        for name in ["L", "T", "seed", "burn_in_time", "cycles"]
+    }
+
+
+def read_csv_samples(filename, L, T):
+    """Read a sample file in the csv-format of earlier versions of the runner
+
+    Two formats are read: the samples of epsilon and |M| (the columns
+    epsilon and |m|), and the running averages per spin of the burn-in runs
+    (the columns N, expected_E and expected_M). The samples are recovered
+    from the running averages, which are rounded to six significant digits,
+    so their running averages are exact but every single sample is
+    approximate.
+
+    Parameters
+    ----------
+        filename : str
+            The csv-file to read
+        L : int
+            The size of the lattice, which is not stored in the file
+        T : float
+            The temperature, which is not stored in the file
+
+    Returns
+    -------
+        header : dict
+            L, T, seed, burn_in_time and cycles of the simulation, where the
+            seed and burn_in_time are unknown and set to 0
+        sampled_energy : np.ndarray
+            The sampled energies
+        sampled_magnetization_abs : np.ndarray
+            The sampled absolute magnetizations
+    """
+    df = pd.read_csv(filename)
+    N = L ** 2
+    if "expected_E" in df:
+        # the sum of the first n samples, per spin
+        sums = [
+            df.N.to_numpy() * df[column].to_numpy()
+            for column in ["expected_E", "expected_M"]
+        ]
+        sampled_energy, sampled_magnetization_abs = (
+            N * np.diff(sum, prepend=0) for sum in sums
+        )
+    else:
+        sampled_energy = np.round(N * df.epsilon.to_numpy()).astype(np.int32)
+        sampled_magnetization_abs = df["|m|"].to_numpy(dtype=np.int32)
+    header = {"L": L, "T": T, "seed": 0, "burn_in_time": 0, "cycles": len(df)}
+    return header, sampled_energy, sampled_magnetization_abs
+
+
+def read_samples(filename, L=None, T=None):
+    """Read a binary sample file, with the samples memory-mapped
+
+    If the binary file does not exist, the csv-file with the same name is
+    read with read_csv_samples, which needs L and T.
+
+    Parameters
+    ----------
+        filename : str
+            The sample file to read
+        L : int
+            The size of the lattice, only used for a csv-file
+        T : float
+            The temperature, only used for a csv-file
+
+    Returns
+    -------
+        header : dict
+            L, T, seed, burn_in_time and cycles of the simulation
+        sampled_energy : np.memmap
+            The sampled energies
+        sampled_magnetization_abs : np.memmap
+            The sampled absolute magnetizations
+    """
+    csv_filename = os.path.splitext(filename)[0] + ".csv"
+    if not os.path.exists(filename) and os.path.exists(csv_filename):
+        return read_csv_samples(csv_filename, L, T)
+    header = read_header(filename)
+    samples = np.memmap(
+        filename,
+        dtype="<i4",
+        mode="r",
+        offset=HEADER_DTYPE.itemsize,
+        shape=(2, header["cycles"]),
+    )
+    return header, samples[0], samples[1]
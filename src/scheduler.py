@@ -0,0 +1,137 @@
+"""
+Scheduling of the simulations on the available cores
+
+The simulations form a graph of tasks, for example a scan task for every
+(L, T, seed), and a zoom task for every L which depends on the scan tasks of
+that L (see zoom.add_scan_and_zoom).
+Every task declares an estimated cost and the number of cores it uses.
+Ready tasks are started largest first, as long as they fit within the core
+budget, such that the small lattices fill the cores left idle by the large
+ones. The results are handed to the main thread as the tasks finish, and
+written to the outputs right away.
+
+The simulations run as runner subprocesses, so the tasks are managed by a
+pool of threads which only wait for the subprocesses.
+"""
+
+import heapq
+import itertools
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class Task:
+    def __init__(self, name, function, cost=1, threads=1, dependencies=()):
+        """A unit of work for the Scheduler
+
+        Parameters
+        ----------
+            name : str
+                Name of the task, used when reporting
+            function : callable
+                Function without arguments doing the work. The results of
+                the dependencies are found in their result attribute
+            cost : float
+                Estimated cost, the most costly ready tasks are started first
+            threads : int
+                Number of cores used by the task
+            dependencies : list of Task
+                Tasks which must finish before this task starts
+        """
+        self.name = name
+        self.function = function
+        self.cost = cost
+        self.threads = threads
+        self.dependencies = list(dependencies)
+        self.result = None
+
+
+class Scheduler:
+    def __init__(self, cores=None):
+        """Run tasks in parallel, respecting their dependencies and a core budget
+
+        Parameters
+        ----------
+            cores : int
+                The number of cores to use, by default all of them
+        """
+        self._cores = cores or os.cpu_count()
+        self._tasks = []
+        self._callbacks = {}
+
+    def add(self, name, function, cost=1, threads=1, dependencies=(), on_done=None):
+        """Add a task
+
+        Parameters
+        ----------
+            name : str
+                Name of the task
+            function : callable
+                Function without arguments doing the work
+            cost : float
+                Estimated cost of the task
+            threads : int
+                Number of cores used by the task, at most the core budget
+            dependencies : list of Task
+                Tasks which must finish before this task starts
+            on_done : callable
+                Called in the main thread with the result, as soon as the
+                task has finished
+
+        Returns
+        -------
+            task : Task
+                The added task, to be used as a dependency
+        """
+        task = Task(name, function, cost, min(threads, self._cores), dependencies)
+        self._tasks.append(task)
+        self._callbacks[task] = on_done
+        return task
+
+    def run(self):
+        """Run all the tasks, and wait for them to finish"""
+        waiting_for = {task: set(task.dependencies) for task in self._tasks}
+        dependents = {task: [] for task in self._tasks}
+        for task in self._tasks:
+            for dependency in task.dependencies:
+                dependents[dependency].append(task)
+
+        order = itertools.count()
+        ready = []
+
+        def make_ready(task):
+            heapq.heappush(ready, (-task.cost, next(order), task))
+
+        for task in self._tasks:
+            if not waiting_for[task]:
+                make_ready(task)
+
+        running = {}
+        used_cores = 0
+        with ThreadPoolExecutor(max_workers=self._cores) as executor:
+            while ready or running:
+                # start the largest ready tasks that fit, and let smaller
+                # tasks fill the remaining cores
+                skipped = []
+                while ready:
+                    item = heapq.heappop(ready)
+                    task = item[-1]
+                    if used_cores + task.threads <= self._cores:
+                        running[executor.submit(task.function)] = task
+                        used_cores += task.threads
+                    else:
+                        skipped.append(item)
+                for item in skipped:
+                    heapq.heappush(ready, item)
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    used_cores -= task.threads
+                    task.result = future.result()
+                    if self._callbacks[task] is not None:
+                        self._callbacks[task](task.result)
+                    for dependent in dependents[task]:
+                        waiting_for[dependent].discard(task)
+                        if not waiting_for[dependent]:
+                            make_ready(dependent)
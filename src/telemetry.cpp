@@ -0,0 +1,93 @@
+#include "project4/telemetry.hpp"
+
+#include <cctype>
+#include <cstdlib>
+#include <fcntl.h>
+#include <iomanip>
+#include <omp.h>
+#include <sstream>
+#include <sys/resource.h>
+#include <unistd.h>
+
+// IMPORTANT NOTE:
+// Documentation is found in the header-file
+
+std::string telemetry::filename = "output/telemetry.jsonl";
+
+namespace{
+    // when the process started, in seconds since the epoch
+    const double process_start = std::chrono::duration<double>(std::chrono::system_clock::now().time_since_epoch()).count();
+}
+
+telemetry::Stopwatch::Stopwatch(){
+    last = std::chrono::steady_clock::now();
+    std::chrono::duration<double> since_epoch = std::chrono::system_clock::now().time_since_epoch();
+    started = since_epoch.count();
+}
+
+double telemetry::Stopwatch::lap(){
+    auto now = std::chrono::steady_clock::now();
+    std::chrono::duration<double> diff = now - last;
+    last = now;
+    return diff.count();
+}
+
+double telemetry::Stopwatch::start_time(){
+    return started;
+}
+
+std::string telemetry::sweep(){
+    const char *id = std::getenv("TELEMETRY_SWEEP");
+    if (id != nullptr and *id){
+        // written into the json as is, so only these characters are kept
+        std::string safe(id);
+        for (char &character : safe){
+            if (!isalnum((unsigned char) character) and character != '.' and character != '_' and character != '-') character = '_';
+        }
+        return safe;
+    }
+    std::ostringstream default_id;
+    default_id << getpid() << "-" << std::fixed << std::setprecision(3) << process_start;
+    return default_id.str();
+}
+
+long telemetry::max_rss_kb(){
+    struct rusage usage;
+    getrusage(RUSAGE_SELF, &usage);
+    // kilobytes on linux
+    return usage.ru_maxrss;
+}
+
+std::string telemetry::to_json(const Run &run){
+    double seconds = run.burn_in_seconds + run.measure_seconds;
+    long long sweeps = run.burn_in_sweeps + run.measure_sweeps;
+    std::ostringstream json;
+    json.precision(10);
+    json << "{\"L\": " << run.L << ", \"T\": " << run.T << ", \"seed\": " << run.seed << ", \"stream\": " << run.stream
+         << ", \"engine\": \"" << run.engine << "\", \"sweep\": \"" << sweep() << "\", \"pid\": " << getpid() << ", \"thread\": " << omp_get_thread_num()
+         << ", \"threads\": " << omp_get_num_threads()
+         << ", \"start_time\": " << std::fixed << std::setprecision(3) << run.start_time << std::defaultfloat << std::setprecision(10)
+         << ", \"burn_in_time\": " << run.burn_in_time << ", \"samples\": " << run.samples
+         << ", \"resumed\": " << (run.resumed ? "true" : "false")
+         << ", \"burn_in_seconds\": " << run.burn_in_seconds << ", \"measure_seconds\": " << run.measure_seconds
+         << ", \"burn_in_sweeps\": " << run.burn_in_sweeps << ", \"measure_sweeps\": " << run.measure_sweeps
+         << ", \"sweeps_per_second\": " << (seconds > 0 ? sweeps / seconds : 0)
+         << ", \"acceptance_rate\": ";
+    if (run.attempted_flips > 0) json << (double) run.accepted_flips / run.attempted_flips;
+    else json << "null";
+    json << ", \"mean_cluster_size\": ";
+    if (run.mean_cluster_size > 0) json << run.mean_cluster_size;
+    else json << "null";
+    json << ", \"max_rss_kb\": " << max_rss_kb() << "}";
+    return json.str();
+}
+
+void telemetry::write(const Run &run){
+    if (filename.empty()) return;
+    std::string line = to_json(run) + "\n";
+    int fd = open(filename.c_str(), O_WRONLY | O_APPEND | O_CREAT, 0644);
+    if (fd < 0) return;
+    ssize_t written = ::write(fd, line.data(), line.size());
+    (void) written;
+    close(fd);
+}
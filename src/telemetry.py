@@ -0,0 +1,190 @@
+"""
+Summarize the telemetry written by the runner (see telemetry.hpp)
+
+Every (L, T) run appends one json line to output/telemetry.jsonl, with the
+wall time of the burn-in and of the measurement, the sweeps per second, the
+acceptance rate of the Metropolis algorithm (or the mean Wolff cluster size),
+the memory high-water mark of the process, the OpenMP thread and process
+that ran it, and the sweep it belongs to. A sweep is a single invocation of
+the runner, or of run.py, which sets TELEMETRY_SWEEP for the runner
+processes it starts.
+
+The runs are summarized per sweep, lattice size and engine:
+
+    - the load of every worker (a thread of a runner process), and the load
+      imbalance, the busiest worker relative to the average worker. An
+      imbalance well above 1 means that the cores idled while waiting for
+      the slowest temperatures
+    - the temperatures which are pathological, where a run took much longer
+      than the median run of the sweep, or needed a long burn-in
+"""
+
+import argparse
+import json
+import os
+import time
+
+import pandas as pd
+
+TELEMETRY = "output/telemetry.jsonl"
+
+
+def read_telemetry(filename=TELEMETRY, since=None, sweep=None):
+    """Read the runs of a telemetry file
+
+    Parameters
+    ----------
+        filename : str
+            The telemetry file
+        since : float
+            Only read runs started at this time or later, in seconds since
+            the epoch. By default all the runs are read
+        sweep : str
+            Only read the runs of this sweep
+
+    Returns
+    -------
+        runs : pd.DataFrame
+            One row per run, with a column per field, and the total wall time
+            in "seconds". Empty if the file does not exist
+    """
+    if not os.path.exists(filename):
+        return pd.DataFrame()
+    with open(filename) as infile:
+        runs = pd.DataFrame([json.loads(line) for line in infile if line.strip()])
+    if len(runs) == 0:
+        return runs
+    # runs written before the sweep was recorded form a sweep per process
+    pid = runs.pid.astype(str)
+    runs = runs.assign(sweep=runs.sweep.fillna(pid) if "sweep" in runs else pid)
+    if since is not None:
+        runs = runs[runs.start_time >= since]
+    if sweep is not None:
+        runs = runs[runs.sweep == sweep]
+    runs = runs.assign(seconds=runs.burn_in_seconds + runs.measure_seconds)
+    return runs.reset_index(drop=True)
+
+
+def summarize(runs, slow_factor=2, burn_in_fraction=0.05):
+    """Summarize the runs of every sweep, and find the pathological temperatures
+
+    Parameters
+    ----------
+        runs : pd.DataFrame
+            The runs, see read_telemetry
+        slow_factor : float
+            A run is slow if it took more than slow_factor times the median
+            run of its sweep
+        burn_in_fraction : float
+            A run has a long burn-in if more than this fraction of its
+            iterations were discarded
+
+    Returns
+    -------
+        sweeps : pd.DataFrame
+            One row per (sweep, L, engine), with the number of runs and workers, the
+            total and wall time, the sweeps per second, the range of the
+            acceptance rate, the load imbalance and the memory high-water mark
+        pathological : pd.DataFrame
+            The slow runs and the runs with a long burn-in, with the reason
+    """
+    sweeps = []
+    pathological = []
+    for (sweep_id, L, engine), sweep in runs.groupby(["sweep", "L", "engine"]):
+        load = sweep.groupby(["pid", "thread"]).seconds.sum()
+        span = (sweep.start_time + sweep.seconds).max() - sweep.start_time.min()
+        sweeps.append(
+            {
+                "sweep": sweep_id,
+                "L": L,
+                "engine": engine,
+                "runs": len(sweep),
+                "workers": len(load),
+                "seconds": sweep.seconds.sum(),
+                "wall_seconds": span,
+                "burn_in_share": sweep.burn_in_seconds.sum() / sweep.seconds.sum(),
+                "sweeps_per_second": (sweep.burn_in_sweeps + sweep.measure_sweeps).sum()
+                / sweep.seconds.sum(),
+                "min_acceptance_rate": sweep.acceptance_rate.min(),
+                "max_acceptance_rate": sweep.acceptance_rate.max(),
+                "imbalance": load.max() / load.mean(),
+                "max_rss_kb": sweep.max_rss_kb.max(),
+            }
+        )
+
+        median = sweep.seconds.median()
+        iterations = sweep.burn_in_sweeps + sweep.measure_sweeps
+        for index, run in sweep.iterrows():
+            reasons = []
+            if run.seconds > slow_factor * median:
+                reasons.append(f"{run.seconds / median:.1f} times the median time")
+            if (
+                not run.resumed
+                and run.burn_in_time > burn_in_fraction * iterations[index]
+            ):
+                reasons.append(f"burn-in of {run.burn_in_time} iterations")
+            if reasons:
+                pathological.append(
+                    {
+                        "sweep": sweep_id,
+                        "L": L,
+                        "engine": engine,
+                        "T": run["T"],
+                        "seconds": run.seconds,
+                        "reason": ", ".join(reasons),
+                    }
+                )
+    return pd.DataFrame(sweeps), pd.DataFrame(
+        pathological, columns=["sweep", "L", "engine", "T", "seconds", "reason"]
+    )
+
+
+def main(filename=TELEMETRY, since=None, sweep=None):
+    """Print the summary of the telemetry
+
+    Parameters
+    ----------
+        filename : str
+            The telemetry file
+        since : float
+            Only summarize the runs of the last since hours, by default all
+        sweep : str
+            Only summarize the runs of this sweep, by default all
+    """
+    runs = read_telemetry(
+        filename, None if since is None else time.time() - 3600 * since, sweep
+    )
+    if len(runs) == 0:
+        print(f"No runs in {filename}")
+        return
+    sweeps, pathological = summarize(runs)
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(f"{len(runs)} runs in {filename}, per sweep:")
+        print(sweeps.to_string(index=False, float_format=lambda x: f"{x:.4g}"))
+        imbalanced = sweeps[sweeps.imbalance > 1.25]
+        for _, sweep in imbalanced.iterrows():
+            print(
+                f"{sweep.sweep} L={sweep.L} ({sweep.engine}): the busiest of {sweep.workers} workers "
+                f"had {sweep.imbalance:.2f} times the average load"
+            )
+        if len(pathological):
+            print("Pathological temperatures:")
+            print(
+                pathological.to_string(index=False, float_format=lambda x: f"{x:.4g}")
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Summarize the telemetry of the runner"
+    )
+    parser.add_argument("filename", nargs="?", default=TELEMETRY)
+    parser.add_argument(
+        "-s",
+        "--since",
+        help="Only summarize the runs of the last SINCE hours",
+        type=float,
+    )
+    parser.add_argument("-w", "--sweep", help="Only summarize the runs of SWEEP")
+    args = parser.parse_args()
+    main(args.filename, args.since, args.sweep)
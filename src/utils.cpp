@@ -2,6 +2,8 @@
 #include <vector>
 #include <map>
 #include <fstream>
+#include <iomanip>
+#include <limits>
 #include "project4/stat_utils.hpp"
 
 double I(float x){return x;}
@@ -26,7 +28,7 @@ double stat_utils::expected_value(std::map<double, double> p){
     return expected_value(p, I);
 }
 
-double stat_utils::expected_value(std::vector<int> samples, int N, std::function<double(int)> f){
+double stat_utils::expected_value(const std::vector<int> &samples, int N, std::function<double(int)> f){
     double sum = 0;
     for (int i = 0; i < N; i++){
         sum += f(samples[i]);
@@ -34,11 +36,11 @@ double stat_utils::expected_value(std::vector<int> samples, int N, std::function
     return sum / N;
 }
 
-double stat_utils::expected_value(std::vector<int> samples, int N){
+double stat_utils::expected_value(const std::vector<int> &samples, int N){
     return expected_value(samples, N, I);
 }
 
-std::map<double, double> stat_utils::distribution(std::vector<int> samples, int N, std::function<double(int)> f){
+std::map<double, double> stat_utils::distribution(const std::vector<int> &samples, int N, std::function<double(int)> f){
     std::map<double, double> buckets;
     for (int i = 0; i < N; i++){
         float sample = f(samples[i]);
@@ -48,6 +50,117 @@ std::map<double, double> stat_utils::distribution(std::vector<int> samples, int
     return buckets;
 }
 
-std::map<double, double> stat_utils::distribution(std::vector<int> samples, int N){
+std::map<double, double> stat_utils::distribution(const std::vector<int> &samples, int N){
     return distribution(samples, N, I);
-}
\ No newline at end of file
+}
+
+int stat_utils::mser(const std::vector<int> &samples, int batch_size, double max_fraction){
+    int batches = samples.size() / batch_size;
+    if (batches < 2) return 0;
+    std::vector<double> batch_means(batches, 0.);
+    for (int j = 0; j < batches; j++){
+        for (int k = 0; k < batch_size; k++){
+            batch_means[j] += samples[j * batch_size + k];
+        }
+        batch_means[j] /= batch_size;
+    }
+    // suffix sums of the batch means and of their squares
+    double sum = 0, sum_sq = 0;
+    double best = -1;
+    int best_d = 0;
+    int max_d = (int) (max_fraction * batches);
+    for (int d = batches - 1; d >= 0; d--){
+        sum += batch_means[d];
+        sum_sq += batch_means[d] * batch_means[d];
+        if (d > max_d) continue;
+        double remaining = batches - d;
+        double statistic = (sum_sq - sum * sum / remaining) / (remaining * remaining);
+        if (best < 0 or statistic <= best){
+            best = statistic;
+            best_d = d;
+        }
+    }
+    return best_d * batch_size;
+}
+
+void stat_utils::Welford::add(double x){
+    n++;
+    double delta = x - mu;
+    mu += delta / n;
+    m2 += delta * (x - mu);
+}
+
+long long stat_utils::Welford::count() const{
+    return n;
+}
+
+double stat_utils::Welford::mean() const{
+    return mu;
+}
+
+double stat_utils::Welford::variance() const{
+    return n > 0 ? m2 / n : 0.;
+}
+
+void stat_utils::Welford::save(std::ostream &out) const{
+    out << std::setprecision(std::numeric_limits<double>::max_digits10) << n << " " << mu << " " << m2 << "\n";
+}
+
+void stat_utils::Welford::load(std::istream &in){
+    in >> n >> mu >> m2;
+}
+
+void stat_utils::KahanSum::add(double x){
+    double y = x - compensation;
+    double t = total + y;
+    compensation = (t - total) - y;
+    total = t;
+}
+
+double stat_utils::KahanSum::sum() const{
+    return total;
+}
+
+void stat_utils::KahanSum::save(std::ostream &out) const{
+    out << std::setprecision(std::numeric_limits<double>::max_digits10) << total << " " << compensation << "\n";
+}
+
+void stat_utils::KahanSum::load(std::istream &in){
+    in >> total >> compensation;
+}
+
+void stat_utils::Moments::add(int E, int M_abs){
+    energy.add(E);
+    magnetization_abs.add(M_abs);
+    double M_sq = (double) M_abs * M_abs;
+    magnetization_4.add(M_sq * M_sq);
+}
+
+long long stat_utils::Moments::count() const{
+    return energy.count();
+}
+
+void stat_utils::Moments::values(int L, double T, double &expected_epsilon, double &expected_m_abs, double &c_v, double &chi) const{
+    int N = L * L;
+    expected_epsilon = energy.mean() / N;
+    expected_m_abs = magnetization_abs.mean() / N;
+    c_v = (1. / N) * (1. / (T * T)) * energy.variance();
+    chi = (1. / N) * (1. / T) * magnetization_abs.variance();
+}
+
+double stat_utils::Moments::binder_cumulant() const{
+    double expected_M_sq = magnetization_abs.variance() + magnetization_abs.mean() * magnetization_abs.mean();
+    return 1 - magnetization_4.sum() / count() / (3 * expected_M_sq * expected_M_sq);
+}
+
+void stat_utils::Moments::save(std::ostream &out) const{
+    energy.save(out);
+    magnetization_abs.save(out);
+    magnetization_4.save(out);
+}
+
+void stat_utils::Moments::load(std::istream &in){
+    energy.load(in);
+    magnetization_abs.load(in);
+    magnetization_4.load(in);
+}
@@ -0,0 +1,114 @@
+#include "project4/wang_landau.hpp"
+
+#include <algorithm>
+#include <cmath>
+#include <fstream>
+#include <iostream>
+#include <limits>
+
+// IMPORTANT NOTE:
+// Documentation is found in the header-file
+
+WangLandau::WangLandau(int lattice_length, int seed){
+    L = lattice_length;
+    N = L * L;
+    rng = mt19937(seed);
+    rand_site = uniform_int_distribution<int>(0, N - 1);
+    uniform = uniform_real_distribution<double>(0, 1);
+    spins = vector<int>(N, 1);
+    E = -2 * N;
+    M = N;
+    log_f = 1;
+    steps = 0;
+    visited_levels = 0;
+    // E is in [-2N, 2N] in steps of 4
+    log_g = vector<double>(N + 1, 0);
+    histogram = vector<long long>(N + 1, 0);
+    visited = vector<bool>(N + 1, false);
+    samples = vector<long long>(N + 1, 0);
+    sum_M_abs = vector<double>(N + 1, 0);
+    sum_M_squared = vector<double>(N + 1, 0);
+}
+
+int WangLandau::level(int energy){
+    return (energy + 2 * N) / 4;
+}
+
+void WangLandau::step(bool accumulate){
+    int site = rand_site(rng);
+    int i = site / L, j = site % L;
+    int neighbours = spins[((i + 1) % L) * L + j] + spins[((i - 1 + L) % L) * L + j]
+                   + spins[i * L + (j + 1) % L] + spins[i * L + (j - 1 + L) % L];
+    int new_E = E + 2 * spins[site] * neighbours;
+    double log_ratio = log_g[level(E)] - log_g[level(new_E)];
+    if (log_ratio >= 0 or uniform(rng) < exp(log_ratio)){
+        M -= 2 * spins[site];
+        spins[site] *= -1;
+        E = new_E;
+    }
+    int k = level(E);
+    log_g[k] += log_f;
+    histogram[k]++;
+    if (!visited[k]){
+        // A new energy was found, so the other energies have to be visited again
+        visited[k] = true;
+        visited_levels++;
+        fill(histogram.begin(), histogram.end(), 0);
+    }
+    if (accumulate){
+        samples[k]++;
+        sum_M_abs[k] += abs(M);
+        sum_M_squared[k] += (double) M * M;
+    }
+    steps++;
+}
+
+bool WangLandau::all_visited(){
+    for (int k = 0; k <= N; k++){
+        if (visited[k] and histogram[k] == 0) return false;
+    }
+    return true;
+}
+
+void WangLandau::run(double log_f_final){
+    double log_f_accumulate = sqrt(log_f_final);
+    // Halve ln f whenever every energy has been visited, checked once per sweep
+    while (log_f * steps >= visited_levels and log_f > log_f_final){
+        for (int i = 0; i < N; i++) step(log_f <= log_f_accumulate);
+        if (all_visited()){
+            log_f /= 2;
+            fill(histogram.begin(), histogram.end(), 0);
+        }
+    }
+    cout << "Wang-Landau: " << visited_levels << " energies visited, switching to ln f = 1/t after "
+         << steps / N << " sweeps" << endl;
+    // ln f = 1/t, with t the number of attempted flips per energy
+    while (log_f > log_f_final){
+        for (int i = 0; i < N; i++) step(log_f <= log_f_accumulate);
+        log_f = (double) visited_levels / steps;
+    }
+    cout << "Wang-Landau: ln f = " << log_f << " after " << steps / N << " sweeps" << endl;
+}
+
+void WangLandau::write(string filename){
+    // Normalize with log-sum-exp, such that the sum of g(E) is 2^N
+    double shift = -numeric_limits<double>::infinity();
+    for (int k = 0; k <= N; k++){
+        if (visited[k]) shift = max(shift, log_g[k]);
+    }
+    double sum = 0;
+    for (int k = 0; k <= N; k++){
+        if (visited[k]) sum += exp(log_g[k] - shift);
+    }
+    double log_norm = shift + log(sum) - N * log(2.);
+
+    ofstream outfile(filename);
+    outfile.precision(numeric_limits<double>::max_digits10);
+    outfile << "E(s),ln g(E),<|M(s)|>,<M(s)^2>" << endl;
+    for (int k = 0; k <= N; k++){
+        if (!visited[k]) continue;
+        long long n = max(samples[k], 1LL);
+        outfile << 4 * k - 2 * N << "," << log_g[k] - log_norm << "," << sum_M_abs[k] / n << "," << sum_M_squared[k] / n << endl;
+    }
+    outfile.close();
+}
@@ -0,0 +1,74 @@
+"""
+Thermodynamics at every temperature from a single Wang-Landau run
+
+The runner (./runner -d) estimates ln g(E) with Wang-Landau sampling,
+together with the microcanonical averages of |M| and M^2 at every energy.
+NumericalIsingModel turns these into <epsilon>, <|m|>, C_v, chi and the free
+energy at any temperature, instead of one Metropolis run per temperature.
+"""
+
+import numpy as np
+
+import cache
+from analytical_ising_model import NumericalIsingModel
+
+
+def density_of_states(L, seed=2718, log_f_final=1e-6):
+    """Estimate the density of states of a LxL lattice with ./runner -d
+
+    Parameters
+    ----------
+        L : int
+            The size of the lattice
+        seed : int
+            Seed for RNG
+        log_f_final : float
+            The final ln f of the Wang-Landau sampling, the error of ln g(E)
+            is of order sqrt(log_f_final)
+
+    Returns
+    -------
+        filename : str
+            The file with the density of states, readable by
+            NumericalIsingModel
+    """
+    filename = f"output/density_of_states_L={L}.csv"
+    result = cache.run(
+        ["-d", L, seed, repr(float(log_f_final))], outputs=[filename], echo=True
+    )
+    result.check_returncode()
+    return filename
+
+
+def main(L=32, seed=2718):
+    """Write the values for T in [1, 4] from the density of states of a LxL lattice
+
+    Parameters
+    ----------
+        L : int
+            The size of the lattice
+        seed : int
+            Seed for RNG
+    """
+    T = np.linspace(1, 4, 301)
+    numerical_ising_model = NumericalIsingModel(density_of_states(L, seed), T, L)
+    np.savetxt(
+        f"output/values_wang_landau_L={L}.csv",
+        np.column_stack(
+            [
+                T,
+                numerical_ising_model.expected_epsilon,
+                numerical_ising_model.expected_abs_m,
+                numerical_ising_model.C_v,
+                numerical_ising_model.chi,
+                numerical_ising_model.free_energy_per_spin,
+            ]
+        ),
+        delimiter=",",
+        header="T,<epsilon>,<|m|>,C_v,chi,f",
+        comments="",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,524 @@
+"""
+Run the scan and zoom on several nodes, through a work queue on a shared filesystem
+
+The coordinator splits the (L, T, seed) grid of the scan into shards, and
+publishes every shard as a file in the queue directory:
+
+    <queue>/pending/<shard>.json            waiting for a worker
+    <queue>/claimed/<shard>@<worker>.json   claimed by a worker
+    <queue>/done/<shard>.json               the result of the shard
+    <queue>/failed/<shard>.json             the error, if the shard failed
+
+Every shard is named after a hash of its content, such that a restarted
+coordinator reuses the results of its earlier run, but never those of a run
+with other parameters, like another grid of temperatures or engine.
+
+A worker claims a shard by renaming it from pending to claimed, which only
+one worker can do. The claimed file is named after the worker, so a worker
+only ever renews or removes its own claim. While running the shard, the
+worker renews its lease by touching the claimed file. The coordinator moves shards whose lease has not
+been renewed within the timeout back to pending, such that the shards of a
+dead worker are run by another. The results do not depend on which worker
+runs a shard (see philox.hpp), so a shard which is run twice gives the same
+result twice. A restarted coordinator runs the failed shards again.
+
+Once the scan has finished, the coordinator merges the results into
+output/values_L=<L>.csv and the result store, and publishes a zoom shard for every L. The
+samples and values of the zoom are written by the workers, so the output
+directory has to be on the shared filesystem as well.
+
+To test locally, start a coordinator with a few local worker processes:
+
+    python src/work_queue.py coordinator .queue --local-workers 4
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import traceback
+
+import numpy as np
+import pandas as pd
+
+import peak_search
+import result_store
+import zoom
+
+TIMEOUT = 120
+POLL_INTERVAL = 5
+STATES = ["pending", "claimed", "done", "failed"]
+# names the claims of this process
+WORKER = f"{socket.gethostname()}.{os.getpid()}"
+
+
+def _path(queue, state, name):
+    """Find the file of a shard in one of the states"""
+    return os.path.join(queue, state, name + ".json")
+
+
+def _write_json(filename, content):
+    """Write a json file atomically, such that readers never see a partly written file"""
+    directory, name = os.path.split(filename)
+    temporary = os.path.join(directory, f".{name}.{os.getpid()}.tmp")
+    with open(temporary, "w") as outfile:
+        json.dump(content, outfile)
+    os.replace(temporary, filename)
+
+
+def _read_json(filename):
+    """Read a json file, or None if it has been moved in the meantime"""
+    try:
+        with open(filename) as infile:
+            return json.load(infile)
+    except FileNotFoundError:
+        return None
+
+
+def _claim(name, worker=WORKER):
+    """Name the claimed file of a shard, for a worker"""
+    return f"{name}@{worker}"
+
+
+def _shard_name(prefix, shard):
+    """Name a shard after a readable prefix and a hash of its content"""
+    digest = hashlib.sha256(json.dumps(shard, sort_keys=True).encode()).hexdigest()
+    return f"{prefix}_{digest[:12]}"
+
+
+def _names(queue, state):
+    """List the names of the shards in a state, leaving out temporary files"""
+    return sorted(
+        filename[: -len(".json")]
+        for filename in os.listdir(os.path.join(queue, state))
+        if filename.endswith(".json") and not filename.startswith(".")
+    )
+
+
+def filesystem_time(queue):
+    """Get the current time of the shared filesystem
+
+    Leases are compared with the modification times set by the
+    filesystem, so the clocks of the nodes do not have to agree.
+
+    Parameters
+    ----------
+        queue : str
+            The queue directory
+
+    Returns
+    -------
+        now : float
+            The current time, as a modification time
+    """
+    clock = os.path.join(queue, "clock")
+    with open(clock, "a"):
+        pass
+    os.utime(clock)
+    return os.stat(clock).st_mtime
+
+
+def create(queue):
+    """Create the directories of a queue, keeping the shards of an earlier run
+
+    The failed shards are removed, such that they are published again.
+
+    Parameters
+    ----------
+        queue : str
+            The queue directory
+    """
+    for state in STATES:
+        os.makedirs(os.path.join(queue, state), exist_ok=True)
+    for name in _names(queue, "failed"):
+        print(f"Retrying {name}, which failed in an earlier run")
+        os.remove(_path(queue, "failed", name))
+    if os.path.exists(os.path.join(queue, "stop")):
+        os.remove(os.path.join(queue, "stop"))
+
+
+def publish(queue, name, shard):
+    """Publish a shard, unless it has already been published or finished
+
+    Parameters
+    ----------
+        queue : str
+            The queue directory
+        name : str
+            Name of the shard, unique within the queue
+        shard : dict
+            The work, see run_shard. The key "cost" orders the shards,
+            the most costly are claimed first
+    """
+    if any(
+        os.path.exists(_path(queue, state, name))
+        for state in ["pending", "done", "failed"]
+    ) or any(claim.split("@")[0] == name for claim in _names(queue, "claimed")):
+        return
+    _write_json(_path(queue, "pending", name), shard)
+
+
+def claim(queue):
+    """Claim the most costly pending shard
+
+    Parameters
+    ----------
+        queue : str
+            The queue directory
+
+    Returns
+    -------
+        name, shard : str, dict
+            The claimed shard, or (None, None) if no shard is pending
+    """
+    pending = []
+    for name in _names(queue, "pending"):
+        shard = _read_json(_path(queue, "pending", name))
+        if shard is not None:
+            pending.append((-shard.get("cost", 0), name, shard))
+    for _, name, shard in sorted(pending, key=lambda item: item[:2]):
+        try:
+            # the rename keeps the modification time, so the lease starts
+            # before the shard is claimed, and is never expired when claimed
+            os.utime(_path(queue, "pending", name))
+            os.rename(
+                _path(queue, "pending", name), _path(queue, "claimed", _claim(name))
+            )
+        except FileNotFoundError:
+            # another worker claimed it first
+            continue
+        return name, shard
+    return None, None
+
+
+def reclaim(queue, timeout=TIMEOUT):
+    """Move the claimed shards with an expired lease back to pending
+
+    Parameters
+    ----------
+        queue : str
+            The queue directory
+        timeout : float
+            Number of seconds a lease is valid without being renewed
+
+    Returns
+    -------
+        names : list of str
+            The reclaimed shards
+    """
+    now = filesystem_time(queue)
+    reclaimed = []
+    for claim in _names(queue, "claimed"):
+        name = claim.split("@")[0]
+        try:
+            if now - os.stat(_path(queue, "claimed", claim)).st_mtime <= timeout:
+                continue
+            os.rename(_path(queue, "claimed", claim), _path(queue, "pending", name))
+            reclaimed.append(name)
+        except FileNotFoundError:
+            # finished in the meantime
+            continue
+    return reclaimed
+
+
+class Lease:
+    def __init__(self, queue, name, timeout=TIMEOUT):
+        """Renew the lease of a claimed shard in the background, while it runs
+
+        Parameters
+        ----------
+            queue : str
+                The queue directory
+            name : str
+                The claimed shard
+            timeout : float
+                Number of seconds a lease is valid, the lease is renewed
+                four times as often
+        """
+        self._filename = _path(queue, "claimed", _claim(name))
+        self._interval = timeout / 4
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._renew, daemon=True)
+
+    def _renew(self):
+        """Touch the claimed file until stopped, or until the shard is reclaimed"""
+        while not self._stop.wait(self._interval):
+            try:
+                os.utime(self._filename)
+            except FileNotFoundError:
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_shard(shard):
+    """Run the work of a shard
+
+    Parameters
+    ----------
+        shard : dict
+            A scan shard, with the keys "L", "tasks" (a list of [T, seed])
+            and "cluster", or a zoom shard, with the keys "L", "T_min",
+            "T_max", "seed" and "cluster"
+
+    Returns
+    -------
+        result : list
+            The values of every task of a scan shard, or the peak found by a
+            zoom shard, see zoom.zoom_in
+    """
+    if shard["stage"] == "scan":
+        return [
+            peak_search.simulate(shard["L"], T, seed, shard["cluster"], checkpoint=True)
+            for T, seed in shard["tasks"]
+        ]
+    return zoom.zoom_in(
+        shard["L"], shard["T_min"], shard["T_max"], shard["seed"], shard["cluster"]
+    )
+
+
+def worker(queue, timeout=TIMEOUT, poll_interval=POLL_INTERVAL):
+    """Claim and run shards, until the coordinator has finished
+
+    Parameters
+    ----------
+        queue : str
+            The queue directory
+        timeout : float
+            Number of seconds a lease is valid without being renewed
+        poll_interval : float
+            Number of seconds to wait when no shard is pending
+    """
+    while not os.path.exists(os.path.join(queue, "stop")):
+        name, shard = claim(queue)
+        if name is None:
+            time.sleep(poll_interval)
+            continue
+        try:
+            with Lease(queue, name, timeout):
+                result = run_shard(shard)
+        except Exception:
+            _write_json(_path(queue, "failed", name), traceback.format_exc())
+        else:
+            _write_json(_path(queue, "done", name), result)
+        try:
+            os.remove(_path(queue, "claimed", _claim(name)))
+        except FileNotFoundError:
+            # reclaimed while running, the other run gives the same result
+            pass
+
+
+def run_stage(queue, shards, timeout=TIMEOUT, poll_interval=POLL_INTERVAL):
+    """Publish shards, and wait for the workers to finish them
+
+    Shards which were finished by an earlier run of the coordinator are not
+    run again.
+
+    Parameters
+    ----------
+        queue : str
+            The queue directory
+        shards : dict
+            The shards, keyed by name
+        timeout : float
+            Number of seconds a lease is valid without being renewed
+        poll_interval : float
+            Number of seconds between each check of the queue
+
+    Returns
+    -------
+        results : dict
+            The results of the shards, keyed by name
+    """
+    for name, shard in shards.items():
+        publish(queue, name, shard)
+    remaining = set(shards)
+    results = {}
+    while remaining:
+        failed = [
+            name for name in remaining if os.path.exists(_path(queue, "failed", name))
+        ]
+        if failed:
+            raise RuntimeError(
+                f"The shards {', '.join(sorted(failed))} failed, see {queue}/failed"
+            )
+        for name in reclaim(queue, timeout):
+            print(f"The lease of {name} expired, the shard is pending again")
+        for name in sorted(remaining):
+            result = _read_json(_path(queue, "done", name))
+            if result is not None:
+                results[name] = result
+                remaining.discard(name)
+        if remaining:
+            time.sleep(poll_interval)
+    return results
+
+
+def write_values(rows, filename):
+    """Write scanned values sorted by temperature
+
+    Parameters
+    ----------
+        rows : list of dict
+            The values returned by peak_search.simulate
+        filename : str
+            The csv-file to write to
+    """
+    columns = ["T", "<epsilon>", "<|m|>", "C_v", "chi"]
+    df = pd.DataFrame(rows)[columns].sort_values("T")
+    df.to_csv(filename, index=False)
+
+
+def coordinate(
+    queue,
+    cluster=False,
+    L_values=range(20, 160, 20),
+    T_min=2.1,
+    T_max=2.4,
+    steps=24,
+    shard_size=4,
+    scan_seed=456788,
+    zoom_seed=9642,
+    timeout=TIMEOUT,
+    poll_interval=POLL_INTERVAL,
+):
+    """Scan and zoom in for every lattice size, on the workers of a queue
+
+    The seeds are given like in zoom.add_scan_and_zoom, so the results
+    are the same as when running on a single node.
+
+    Parameters
+    ----------
+        queue : str
+            The queue directory
+        cluster : bool
+            If True, the runner uses Wolff cluster updates
+        L_values : list of int
+            The lattice sizes
+        T_min : float
+            The minimum temperature of the scan
+        T_max : float
+            The maximum temperature of the scan (non inclusive)
+        steps : int
+            The number of temperatures of the scan
+        shard_size : int
+            The number of temperatures in every scan shard
+        scan_seed : int
+            Seed of the first scan task, incremented for every task
+        zoom_seed : int
+            Seed of the first zoom, incremented for every lattice size
+        timeout : float
+            Number of seconds a lease is valid without being renewed
+        poll_interval : float
+            Number of seconds between each check of the queue
+    """
+    create(queue)
+    seeds = itertools.count(scan_seed)
+    T = T_min + np.arange(steps) * (T_max - T_min) / steps
+    scan_shards = {}
+    for L in L_values:
+        tasks = [[float(temperature), next(seeds)] for temperature in T]
+        for k in range(0, steps, shard_size):
+            shard = {
+                "stage": "scan",
+                "L": L,
+                "tasks": tasks[k : k + shard_size],
+                "cluster": cluster,
+                "cost": L ** 2 * len(tasks[k : k + shard_size]),
+            }
+            scan_shards[_shard_name(f"scan_L={L}_{k // shard_size:03d}", shard)] = shard
+    results = run_stage(queue, scan_shards, timeout, poll_interval)
+
+    zoom_shards = {}
+    for i, L in enumerate(L_values):
+        names = [name for name in sorted(results) if scan_shards[name]["L"] == L]
+        rows = [row for name in names for row in results[name]]
+        write_values(rows, f"output/values_L={L}.csv")
+        result_store.ResultStore().append(
+            rows,
+            "scan",
+            L,
+            [seed for name in names for _, seed in scan_shards[name]["tasks"]],
+        )
+        T_zoom_min, T_zoom_max = zoom.zoom_range(pd.DataFrame(rows))
+        shard = {
+            "stage": "zoom",
+            "L": L,
+            "T_min": float(T_zoom_min),
+            "T_max": float(T_zoom_max),
+            "seed": zoom_seed + i,
+            "cluster": cluster,
+            "cost": L ** 2 * steps,
+        }
+        zoom_shards[_shard_name(f"zoom_L={L}", shard)] = shard
+    peaks = run_stage(queue, zoom_shards, timeout, poll_interval)
+    zoom.write_peaks(list(peaks.values()))
+
+    # let the workers exit
+    with open(os.path.join(queue, "stop"), "w"):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run the scan and zoom through a work queue on a shared filesystem"
+    )
+    parser.add_argument("role", choices=["coordinator", "worker"])
+    parser.add_argument("queue", help="The queue directory, on the shared filesystem")
+    parser.add_argument(
+        "-c",
+        "--cluster",
+        help="Use Wolff cluster updates instead of the Metropolis algorithm",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-l",
+        "--local-workers",
+        help="Number of worker processes the coordinator starts on this node (default 0)",
+        type=int,
+        default=0,
+    )
+    parser.add_argument(
+        "-t",
+        "--timeout",
+        help=f"Number of seconds a lease is valid without being renewed (default {TIMEOUT})",
+        type=float,
+        default=TIMEOUT,
+    )
+    args = parser.parse_args()
+
+    if args.role == "worker":
+        worker(args.queue, args.timeout)
+        return
+    create(args.queue)
+    local_workers = [
+        subprocess.Popen(
+            [sys.executable, __file__, "worker", args.queue, "-t", str(args.timeout)]
+        )
+        for _ in range(args.local_workers)
+    ]
+    try:
+        coordinate(args.queue, args.cluster, timeout=args.timeout)
+    finally:
+        # the workers exit by themselves once the coordinator has finished
+        finished = os.path.exists(os.path.join(args.queue, "stop"))
+        for process in local_workers:
+            if not finished:
+                process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,38 +2,516 @@
 Take the results from initial scanning at a large interval of temperatures,
 and zoom in at a neighbourhood containting the values for T when C_v and
 chi attains their maximum.
+
+Instead of simulating a new grid of temperatures in the neighbourhood, the
+energy and magnetization are sampled at a few temperatures, and the values
+at any temperature in between are found by Ferrenberg-Swendsen
+(multi-)histogram reweighting. The location of the maximum of C_v and chi
+is found by root-finding on the derivative of the reweighted curves, and
+its error with a jackknife over blocks of the samples.
 """
 
+import glob
+import itertools
+
+import numpy as np
 import pandas as pd
-import subprocess
+from scipy.optimize import brentq
+
+import cache
+import peak_search
+import result_store
+import scheduler
+from samples import read_samples
+
+
+def _log_sum_exp(x, axis=-1):
+    """Calculate ln(sum(exp(x))) along an axis without overflow"""
+    shift = np.max(x, axis=axis, keepdims=True)
+    return np.squeeze(shift, axis=axis) + np.log(np.sum(np.exp(x - shift), axis=axis))
+
+
+class Reweighting:
+    def __init__(self, samples, L, tol=1e-10, max_iterations=10000):
+        """Combine samples from one or more temperatures with multi-histogram reweighting
+
+        Every sample only enters through its energy, so the samples are
+        grouped by energy, and the magnetization is kept as sums per energy.
+
+        Parameters
+        ----------
+            samples : list of (float, np.ndarray, np.ndarray)
+                The temperature, the sampled energies and the sampled absolute
+                magnetizations of every simulation. With a single simulation
+                this is single-histogram reweighting
+            L : int
+                The size of the lattice
+            tol : float
+                Tolerance of the self-consistent free energies
+            max_iterations : int
+                Maximum number of iterations to find the free energies
+        """
+        self._L = L
+        self._N = L ** 2
+        self._betas = np.array([1 / T for T, _, _ in samples])
+        n = np.array([len(E) for _, E, _ in samples], dtype=float)
+
+        E = np.concatenate([np.asarray(E, dtype=float) for _, E, _ in samples])
+        M = np.concatenate([np.asarray(M, dtype=float) for _, _, M in samples])
+        # energies are shifted to keep the moments well conditioned
+        self._E_ref = np.mean(E)
+        energies, inverse = np.unique(E - self._E_ref, return_inverse=True)
+        counts = np.bincount(inverse)
+        self._e = energies
+        self._log_counts = np.log(counts)
+        self._M = np.bincount(inverse, weights=M) / counts
+        self._M_squared = np.bincount(inverse, weights=M * M) / counts
+
+        # self-consistent ln(Z_k), with ln(Z_0) = 0
+        log_Z = np.zeros(len(self._betas))
+        for _ in range(max_iterations):
+            log_denominator = _log_sum_exp(
+                np.log(n)[:, None] - self._betas[:, None] * self._e - log_Z[:, None],
+                axis=0,
+            )
+            new_log_Z = _log_sum_exp(
+                self._log_counts - self._betas[:, None] * self._e - log_denominator
+            )
+            new_log_Z -= new_log_Z[0]
+            converged = np.max(np.abs(new_log_Z - log_Z)) < tol
+            log_Z = new_log_Z
+            if converged:
+                break
+        self._log_denominator = log_denominator
+
+    def _moments(self, T):
+        """Calculate the reweighted moments needed for the values and their derivatives
+
+        Parameters
+        ----------
+            T : array_like
+                The temperatures to reweight to
+
+        Returns
+        -------
+            moments : dict of np.ndarray
+                Expected values, with one value per temperature
+        """
+        beta = 1 / np.atleast_1d(np.asarray(T, dtype=float))
+        log_p = self._log_counts - beta[:, None] * self._e - self._log_denominator
+        p = np.exp(log_p - _log_sum_exp(log_p)[:, None])
+
+        e, M, M_squared = self._e, self._M, self._M_squared
+        moments = {
+            "e": p @ e,
+            "e2": p @ e ** 2,
+            "e3": p @ e ** 3,
+            "M": p @ M,
+            "M2": p @ M_squared,
+            "Me": p @ (M * e),
+            "M2e": p @ (M_squared * e),
+        }
+        moments["beta"] = beta
+        return moments
+
+    def values(self, T):
+        """Calculate <epsilon>, <|m|>, C_v and chi at the given temperatures
+
+        Parameters
+        ----------
+            T : array_like
+                The temperatures to reweight to
+
+        Returns
+        -------
+            expected_epsilon, expected_m_abs, c_v, chi : np.ndarray
+                The reweighted values
+        """
+        m = self._moments(T)
+        N, beta = self._N, m["beta"]
+        expected_epsilon = (m["e"] + self._E_ref) / N
+        expected_m_abs = m["M"] / N
+        c_v = beta ** 2 * (m["e2"] - m["e"] ** 2) / N
+        chi = beta * (m["M2"] - m["M"] ** 2) / N
+        return expected_epsilon, expected_m_abs, c_v, chi
+
+    def derivatives(self, T):
+        """Calculate the derivatives of C_v and chi with respect to beta
+
+        Both use that d<A>/d beta = -(<AE> - <A><E>).
+
+        Parameters
+        ----------
+            T : array_like
+                The temperatures to reweight to
+
+        Returns
+        -------
+            d_c_v, d_chi : np.ndarray
+                d C_v / d beta and d chi / d beta
+        """
+        m = self._moments(T)
+        N, beta = self._N, m["beta"]
+        variance_E = m["e2"] - m["e"] ** 2
+        third_cumulant_E = m["e3"] - 3 * m["e2"] * m["e"] + 2 * m["e"] ** 3
+        d_c_v = (2 * beta * variance_E - beta ** 2 * third_cumulant_E) / N
+
+        variance_M = m["M2"] - m["M"] ** 2
+        d_variance_M = -(m["M2e"] - m["M2"] * m["e"]) + 2 * m["M"] * (
+            m["Me"] - m["M"] * m["e"]
+        )
+        d_chi = (variance_M + beta * d_variance_M) / N
+        return d_c_v, d_chi
+
+    def find_maximum(self, T_min, T_max, points=1000):
+        """Find the temperatures where C_v and chi attain their maximum
+
+        The maximum on a grid gives a bracket, and the root of the derivative
+        within the bracket is found with Brent's method.
+
+        Parameters
+        ----------
+            T_min : float
+                The minimum temperature to search
+            T_max : float
+                The maximum temperature to search
+            points : int
+                Number of temperatures in the grid used for bracketing
+
+        Returns
+        -------
+            T_c_v, T_chi : float
+                The temperatures of the maximum of C_v and chi
+        """
+        T = np.linspace(T_min, T_max, points)
+        _, _, c_v, chi = self.values(T)
+        maxima = []
+        for i, curve in enumerate([c_v, chi]):
+            argmax = np.argmax(curve)
+            a, b = T[max(argmax - 1, 0)], T[min(argmax + 1, points - 1)]
+
+            def derivative(T):
+                return self.derivatives(T)[i][0]
+
+            if derivative(a) * derivative(b) < 0:
+                maxima.append(brentq(derivative, a, b))
+            else:
+                maxima.append(float(T[argmax]))
+        return tuple(maxima)
+
+
+def jackknife_maximum(samples, L, T_min, T_max, blocks=10, points=1000):
+    """Estimate the errors of the temperatures of the maximum of C_v and chi
+
+    Every jackknife estimate leaves out one contiguous block of the samples
+    of every simulation, and finds the maximum of the reweighted curves.
+    When a maximum falls back to a grid point (see find_maximum), the
+    estimates can all agree, so the errors are at least the grid spacing.
+
+    Parameters
+    ----------
+        samples : list of (float, np.ndarray, np.ndarray)
+            The temperature, the sampled energies and the sampled absolute
+            magnetizations of every simulation
+        L : int
+            The size of the lattice
+        T_min : float
+            The minimum temperature to search
+        T_max : float
+            The maximum temperature to search
+        blocks : int
+            Number of jackknife blocks
+        points : int
+            Number of temperatures in the grid used for bracketing
+
+    Returns
+    -------
+        T_c_v_error, T_chi_error : float
+            The standard errors of the temperatures of the maximum of C_v and chi
+    """
+    maxima = []
+    for k in range(blocks):
+        left_out = []
+        for T, E, M in samples:
+            size = len(E) // blocks
+            keep = np.r_[0 : k * size, (k + 1) * size : len(E)]
+            left_out.append((T, E[keep], M[keep]))
+        maxima.append(Reweighting(left_out, L).find_maximum(T_min, T_max, points))
+    maxima = np.array(maxima)
+    errors = np.sqrt(
+        (blocks - 1) / blocks * np.sum((maxima - np.mean(maxima, axis=0)) ** 2, axis=0)
+    )
+    errors = np.maximum(errors, (T_max - T_min) / (points - 1))
+    return tuple(float(error) for error in errors)
+
 
+def read_reweighting_samples(L):
+    """Read the samples written by ./runner -m
 
-def zoom():
+    Parameters
+    ----------
+        L : int
+            The size of the lattice
+
+    Returns
+    -------
+        samples : list of (float, np.ndarray, np.ndarray)
+            The temperature, the sampled energies and the sampled absolute
+            magnetizations of every simulation
+    """
+    samples = []
+    for filename in sorted(glob.glob(f"output/samples_zoom_L={L}_T=*.bin")):
+        header, sampled_energy, sampled_magnetization_abs = read_samples(filename)
+        samples.append((header["T"], sampled_energy, sampled_magnetization_abs))
+    return samples
+
+
+def zoom_range(df, margin=2):
+    """Find the neighbourhood of the maxima of C_v and chi in a scan
+
+    Parameters
+    ----------
+        df : pd.DataFrame
+            The values of the scan, with the columns T, C_v and chi
+        margin : int
+            Number of scanned temperatures to include on each side
+
+    Returns
+    -------
+        T_min, T_max : float
+            The temperatures to zoom in between
+    """
+    df = df.sort_values("T", ignore_index=True)
+    argmax_C_v = df.C_v.idxmax()
+    argmax_chi = df.chi.idxmax()
+    T_min = df.loc[max(0, min(argmax_C_v, argmax_chi) - margin)]["T"]
+    T_max = df.loc[min(max(argmax_C_v, argmax_chi) + margin, len(df["T"]) - 1)]["T"]
+    return T_min, T_max
+
+
+def zoom_in(L, T_min, T_max, seed, cluster=False, threads=None):
+    """Sample between two temperatures and find the maxima with histogram reweighting
+
+    The reweighted values are written to output/values_zoom_L=<L>.csv, and
+    appended to the result store
+
+    Parameters
+    ----------
+        L : int
+            The size of the lattice
+        T_min : float
+            The minimum temperature to sample at
+        T_max : float
+            The maximum temperature to sample at
+        seed : int
+            Seed for RNG
+        cluster : bool
+            If True, the runner uses Wolff cluster updates
+        threads : int
+            Number of OpenMP threads of the runner, by default all cores
+
+    Returns
+    -------
+        peak : list
+            L, the temperature of the maximum of C_v and its error, and the
+            temperature of the maximum of chi and its error
+    """
+    flags = ["-c"] if cluster else []
+    cache.run(
+        ["-m", L, T_min, T_max, seed, *flags],
+        outputs=[f"output/samples_zoom_L={L}_T=*.bin"],
+        threads=threads,
+    )
+
+    samples = read_reweighting_samples(L)
+    reweighting = Reweighting(samples, L)
+    T = np.linspace(T_min, T_max, 200)
+    values = np.column_stack([T, *reweighting.values(T)])
+    np.savetxt(
+        f"output/values_zoom_L={L}.csv",
+        values,
+        delimiter=",",
+        header="T,<epsilon>,<|m|>,C_v,chi",
+        comments="",
+    )
+    result_store.ResultStore().append(
+        pd.DataFrame(values, columns=["T", *result_store.VALUES]), "zoom", L, seed
+    )
+    T_c_v, T_chi = reweighting.find_maximum(T_min, T_max)
+    T_c_v_error, T_chi_error = jackknife_maximum(samples, L, T_min, T_max)
+    print(
+        f"L = {L} - reweighted argmax C_v: {T_c_v} +- {T_c_v_error}, "
+        f"argmax chi {T_chi} +- {T_chi_error}"
+    )
+    return [L, T_c_v, T_c_v_error, T_chi, T_chi_error]
+
+
+def write_peaks(peaks):
+    """Write the temperatures of the maxima to output/T_c_zoom.csv
+
+    Parameters
+    ----------
+        peaks : list of list
+            The peaks returned by zoom_in
+    """
+    np.savetxt(
+        "output/T_c_zoom.csv",
+        np.array(sorted(peaks)),
+        delimiter=",",
+        header="L,C_v,C_v_error,chi,chi_error",
+        comments="",
+    )
+
+
+def add_scan_and_zoom(
+    jobs,
+    cluster=False,
+    T_min=2.1,
+    T_max=2.4,
+    steps=24,
+    scan_seed=456788,
+    zoom_seed=9642,
+):
+    """Add tasks scanning the temperatures for every lattice size, and zooming in at the maxima
+
+    Every (L, T) of the scan is a separate task, and the zoom of a lattice
+    size starts as soon as its own scan has finished. The scanned values are
+    appended to output/values_L=<L>.csv as they arrive, and the file is
+    rewritten sorted by temperature once the scan of that size has finished,
+    when the values are also appended to the result store (see
+    result_store.py).
+    Every task has its own seed, given in the order the tasks are added, so
+    the results do not depend on the order the tasks run in. The scan tasks
+    are checkpointed, so an interrupted scan resumes where it stopped.
+
+    Parameters
+    ----------
+        jobs : scheduler.Scheduler
+            The scheduler to add the tasks to
+        cluster : bool
+            If True, the runner uses Wolff cluster updates
+        T_min : float
+            The minimum temperature of the scan
+        T_max : float
+            The maximum temperature of the scan (non inclusive)
+        steps : int
+            The number of temperatures of the scan
+        scan_seed : int
+            Seed of the first scan task, incremented for every task
+        zoom_seed : int
+            Seed of the first zoom task, incremented for every lattice size
+
+    Returns
+    -------
+        zoom_tasks : list of Task
+            The zoom tasks, with the peaks of zoom_in as results
+    """
+    columns = ["T", "<epsilon>", "<|m|>", "C_v", "chi"]
+    seeds = itertools.count(scan_seed)
+    T = T_min + np.arange(steps) * (T_max - T_min) / steps
+
+    def write_row(L):
+        def on_done(values):
+            with open(f"output/values_L={L}.csv", "a") as outfile:
+                outfile.write(",".join(str(values[column]) for column in columns))
+                outfile.write("\n")
+
+        return on_done
+
+    def zoom_task(L, scan_tasks, scan_seeds, seed):
+        def function():
+            df = pd.DataFrame([task.result for task in scan_tasks])[columns]
+            df.sort_values("T").to_csv(f"output/values_L={L}.csv", index=False)
+            result_store.ResultStore().append(df, "scan", L, scan_seeds)
+            T_min, T_max = zoom_range(df)
+            return zoom_in(L, T_min, T_max, seed, cluster, threads=4)
+
+        return function
+
+    zoom_tasks = []
+    for i, L in enumerate(range(20, 160, 20)):
+        with open(f"output/values_L={L}.csv", "w") as outfile:
+            outfile.write(",".join(columns) + "\n")
+        scan_seeds = [next(seeds) for _ in T]
+        scan_tasks = [
+            jobs.add(
+                f"scan L={L} T={temperature}",
+                lambda L=L, temperature=temperature, seed=seed: (
+                    peak_search.simulate(L, temperature, seed, cluster, checkpoint=True)
+                ),
+                cost=L ** 2,
+                on_done=write_row(L),
+            )
+            for temperature, seed in zip(T, scan_seeds)
+        ]
+        # 4 temperatures in parallel, with the samples stored for reweighting
+        zoom_tasks.append(
+            jobs.add(
+                f"zoom L={L}",
+                zoom_task(L, scan_tasks, scan_seeds, zoom_seed + i),
+                cost=L ** 2,
+                threads=4,
+                dependencies=scan_tasks,
+            )
+        )
+    return zoom_tasks
+
+
+def scan_and_zoom(cores=None, cluster=False):
+    """Scan and zoom in for every lattice size, see add_scan_and_zoom
+
+    Parameters
+    ----------
+        cores : int
+            The number of cores to use, by default all of them
+        cluster : bool
+            If True, the runner uses Wolff cluster updates
+    """
+    jobs = scheduler.Scheduler(cores)
+    zoom_tasks = add_scan_and_zoom(jobs, cluster)
+    jobs.run()
+    write_peaks([task.result for task in zoom_tasks])
+
+
+def zoom(cluster=False, cores=None):
     """
     Take the results from initial scanning at a large interval of temperatures,
     and zoom in at a neighbourhood containting the values for T when C_v and
     chi attains their maximum.
+
+    Parameters
+    ----------
+        cluster : bool
+            If True, the runner uses Wolff cluster updates instead of the
+            Metropolis algorithm, which decorrelates much faster near T_c
+        cores : int
+            The number of cores to use, by default all of them. The lattice
+            sizes are zoomed in parallel, see scheduler.py
     """
     seed = 9642
+    jobs = scheduler.Scheduler(cores)
+    peaks = []
+    store = result_store.ResultStore()
+    store.sync_outputs()
     for L in range(20, 160, 20):
-        print(L)
-        df = pd.read_csv(f"output/values_L={L}.csv")
-        df.sort_values("T", inplace=True, ignore_index=True)
-        margin = 2
-        argmax_C_v = df.C_v.idxmax()
-        argmax_chi = df.chi.idxmax()
-        T_min = df.loc[max(0, min(argmax_C_v, argmax_chi) - margin)]["T"]
-        T_max = df.loc[min(max(argmax_C_v, argmax_chi) + margin, len(df["T"]) - 1)]["T"]
-        print(
-            f"L = {L} - argmax C_v: {df.loc[argmax_C_v]['T']}, argmax chi {df.loc[argmax_chi]['T']}"
+        T_min, T_max = zoom_range(pd.DataFrame(store.query("scan", L)))
+        print(f"L = {L} - look between temperatures {T_min} and {T_max}")
+        jobs.add(
+            f"zoom L={L}",
+            lambda L=L, T_min=T_min, T_max=T_max, seed=seed: zoom_in(
+                L, T_min, T_max, seed, cluster, threads=4
+            ),
+            cost=L ** 2,
+            threads=4,
+            on_done=peaks.append,
         )
-        print(f"Look between temperatures {T_min} and {T_max}")
-        subprocess.run(["./runner", "-z", str(L), str(T_min), str(T_max), str(seed)])
         seed += 1
+    jobs.run()
+    write_peaks(peaks)
 
 
-def main():
-    zoom()
+def main(cluster=False, cores=None):
+    zoom(cluster, cores)
 
 
 if __name__ == "__main__":